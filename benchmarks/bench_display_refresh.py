@@ -0,0 +1,132 @@
+"""
+Time taken to display a slice on the display area
+
+Measures the paths of DisplayController.refresh_image once the layout
+of the axes is set: stepping to a cached slice, changing the window and
+stepping to a slice that must be rendered first. Rendering is done by
+DicomSeriesManager's show(), which is replaced here by an equivalent
+imshow on offscreen axes. Run with:
+
+    QT_QPA_PLATFORM=offscreen \
+        python -m QuickSeg.benchmarks.bench_display_refresh
+"""
+
+import timeit
+
+import numpy as np
+
+from PyQt5.QtWidgets import QApplication
+
+from matplotlib.figure import Figure
+
+from QuickSeg.model.slice_cache import get_window_limits, RenderedSlice
+
+
+SLICE_SHAPE = (512, 512)
+CANVAS_SIZE = (900, 900)
+
+WINDOW_LIST = [(40.0, 400.0), (50.0, 350.0)]
+
+N_SLICES = 20
+N_REPEATS = 5
+
+
+def _render(axes, data, window):
+    """
+    Stand-in for DicomSeriesManager's show()
+    """
+
+    for image in axes.get_images():
+        image.remove()
+
+    vmin, vmax = get_window_limits(window)
+
+    axes.imshow(data, cmap='gray', vmin=vmin, vmax=vmax)
+    axes.set_title("Axial")
+    axes.set_axis_off()
+
+    return RenderedSlice.from_axes(axes)
+
+
+def _time_ms(function, n_calls):
+
+    return 1e3 * min(timeit.repeat(function, number=n_calls,
+                                   repeat=N_REPEATS)) / n_calls
+
+
+def main():
+
+    app = QApplication([])  # noqa: F841
+
+    # The Qt backend can only be selected once the application exists
+    from QuickSeg.view.display_area import DisplayArea
+
+    display_area = DisplayArea()
+    display_area.resize(*CANVAS_SIZE)
+    display_area.show()
+
+    rng = np.random.default_rng(0)
+    data_list = [rng.integers(-1000, 3000, SLICE_SHAPE).astype(np.int16)
+                 for _ in range(N_SLICES)]
+    seg_slice = np.zeros(SLICE_SHAPE, dtype=np.uint8)
+    seg_slice[200:300, 200:300] = 1
+
+    render_axes = Figure().add_subplot()
+
+    rendered_list = [_render(render_axes, data, WINDOW_LIST[0])
+                     for data in data_list]
+
+    # Full draw setting the layout
+    display_area.show_image(rendered_list[0], seg_slice, WINDOW_LIST[0])
+
+    slice_index = 0
+    window_index = 0
+
+    def step_cached():
+
+        nonlocal slice_index
+
+        slice_index = (slice_index + 1) % N_SLICES
+
+        display_area.show_image(
+            rendered_list[slice_index],
+            seg_slice,
+            WINDOW_LIST[0])
+
+    def change_window():
+
+        nonlocal window_index
+
+        window_index = 1 - window_index
+
+        display_area.show_image(
+            rendered_list[0],
+            seg_slice,
+            WINDOW_LIST[window_index])
+
+    def step_uncached():
+
+        nonlocal slice_index
+
+        slice_index = (slice_index + 1) % N_SLICES
+
+        display_area.show_image(
+            _render(render_axes, data_list[slice_index], WINDOW_LIST[0]),
+            seg_slice,
+            WINDOW_LIST[0])
+
+    print(f"{SLICE_SHAPE[0]}x{SLICE_SHAPE[1]} slices on a "
+          f"{CANVAS_SIZE[0]}x{CANVAS_SIZE[1]} canvas (ms per update)")
+
+    for name, function in [("Cached slice", step_cached),
+                           ("Window change", change_window),
+                           ("Rendered slice", step_uncached)]:
+
+        latency = _time_ms(function, N_SLICES)
+
+        print(f"{name:<16} {latency:>7.2f} ({1e3 / latency:.0f} fps)")
+
+
+if __name__ == "__main__":
+
+    main()
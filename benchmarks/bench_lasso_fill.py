@@ -0,0 +1,81 @@
+"""
+Latency of a lasso edit as a function of slice size and lasso size
+
+Compares the previous full-slice trace, fill and boolean assignment
+with the bounding-box-restricted fill. Run with:
+
+    python -m QuickSeg.benchmarks.bench_lasso_fill
+"""
+
+import timeit
+
+import numpy as np
+
+from scipy.ndimage import binary_fill_holes
+
+from QuickSeg.model.lasso_utils import (
+    fill_line_on_slice,
+    get_line_bounding_box)
+from QuickSeg.model.siddon import compute_path
+
+
+SLICE_SIZES = [256, 512, 1024]
+LASSO_RADII = [5, 20, 80]
+
+N_REPEATS = 50
+
+
+def _circular_lasso(center, radius):
+
+    # Points spaced by about one pixel as when traced
+    angles = np.linspace(0, 2 * np.pi, max(int(2 * np.pi * radius), 8),
+                         endpoint=False)
+
+    return np.c_[center + radius * np.sin(angles),
+                 center + radius * np.cos(angles)].astype(np.float32)
+
+
+def _full_slice_edit(seg_slice, line_ij):
+
+    path_i, path_j = compute_path(seg_slice.shape, line_ij, True)
+
+    mask = np.zeros(seg_slice.shape, dtype=bool)
+    mask[path_i, path_j] = True
+    binary_fill_holes(mask, output=mask)
+
+    seg_slice[mask] = 1
+
+
+def _bounding_box_edit(seg_slice, line_ij):
+
+    bbox = get_line_bounding_box(seg_slice.shape, line_ij)
+
+    fill_line_on_slice(seg_slice, line_ij, 1, bbox=bbox)
+
+
+def main():
+
+    print("Mean edit latency (ms)")
+    print(f"{'slice':>6} {'radius':>6} {'full':>8} {'bbox':>8}")
+
+    for slice_size in SLICE_SIZES:
+
+        seg_slice = np.zeros((slice_size, slice_size), dtype=np.uint8)
+
+        for radius in LASSO_RADII:
+
+            line_ij = _circular_lasso(slice_size / 2, radius)
+
+            latency_list = [
+                1e3 * timeit.timeit(
+                    lambda: edit(seg_slice, line_ij),
+                    number=N_REPEATS) / N_REPEATS
+                for edit in (_full_slice_edit, _bounding_box_edit)]
+
+            print(f"{slice_size:>6} {radius:>6} "
+                  f"{latency_list[0]:>8.2f} {latency_list[1]:>8.2f}")
+
+
+if __name__ == "__main__":
+
+    main()
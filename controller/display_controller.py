@@ -2,14 +2,27 @@
 Controller for the display area and display controls
 """
 
-from typing import Optional
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from matplotlib.figure import Figure
 
-from DicomSeriesManager.display import show
 from DicomSeriesManager.reorientation import \
     get_reoriented_n_slices
+from DicomSeriesManager.series import BaseSeries
 
 from QuickSeg.model.display_window_model import DisplayWindow
+from QuickSeg.model.lasso_utils import BoundingBox
 from QuickSeg.model.model import Model, DisplayParameters
+from QuickSeg.model.seg_utils import get_seg_slice
+from QuickSeg.model.slice_cache import (
+    get_window_limits,
+    PREFETCH_DEPTH,
+    render_slice,
+    RenderedSlice,
+    SliceCache,
+    SliceKey)
 from QuickSeg.model.zoom_utils import (
     convert_region_to_FOV,
     Region)
@@ -29,6 +42,7 @@ from QuickSeg.controller.navigation_controller import \
     NavigationController
 from QuickSeg.controller.orientation_controller import \
     OrientationController
+from QuickSeg.controller.worker import start_worker
 from QuickSeg.controller.zoom_controller import \
     ZoomController
 
@@ -56,7 +70,9 @@ class DisplayController:
                 display_control_panel.frame_navigation,
                 self.refresh_image,
                 self._set_window_index,
-                self._set_manual_window)
+                self._set_manual_window,
+                self._model.get_cached_frame_statistics,
+                self._model.cache_frame_statistics)
 
         # Navigation controller for slice index
         self._slice_navigation_controller = \
@@ -66,6 +82,10 @@ class DisplayController:
                 self.refresh_image,
                 self._set_slice_index)
 
+        # Scrolling on the display area steps through slices
+        self._display_area.scroll_requested.connect(
+            self._slice_navigation_controller.request_steps)
+
         # Navigation controller for frame index
         self._frame_navigation_controller = \
             NavigationController(
@@ -90,6 +110,20 @@ class DisplayController:
                 self._set_FOV,
                 display_area)
 
+        # Offscreen axes on which slices are rendered, one for the
+        # GUI thread and one for prefetching in the background
+        self._render_axes = Figure().add_subplot()
+        self._prefetch_axes = Figure().add_subplot()
+
+        # Key of the last displayed slice, for the direction of travel
+        self._last_slice_key: Optional[SliceKey] = None
+
+        # Slices waiting to be prefetched, rendered one at a time
+        self._pending_prefetch: \
+            Optional[tuple[BaseSeries, SliceCache, Tuple[float, float],
+                           Sequence[SliceKey]]] = None
+        self._prefetch_running = False
+
     def _set_slice_index(self, slice_index: int):
 
         display_parameters = self._get_display_parameters()
@@ -137,7 +171,11 @@ class DisplayController:
             self._series_selection_panel.\
             get_current_series_index()
 
-        series = self._model.goc_series(series_index)
+        # The region is converted with the volume, which must not be
+        # read again synchronously while it is being loaded
+        if region is not None and \
+                not self._model.is_series_loaded(series_index):
+            return
 
         orientation = \
             self._orientation_controller.\
@@ -146,7 +184,7 @@ class DisplayController:
         FOV = convert_region_to_FOV(
             region,
             previous_FOV,
-            series,
+            self._model.goc_series(series_index),
             orientation) \
             if region is not None else None
 
@@ -259,6 +297,10 @@ class DisplayController:
 
         return self._display_area.get_fig()
 
+    def set_slice_navigation_enabled(self, enabled: bool):
+
+        self._display_area.set_slice_navigation_enabled(enabled)
+
     def get_axes(self):
 
         return self._display_area.get_axes()
@@ -276,9 +318,11 @@ class DisplayController:
 
         # If there is no selected series, clear image and return
         if current_series_index is None:
-            axes.clear()
-            axes.set_visible(False)
-            self._display_area.refresh_canvas()
+            self.clear_image()
+            return
+
+        # If the current series is being loaded, keep its preview
+        if not self._model.is_series_loaded(current_series_index):
             return
 
         # Get index of current segmentation
@@ -310,17 +354,167 @@ class DisplayController:
         # Get current field of view
         FOV = self._zoom_controller.get_current_FOV()
 
-        # Replace axes content with current image and seg
+        # Get rendered image from cache or render it
+        slice_cache = self._model.get_slice_cache()
+
+        slice_key = SliceKey.make(
+            current_series_index,
+            frame_index,
+            orientation,
+            slice_index,
+            FOV)
+
+        rendered = slice_cache.get(slice_key)
+
+        if rendered is None:
+
+            rendered = render_slice(
+                series,
+                self._render_axes,
+                slice_key,
+                window)
+
+            slice_cache.put(slice_key, rendered)
+
+        # Get displayed segmentation slice
+        seg_slice = get_seg_slice(
+            seg,
+            series,
+            orientation,
+            slice_index,
+            FOV) \
+            if seg is not None else None
+
+        # Update image and seg on the displayed axes, redrawing
+        # only what is necessary
         axes.set_visible(True)
-        show(series, axes,
-             ind=slice_index,
-             frame=frame_index,
-             orientation=orientation,
-             window=window,
-             FOV=FOV,
-             seg=seg)
+        self._display_area.show_image(rendered, seg_slice, window)
 
-        self._display_area.add_border()
+        # Render the next slices in the background
+        n_slices = get_reoriented_n_slices(
+            series.get_vol_shape(frame_index),
+            orientation)
+
+        self._prefetch_slices(
+            series,
+            slice_cache,
+            slice_key,
+            window,
+            slice_key.get_direction(self._last_slice_key),
+            n_slices)
 
-        # Refresh canvas
+        self._last_slice_key = slice_key
+
+    def show_seg_region(self,
+                        seg_slice: np.array,
+                        bbox: BoundingBox):
+
+        self._display_area.show_seg_region(seg_slice, bbox)
+
+    def clear_image(self):
+
+        self._display_area.clear_image()
+        self.get_axes().set_visible(False)
         self._display_area.refresh_canvas()
+
+    def show_preview(self,
+                     pixel_array: np.ndarray,
+                     window: Tuple[float, float]):
+        """
+        Display a slice while the current series is being loaded
+        """
+
+        vmin, vmax = get_window_limits(window)
+
+        # Removing images is much cheaper than clearing the axes
+        for image in self._render_axes.get_images():
+            image.remove()
+
+        self._render_axes.imshow(
+            pixel_array,
+            cmap='gray',
+            vmin=vmin,
+            vmax=vmax)
+
+        n_rows, n_cols = pixel_array.shape
+        self._render_axes.set_xlim(-0.5, n_cols - 0.5)
+        self._render_axes.set_ylim(n_rows - 0.5, -0.5)
+        self._render_axes.set_aspect('equal')
+        self._render_axes.set_title("Loading...")
+        self._render_axes.set_axis_off()
+
+        rendered = RenderedSlice.from_axes(self._render_axes)
+
+        self.get_axes().set_visible(True)
+        self._display_area.show_image(rendered, None, window)
+
+    def _prefetch_slices(self,
+                         series: BaseSeries,
+                         slice_cache: SliceCache,
+                         slice_key: SliceKey,
+                         window: Tuple[float, float],
+                         direction: int,
+                         n_slices: int):
+
+        # Slices ahead in the direction of travel, or on both sides
+        # if there is no direction
+        offset_list = \
+            [direction * k for k in range(1, PREFETCH_DEPTH + 1)] \
+            if direction != 0 else \
+            [sign * k for k in range(1, PREFETCH_DEPTH // 2 + 1)
+             for sign in [1, -1]]
+
+        key_list = \
+            [slice_key.with_slice_index(slice_key.slice_index + offset)
+             for offset in offset_list
+             if 0 <= slice_key.slice_index + offset < n_slices]
+
+        # Replaces any prefetch not yet started
+        self._pending_prefetch = (series, slice_cache, window, key_list)
+
+        self._start_prefetch()
+
+    def _start_prefetch(self):
+
+        if self._prefetch_running or self._pending_prefetch is None:
+            return
+
+        series, slice_cache, window, key_list = self._pending_prefetch
+
+        key_list = [key for key in key_list if key not in slice_cache]
+
+        if len(key_list) == 0:
+            self._pending_prefetch = None
+            return
+
+        slice_key = key_list[0]
+
+        self._pending_prefetch = \
+            (series, slice_cache, window, key_list[1:])
+
+        def on_finished(rendered: RenderedSlice):
+
+            self._prefetch_running = False
+
+            slice_cache.put(slice_key, rendered)
+
+            self._start_prefetch()
+
+        def on_failed(_: Exception):
+
+            # Prefetching is only an optimization: The slice will be
+            # rendered again when displayed
+            self._prefetch_running = False
+
+            self._start_prefetch()
+
+        self._prefetch_running = True
+
+        start_worker(
+            render_slice,
+            series,
+            self._prefetch_axes,
+            slice_key,
+            window,
+            on_finished=on_finished,
+            on_failed=on_failed)
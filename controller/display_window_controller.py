@@ -2,23 +2,44 @@
 Controller for the selection of a display window
 """
 
-from typing import Callable, Optional, Sequence
+from typing import Callable, Optional, Sequence, Tuple
 
 from DicomSeriesManager.series import BaseSeries
 
-from QuickSeg.model.display_window_model import DisplayWindow
+from QuickSeg.model.display_window_model import (
+    DisplayWindow,
+    has_integer_pixel_data,
+    PERCENTILE_RANGE,
+    scan_frame_statistics)
 from QuickSeg.model.model import ExtractedWindows
+from QuickSeg.model.window_cache import get_series_key
 
 from QuickSeg.view.display_window_control import \
     DisplayWindowControl
 from QuickSeg.view.navigation_panel import \
     NavigationPanel
+from QuickSeg.view.popups import \
+    warning_popup
+
+from QuickSeg.controller.worker import start_worker
 
 
 GLOBAL_WINDOW_TEXT = '> Global'
 FRAME_WINDOW_TEXT = '> Frame'
+GLOBAL_PERCENTILE_WINDOW_TEXT = \
+    '> Global {:g}-{:g}%'.format(*PERCENTILE_RANGE)
+FRAME_PERCENTILE_WINDOW_TEXT = \
+    '> Frame {:g}-{:g}%'.format(*PERCENTILE_RANGE)
 MANUAL_WINDOW_TEXT = '> Manual'
 
+# Kinds of windows
+DICOM_WINDOW = 'dicom'
+GLOBAL_WINDOW = 'global'
+FRAME_WINDOW = 'frame'
+GLOBAL_PERCENTILE_WINDOW = 'global_percentile'
+FRAME_PERCENTILE_WINDOW = 'frame_percentile'
+MANUAL_WINDOW = 'manual'
+
 
 class DisplayWindowController:
 
@@ -27,7 +48,9 @@ class DisplayWindowController:
                  frame_navigation: NavigationPanel,
                  refresh_image: Callable,
                  on_window_index_change: Callable,
-                 on_manual_window_change: Callable):
+                 on_manual_window_change: Callable,
+                 get_cached_frame_statistics: Callable,
+                 cache_frame_statistics: Callable):
 
         self._display_window_control = display_window_control
         self._frame_navigation = frame_navigation
@@ -35,12 +58,20 @@ class DisplayWindowController:
         self._refresh_image = refresh_image
         self._on_window_index_change = on_window_index_change
         self._on_manual_window_change = on_manual_window_change
+        self._get_cached_frame_statistics = \
+            get_cached_frame_statistics
+        self._cache_frame_statistics = cache_frame_statistics
 
+        self._extracted_windows = ExtractedWindows()
+        self._has_frame_windows = False
+        self._has_percentile_windows = False
         self._dicom_window_list = []
-        self._global_window = None
-        self._frame_window_list = None
         self._manual_window = None
 
+        # Extracted windows of series for which tight windows are
+        # being extracted in the background, by id
+        self._pending_extractions = {}
+
         self._connect_signals_and_slots()
 
     def _connect_signals_and_slots(self):
@@ -81,44 +112,215 @@ class DisplayWindowController:
                       manual_window: Optional[DisplayWindow],
                       window_index: int):
 
-        if extracted_windows.initialized is False:
+        self._extracted_windows = extracted_windows
+        self._has_frame_windows = series.is_multivolume()
+        self._has_percentile_windows = \
+            has_integer_pixel_data(series)
 
-            self._dicom_window_list = \
+        # DICOM windows only require the header of one slice and
+        # are available immediately
+        if extracted_windows.dicom_window_list is None:
+            extracted_windows.dicom_window_list = \
                 DisplayWindow.extract_dicom_window_list(series)
-            self._global_window, self._frame_window_list = \
-                DisplayWindow.extract_tight_windows(series)
 
-            extracted_windows.dicom_window_list = \
-                self._dicom_window_list
-            extracted_windows.global_window = \
-                self._global_window
-            extracted_windows.frame_window_list = \
-                self._frame_window_list
-            extracted_windows.initialized = True
-        else:
-            self._dicom_window_list = \
-                extracted_windows.dicom_window_list
-            self._global_window = \
-                extracted_windows.global_window
-            self._frame_window_list = \
-                extracted_windows.frame_window_list
+        self._dicom_window_list = \
+            extracted_windows.dicom_window_list
+
+        # Tight windows require scanning the pixel data: They are
+        # extracted in the background and added when ready
+        if not extracted_windows.initialized:
+            self._start_tight_window_extraction(
+                series,
+                extracted_windows)
 
         # Set manual window (may be None)
         self._manual_window = manual_window
 
-        explanation_list = [window.explanation for window in
-                            self._dicom_window_list]
-
-        explanation_list.append(GLOBAL_WINDOW_TEXT)
-        if self._frame_window_list is not None:
-            explanation_list.append(FRAME_WINDOW_TEXT)
-        explanation_list.append(MANUAL_WINDOW_TEXT)
+        entry_list = self._get_entry_list()
 
         # TODO: This triggers refresh image!
         self._display_window_control.set_combobox(
-            explanation_list,
+            self._get_explanation_list(entry_list),
+            self._get_entry_index(window_index, entry_list))
+
+    def _start_tight_window_extraction(
+            self,
+            series: BaseSeries,
+            extracted_windows: ExtractedWindows):
+
+        # Extraction is already running for this series
+        if id(extracted_windows) in self._pending_extractions:
+            return
+
+        self._pending_extractions[id(extracted_windows)] = \
+            extracted_windows
+
+        def extract():
+
+            frame_statistics = \
+                (extracted_windows.frame_minmax_list,
+                 extracted_windows.frame_histogram_list)
+
+            # Series key for caching if pixel data must be scanned
+            series_key = None
+
+            # Keep the scanned pixel value statistics so that pixel
+            # data never has to be read again for this series
+            if extracted_windows.frame_minmax_list is None:
+
+                series_key = get_series_key(series)
+
+                cached_frame_statistics = \
+                    self._get_cached_frame_statistics(series_key) \
+                    if series_key is not None else None
+
+                if cached_frame_statistics is None:
+                    frame_statistics = scan_frame_statistics(series)
+                else:
+                    # Already cached
+                    frame_statistics = cached_frame_statistics
+                    series_key = None
+
+            frame_minmax_list, frame_histogram_list = \
+                frame_statistics
+
+            tight_windows = \
+                DisplayWindow.extract_tight_windows(
+                    series,
+                    frame_minmax_list)
+
+            percentile_windows = \
+                DisplayWindow.extract_percentile_windows(
+                    series,
+                    frame_histogram_list) \
+                if frame_histogram_list is not None else (None, None)
+
+            return (frame_statistics,
+                    tight_windows,
+                    percentile_windows,
+                    series_key)
+
+        def on_finished(result):
+
+            del self._pending_extractions[id(extracted_windows)]
+
+            frame_statistics, tight_windows, percentile_windows, \
+                series_key = result
+
+            extracted_windows.frame_minmax_list, \
+                extracted_windows.frame_histogram_list = \
+                frame_statistics
+            extracted_windows.global_window, \
+                extracted_windows.frame_window_list = tight_windows
+            extracted_windows.global_percentile_window, \
+                extracted_windows.frame_percentile_window_list = \
+                percentile_windows
+            extracted_windows.initialized = True
+
+            if series_key is not None:
+                self._cache_frame_statistics(
+                    series_key,
+                    frame_statistics)
+
+            # Add tight windows if the series is still displayed
+            if extracted_windows is self._extracted_windows:
+                self._add_tight_windows()
+
+        def on_failed(exception: Exception):
+
+            del self._pending_extractions[id(extracted_windows)]
+
+            warning_popup(
+                f"Could not extract display windows: {exception}")
+
+        start_worker(
+            extract,
+            on_finished=on_finished,
+            on_failed=on_failed)
+
+    def _add_tight_windows(self):
+
+        combobox = self._display_window_control.window_combobox
+
+        # Entry selected before adding the tight windows
+        previous_entry = \
+            self._get_entry_list(initialized=False)[
+                combobox.currentIndex()]
+
+        entry_list = self._get_entry_list()
+        window_index = entry_list.index(previous_entry)
+
+        # The selected window doesn't change: Update the combobox
+        # without refreshing the image (signals are unblocked by
+        # set_combobox)
+        combobox.blockSignals(True)
+        self._display_window_control.set_combobox(
+            self._get_explanation_list(entry_list),
             window_index)
 
+        self._set_window(window_index)
+
+    def _get_entry_list(self, initialized: Optional[bool] = None) \
+            -> Sequence[Tuple[str, Optional[int]]]:
+        """
+        Windows available in the combobox as (kind, index) pairs,
+        depending on whether tight windows have been extracted
+        """
+
+        if initialized is None:
+            initialized = self._extracted_windows.initialized
+
+        entry_list = [(DICOM_WINDOW, window_index)
+                      for window_index in
+                      range(len(self._dicom_window_list))]
+
+        if initialized:
+
+            entry_list.append((GLOBAL_WINDOW, None))
+
+            if self._has_frame_windows:
+                entry_list.append((FRAME_WINDOW, None))
+
+            if self._has_percentile_windows:
+
+                entry_list.append((GLOBAL_PERCENTILE_WINDOW, None))
+
+                if self._has_frame_windows:
+                    entry_list.append((FRAME_PERCENTILE_WINDOW, None))
+
+        entry_list.append((MANUAL_WINDOW, None))
+
+        return entry_list
+
+    def _get_entry_index(
+            self,
+            window_index: int,
+            entry_list: Sequence[Tuple[str, Optional[int]]]) -> int:
+        """
+        Index in entry_list of the window having the given index
+        when all windows are available (0 if not available)
+        """
+
+        entry = self._get_entry_list(initialized=True)[window_index]
+
+        return entry_list.index(entry) if entry in entry_list else 0
+
+    def _get_explanation_list(
+            self,
+            entry_list: Sequence[Tuple[str, Optional[int]]]) \
+            -> Sequence[str]:
+
+        explanation_dict = {
+            GLOBAL_WINDOW: GLOBAL_WINDOW_TEXT,
+            FRAME_WINDOW: FRAME_WINDOW_TEXT,
+            GLOBAL_PERCENTILE_WINDOW: GLOBAL_PERCENTILE_WINDOW_TEXT,
+            FRAME_PERCENTILE_WINDOW: FRAME_PERCENTILE_WINDOW_TEXT,
+            MANUAL_WINDOW: MANUAL_WINDOW_TEXT}
+
+        return [self._dicom_window_list[index].explanation
+                if kind == DICOM_WINDOW else explanation_dict[kind]
+                for kind, index in entry_list]
+
     # TODO: Should this be removed or repurposed?
     def _set_combobox(self,
                       explanation_list: Sequence[str],
@@ -154,28 +356,31 @@ class DisplayWindowController:
 
     def _set_window(self, window_index: int):
 
-        n_dicom_windows = len(self._dicom_window_list)
-        global_window_index = n_dicom_windows
-        frame_windows_index = global_window_index + 1 if \
-            self._frame_window_list is not None else None
+        kind, index = self._get_entry_list()[window_index]
 
         use_manual_window = False
 
-        if window_index < n_dicom_windows:
-            assert self._dicom_window_list is not None
-            window = self._dicom_window_list[window_index]
+        if kind == DICOM_WINDOW:
+            window = self._dicom_window_list[index]
 
-        elif window_index == global_window_index:
-            assert self._global_window is not None
-            window = self._global_window
+        elif kind == GLOBAL_WINDOW:
+            window = self._extracted_windows.global_window
+            assert window is not None
+
+        elif kind == GLOBAL_PERCENTILE_WINDOW:
+            window = self._extracted_windows.global_percentile_window
+            assert window is not None
 
-        elif frame_windows_index is not None and \
-                window_index == frame_windows_index:
-            assert self._frame_window_list is not None
+        elif kind in (FRAME_WINDOW, FRAME_PERCENTILE_WINDOW):
+            frame_window_list = \
+                self._extracted_windows.frame_window_list \
+                if kind == FRAME_WINDOW else \
+                self._extracted_windows.frame_percentile_window_list
+            assert frame_window_list is not None
             frame_index = \
                 self._frame_navigation.get_current_index()
             assert frame_index is not None
-            window = self._frame_window_list[frame_index]
+            window = frame_window_list[frame_index]
         else:
             # Manual window
             window = self._manual_window
@@ -200,7 +405,12 @@ class DisplayWindowController:
         self._display_window_control.enable_window_editing(
             use_manual_window)
 
-        self._on_window_index_change(window_index)
+        # Window index when all windows are available
+        complete_window_index = \
+            self._get_entry_list(initialized=True).index(
+                (kind, index))
+
+        self._on_window_index_change(complete_window_index)
 
     def _update_manual_window(self):
 
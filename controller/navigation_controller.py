@@ -4,6 +4,8 @@ Controller for navigating through a series (slices or frames)
 
 from typing import Callable, Optional, Sequence, Tuple, Union
 
+from PyQt5.QtCore import QTimer
+
 from QuickSeg.view.navigation_panel import \
     NavigationPanel
 from QuickSeg.view.series_selection_panel import \
@@ -37,6 +39,10 @@ class NavigationController:
         # Maximum values for index
         self._size_specifier: Optional[SizeSpecifier] = None
 
+        # Steps requested but not yet applied
+        self._pending_steps = 0
+        self._step_scheduled = False
+
         self._connect_signals_and_slots()
 
     def _connect_signals_and_slots(self):
@@ -104,6 +110,44 @@ class NavigationController:
 
         self._refresh_image()
 
+    def request_steps(self, n_steps: int):
+        """
+        Step through the index by n_steps (negative to go backward)
+
+        Steps are applied once pending events have been processed, so
+        that requests arriving while an image is being refreshed are
+        coalesced and only the latest index is displayed.
+        """
+
+        self._pending_steps += n_steps
+
+        if not self._step_scheduled:
+
+            self._step_scheduled = True
+
+            QTimer.singleShot(0, self._apply_pending_steps)
+
+    def _apply_pending_steps(self):
+
+        n_steps = self._pending_steps
+
+        self._pending_steps = 0
+        self._step_scheduled = False
+
+        if n_steps == 0 or not self._check_current_series_index():
+            return
+
+        # Pin value to allowed range
+        new_index = min(max(0, self._current_index + n_steps),
+                        self._get_max_index())
+
+        if new_index == self._current_index:
+            return
+
+        self.set_current_index(new_index)
+
+        self._refresh_image()
+
     def get_current_index(self):
 
         return self._current_index
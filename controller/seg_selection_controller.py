@@ -7,8 +7,12 @@ from os import getcwd
 
 from PyQt5.QtWidgets import QFileDialog
 
-from QuickSeg.model.model import Model
+from QuickSeg.model.chunked_seg import CHUNKED_SEG_FILE_SUFFIX
+from QuickSeg.model.model import Model, SegSave
+from QuickSeg.model.sparse_seg import SPARSE_SEG_FILE_SUFFIX
 
+from QuickSeg.view.popups import \
+    warning_popup
 from QuickSeg.view.seg_selection_panel import \
     SegmentationSelectionPanel
 from QuickSeg.view.series_selection_panel import \
@@ -16,12 +20,18 @@ from QuickSeg.view.series_selection_panel import \
 
 from QuickSeg.controller.display_controller import \
     DisplayController
+from QuickSeg.controller.worker import start_worker
 
 
 # TODO: Determine why connect isn't working when removing partial
 # TODO: Find something better and keep user's choice in memory
 DEFAULT_DIRECTORY = getcwd()
 
+SEG_FILE_FILTER = \
+    "Segmentation file (*.npy);;" \
+    "Compressed segmentation file (*.npz);;" \
+    "Chunked segmentation file (*.qseg)"
+
 
 class SegSelectionController:
 
@@ -62,6 +72,10 @@ class SegSelectionController:
             # TODO: Add warning
             return
 
+        # Segmentations need the shape of the volume
+        if not self._model.is_series_loaded(current_series_index):
+            return
+
         # Todo input new seg name
         new_seg_index = \
             self._model.add_new_seg(
@@ -94,18 +108,47 @@ class SegSelectionController:
             current_seg_index)
 
         # TODO: Make sure the file has the right extension
-        seg_file_path, _ = \
+        seg_file_path, selected_filter = \
             QFileDialog.getSaveFileName(
                 None,
                 f"Save segmentation \"{seg_name}\" to file",
                 DEFAULT_DIRECTORY,
-                "Segmentation file (*.npy)")
+                SEG_FILE_FILTER)
 
-        if seg_file_path:
-            self._model.save_seg(
-                seg_file_path,
-                current_series_index,
-                current_seg_index)
+        if not seg_file_path:
+            return
+
+        # The model saves in the format given by the suffix
+        for suffix in (SPARSE_SEG_FILE_SUFFIX, CHUNKED_SEG_FILE_SUFFIX):
+            if selected_filter.endswith(f"(*{suffix})") and \
+                    not seg_file_path.endswith(suffix):
+                seg_file_path += suffix
+
+        seg_save = self._model.start_seg_save(
+            seg_file_path,
+            current_series_index,
+            current_seg_index)
+
+        if seg_save is None:
+            warning_popup(
+                f"Segmentation \"{seg_name}\" is already being saved")
+            return
+
+        # Editing can go on while the file is written
+        start_worker(
+            seg_save.write,
+            on_finished=partial(self._finish_seg_save, seg_save),
+            on_failed=partial(self._fail_seg_save, seg_save))
+
+    def _finish_seg_save(self, seg_save: SegSave, _):
+
+        self._model.finish_seg_save(seg_save, True)
+
+    def _fail_seg_save(self, seg_save: SegSave, exception: Exception):
+
+        self._model.finish_seg_save(seg_save, False)
+
+        warning_popup(f"Could not save segmentation: {exception}")
 
     def _slot_load_seg_file(self):
 
@@ -117,18 +160,29 @@ class SegSelectionController:
             # TODO: Add warning
             return
 
+        # Segmentations need the shape of the volume
+        if not self._model.is_series_loaded(current_series_index):
+            return
+
         seg_file_path, _ = QFileDialog.getOpenFileName(
             None,
             "Select segmentation",
             DEFAULT_DIRECTORY,
-            "Segmentation file (*.npy)")
+            SEG_FILE_FILTER)
 
         if seg_file_path:
 
             # Load segmentation
-            new_seg_index = self._model.load_seg(
-                seg_file_path,
-                current_series_index)
+            try:
+                new_seg_index = self._model.load_seg(
+                    seg_file_path,
+                    current_series_index)
+
+            except (OSError, ValueError, EOFError) as exception:
+                # E.g. truncated or invalid file
+                warning_popup(
+                    f"Could not load segmentation: {exception}")
+                return
 
             # Return if segmentation didn't load successfully
             if new_seg_index is None:
@@ -2,16 +2,30 @@
 Controller for using segmentation tools
 """
 
-from DicomSeriesManager.reorientation import (
-    get_reoriented_PS,
-    reorient_from_axial)
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
 
-from DicomSeriesManager.utils import get_slice_limits
+import numpy as np
 
+from DicomSeriesManager.series import BaseSeries
+
+from QuickSeg.model.brush_utils import (
+    BRUSH_RADIUS,
+    get_disks_bounding_box,
+    paint_stroke,
+    stamp_disks,
+    StrokeBackup)
 from QuickSeg.model.lasso_utils import (
-    trace_line,
-    trace_line_on_mask)
+    BoundingBox,
+    fill_line_on_slice,
+    get_line_bounding_box,
+    trace_line)
 from QuickSeg.model.model import Model
+from QuickSeg.model.seg_history import SegEdit
+from QuickSeg.model.seg_utils import (
+    get_seg_slice,
+    Seg,
+    store_seg_slice)
 
 from QuickSeg.view.seg_selection_panel import \
     SegmentationSelectionPanel
@@ -24,6 +38,24 @@ from QuickSeg.controller.display_controller import \
     DisplayController
 
 
+@dataclass
+class _EditedSlice:
+    """
+    Displayed slice of the current segmentation and where it lies
+    """
+
+    series_index: int
+    seg_index: int
+    seg: Seg
+    series: BaseSeries
+    orientation: str
+    slice_index: int
+    FOV: Optional[list[float]]
+
+    # View of the segmentation if dense, copy otherwise
+    seg_slice: np.array
+
+
 class SegToolsController:
 
     def __init__(self,
@@ -55,6 +87,12 @@ class SegToolsController:
         self._tools_panel.eraser_button.\
             pressed.connect(self._eraser)
 
+        self._tools_panel.undo_button.\
+            pressed.connect(self._undo)
+
+        self._tools_panel.redo_button.\
+            pressed.connect(self._redo)
+
     def _add_area(self):
 
         self._area_tracing(add=True)
@@ -67,29 +105,170 @@ class SegToolsController:
 
         # Make sure there is a segmentation to work on
 
-        current_seg_index = \
-            self._seg_selection_panel.get_current_seg_index()
+        current_seg_index = self._get_current_seg_index()
 
         if current_seg_index is None:
             return
 
         # Trace line
 
-        line = trace_line(self._display_controller.get_fig())
+        # The slice must not change while the line is traced
+        self._display_controller.set_slice_navigation_enabled(False)
+
+        try:
+            line = trace_line(self._display_controller.get_fig())
+        finally:
+            self._display_controller.set_slice_navigation_enabled(True)
 
         if line is None:
             return
 
         # Get segmentation slice
 
+        edited_slice = self._get_edited_slice(current_seg_index)
+
+        seg_slice = edited_slice.seg_slice
+
+        # Get bounding box of the line, update seg within it only
+        # and refresh image
+
+        bbox = get_line_bounding_box(seg_slice.shape, line)
+
+        if bbox is None:
+            return
+
+        # Kept for undoing the edit
+        region_before = seg_slice[_get_region(bbox)].copy()
+
+        fill_line_on_slice(seg_slice, line, add, bbox=bbox)
+
+        self._store_edit(edited_slice, bbox, region_before)
+
+        self._display_controller.refresh_image()
+
+    def _undo(self):
+
+        self._apply_history(self._model.undo_seg_edit)
+
+    def _redo(self):
+
+        self._apply_history(self._model.redo_seg_edit)
+
+    def _apply_history(self, apply_seg_edit):
+
+        series_index = \
+            self._series_selection_panel.get_current_series_index()
+
+        current_seg_index = self._get_current_seg_index()
+
+        if current_seg_index is None:
+            return
+
+        if apply_seg_edit(series_index, current_seg_index):
+            self._display_controller.refresh_image()
+
+    def _brush(self):
+
+        self._painting(add=True)
+
+    def _eraser(self):
+
+        self._painting(add=False)
+
+    def _painting(self, *, add):
+
+        # Make sure there is a segmentation to work on
+
+        current_seg_index = self._get_current_seg_index()
+
+        if current_seg_index is None:
+            return
+
+        edited_slice = self._get_edited_slice(current_seg_index)
+
+        seg_slice = edited_slice.seg_slice
+
+        # Kept for undoing the stroke
+        stroke_backup = StrokeBackup(seg_slice)
+
+        def paint(centers_ij: np.array):
+
+            bbox = get_disks_bounding_box(
+                seg_slice.shape,
+                centers_ij,
+                BRUSH_RADIUS)
+
+            if bbox is None:
+                return
+
+            stroke_backup.extend(bbox)
+
+            # Only the region of the new disks is written and
+            # redrawn
+            stamp_disks(seg_slice, centers_ij, BRUSH_RADIUS, add)
+
+            self._display_controller.show_seg_region(seg_slice, bbox)
+
+        # The slice must not change while it is painted, nor the
+        # segmentation be replaced by a save finishing in the meantime
+        self._display_controller.set_slice_navigation_enabled(False)
+        self._model.set_edited_seg(edited_slice.seg)
+
+        try:
+            paint_stroke(
+                self._display_controller.get_fig(),
+                paint,
+                BRUSH_RADIUS)
+        finally:
+            self._model.set_edited_seg(None)
+            self._display_controller.set_slice_navigation_enabled(True)
+
+        if stroke_backup.bbox is None:
+            return
+
+        # The segmentation may have moved or been removed while
+        # painting (e.g. by a rescan)
+        seg_indices = self._model.find_seg(edited_slice.seg)
+
+        if seg_indices is not None:
+
+            series_index, seg_index = seg_indices
+
+            self._store_edit(
+                replace(edited_slice,
+                        series_index=series_index,
+                        seg_index=seg_index),
+                stroke_backup.bbox,
+                stroke_backup.region)
+
+        self._display_controller.refresh_image()
+
+    def _get_current_seg_index(self) -> Optional[int]:
+        """
+        Index of the segmentation to edit (None if there is none or if
+        the current series is still being loaded, in which case it
+        would be read again synchronously)
+        """
+
+        series_index = \
+            self._series_selection_panel.get_current_series_index()
+
+        if series_index is None or \
+                not self._model.is_series_loaded(series_index):
+            return None
+
+        return self._seg_selection_panel.get_current_seg_index()
+
+    def _get_edited_slice(self, seg_index: int) -> _EditedSlice:
+
         series_index = \
             self._series_selection_panel.\
             get_current_series_index()
 
-        current_seg = \
+        seg = \
             self._model.get_seg(
                 series_index,
-                current_seg_index)
+                seg_index)
 
         orientation = \
             self._display_controller._orientation_controller.\
@@ -100,11 +279,6 @@ class SegToolsController:
             _slice_navigation_controller.\
             get_current_index()
 
-        seg_slice = reorient_from_axial(
-            current_seg,
-            orientation,
-            slice_index)
-
         FOV_list = self._model.get_display_parameters(
             series_index).current_FOV
 
@@ -112,33 +286,60 @@ class SegToolsController:
 
         series = self._model.goc_series(series_index)
 
-        pixel_spacing = \
-            get_reoriented_PS(series.get_frame(), orientation)
-
-        if FOV is not None:
-
-            x_range, y_range = \
-                get_slice_limits(
-                    FOV,
-                    seg_slice.shape,
-                    pixel_spacing)
-
-            seg_slice = \
-                seg_slice[y_range[0]:y_range[1]+1,
-                          x_range[0]:x_range[1]+1]
-
-        # Get mask, update seg and refresh image
-
-        mask = trace_line_on_mask(seg_slice.shape, line)
-
-        seg_slice[mask] = add
-
-        self._display_controller.refresh_image()
-
-    def _brush(self):
-
-        self._display_controller.refresh_image()
-
-    def _eraser(self):
-
-        self._display_controller.refresh_image()
+        seg_slice = get_seg_slice(
+            seg,
+            series,
+            orientation,
+            slice_index,
+            FOV)
+
+        return _EditedSlice(
+            series_index,
+            seg_index,
+            seg,
+            series,
+            orientation,
+            slice_index,
+            FOV,
+            seg_slice)
+
+    def _store_edit(self,
+                    edited_slice: _EditedSlice,
+                    bbox: BoundingBox,
+                    region_before: np.array):
+        """
+        Write back the region of an edited slice, then record it as
+        modified and in the undo history
+        """
+
+        slice_range = store_seg_slice(
+            edited_slice.seg,
+            edited_slice.series,
+            edited_slice.orientation,
+            edited_slice.slice_index,
+            edited_slice.FOV,
+            edited_slice.seg_slice,
+            bbox)
+
+        self._model.set_seg_modified(
+            edited_slice.series_index,
+            edited_slice.seg_index,
+            slice_range)
+
+        self._model.record_seg_edit(
+            edited_slice.series_index,
+            edited_slice.seg_index,
+            SegEdit.make(
+                edited_slice.orientation,
+                edited_slice.slice_index,
+                edited_slice.FOV,
+                bbox,
+                region_before,
+                edited_slice.seg_slice[_get_region(bbox)]))
+
+
+def _get_region(bbox: BoundingBox) -> Tuple[slice, slice]:
+
+    (i_first, i_last), (j_first, j_last) = bbox
+
+    return np.s_[i_first:i_last+1, j_first:j_last+1]
@@ -4,10 +4,20 @@ Controller for selecting a series to display
 
 from functools import partial
 from os import getcwd
+from threading import Event
+from typing import Callable, Optional
 
 from PyQt5.QtWidgets import QFileDialog
 
-from QuickSeg.model.model import Model
+from QuickSeg.model.dicom_dir_scan import (
+    DicomDirIndex,
+    read_missing_headers,
+    rescan_dicom_dir,
+    RescanResult,
+    scan_dicom_dir,
+    ScanProgress)
+from QuickSeg.model.model import Model, SeriesLoad
+from QuickSeg.model.series_preview import Preview, read_preview_slice
 
 from QuickSeg.view.popups import \
     warning_popup
@@ -18,11 +28,16 @@ from QuickSeg.controller.display_controller import \
     DisplayController
 from QuickSeg.controller.seg_selection_controller import \
     SegSelectionController
+from QuickSeg.controller.worker import start_worker
 
 
 # TODO: Make same change here as in seg_selection_controller
 DEFAULT_DIRECTORY = getcwd()
 
+# Positions relative to the current series of the series read ahead
+# of being selected, by order of priority
+PRELOAD_OFFSETS = (1, -1)
+
 
 class SeriesSelectionController:
 
@@ -37,6 +52,13 @@ class SeriesSelectionController:
         self._seg_selection_controller = seg_selection_controller
         self._display_controller = display_controller
 
+        # Set to cancel the running directory scan (None if none)
+        self._scan_cancel_event: Optional[Event] = None
+
+        # Set to stop reading the headers of the files of the directory
+        # (None if not reading them)
+        self._header_cancel_event: Optional[Event] = None
+
         self._connect_signals_and_slots()
 
     def _connect_signals_and_slots(self):
@@ -50,9 +72,15 @@ class SeriesSelectionController:
         self._series_selection_panel.load_dir_content_button.\
             clicked.connect(partial(self._slot_load_dir_content))
 
+        self._series_selection_panel.rescan_dicom_dir_button.\
+            clicked.connect(partial(self._slot_rescan_dicom_dir))
+
         self._series_selection_panel.series_list.\
             currentRowChanged.connect(self._slot_series_list)
 
+        self._series_selection_panel.cancel_scan_button.\
+            clicked.connect(partial(self._slot_cancel_scan))
+
     def _slot_open_dicom_dir(self, _):
 
         dicom_dir_path = QFileDialog.getExistingDirectory(
@@ -61,9 +89,70 @@ class SeriesSelectionController:
             DEFAULT_DIRECTORY)
 
         if dicom_dir_path:
-            self._model.read_dicom_dir(dicom_dir_path)
+
+            def apply_scan(scan_result):
+
+                self._model.set_dicom_dir_content(*scan_result)
+                self._refresh_series_list()
+                self._display_controller.refresh_image()
+                self._start_header_read()
+
+            self._start_scan(
+                scan_dicom_dir,
+                dicom_dir_path,
+                on_scanned=apply_scan)
+
+    def _slot_rescan_dicom_dir(self, _):
+
+        if not self._model.dicom_dir_is_loaded():
+
+            warning_popup("No dicom directory is loaded")
+            return
+
+        dicom_dir_index = self._model.get_dicom_dir_index()
+
+        if dicom_dir_index is None:
+
+            # Content read without indexing: Every file is indexed
+            # and every series is considered changed
+            dicom_dir_path = QFileDialog.getExistingDirectory(
+                None,
+                "Select the DICOM directory to rescan",
+                DEFAULT_DIRECTORY)
+
+            if not dicom_dir_path:
+                return
+
+            dicom_dir_index = DicomDirIndex(dicom_dir_path, [])
+
+        current_series_index = \
+            self._series_selection_panel.get_current_series_index()
+
+        def apply_rescan(rescan_result: RescanResult):
+
+            new_index_list = \
+                self._model.update_dicom_dir_content(rescan_result)
+
             self._refresh_series_list()
-            self._display_controller.refresh_image()
+            self._start_header_read()
+
+            # Select the same series as before if it still exists
+            if current_series_index is not None and \
+                    new_index_list[current_series_index] is not None:
+                self._series_selection_panel.series_list.\
+                    setCurrentRow(new_index_list[current_series_index])
+            else:
+                self._display_controller.refresh_image()
+
+        self._start_scan(
+            rescan_dicom_dir,
+            dicom_dir_index,
+            on_scanned=apply_rescan,
+            clear_list=False)
+
+    def _slot_cancel_scan(self, _):
+
+        self._cancel_scan()
 
     def _slot_save_dir_content(self, _):
 
@@ -91,21 +180,155 @@ class SeriesSelectionController:
             "DICOM directory content (*.dir)")
 
         if content_file_path:
+            self._cancel_scan()
             self._model.load_dicom_dir_content(content_file_path)
             self._refresh_series_list()
+            self._start_header_read()
 
     def _slot_series_list(self, series_index):
 
         if series_index == -1:
+            self._model.set_current_series(None)
             return
 
+        self._model.set_current_series(series_index)
+
+        if self._model.is_series_loaded(series_index):
+            self._show_series(series_index)
+        else:
+            self._start_series_load(series_index)
+
+    def _show_series(self, series_index: int):
+
         self._display_controller.update_series()
         self._seg_selection_controller.refresh_seg_list()
         if not self._seg_selection_controller.restore_seg():
             self._display_controller.refresh_image()
 
-        self._series_selection_panel.set_series_to_loaded(
-            series_index)
+        self._refresh_series_loaded_list()
+
+        self._preload_adjacent_series(series_index)
+
+    def _start_series_load(self, series_index: int):
+        """
+        Read a series in the background, showing its middle slice in
+        the meantime if its files are known
+
+        The series is shown once loaded if it is still selected.
+        """
+
+        self._seg_selection_controller.refresh_seg_list()
+
+        # Don't leave the previous series on display
+        self._display_controller.clear_image()
+
+        series_load = self._model.start_series_load(series_index)
+
+        if series_load is None:
+            # Already being loaded (e.g. preloaded), shown once loaded
+            return
+
+        def is_current() -> bool:
+
+            return self._model.find_series_load(series_load) == \
+                self._series_selection_panel.get_current_series_index()
+
+        def on_preview(preview: Optional[Preview]):
+
+            if preview is not None and is_current() and \
+                    not self._model.is_series_loaded(
+                        series_load.series_index):
+                self._display_controller.show_preview(*preview)
+
+        file_path_list = \
+            self._model.get_series_file_paths(series_index)
+
+        if file_path_list:
+            start_worker(
+                read_preview_slice,
+                file_path_list,
+                on_finished=on_preview)
+
+        start_worker(
+            series_load.read,
+            on_finished=partial(self._finish_series_load, series_load),
+            on_failed=partial(self._fail_series_load, series_load))
+
+    def _finish_series_load(self, series_load: SeriesLoad, series):
+
+        series_index = \
+            self._model.finish_series_load(series_load, series)
+
+        # Removed while being loaded
+        if series_index is None:
+            return
+
+        is_current = series_index == \
+            self._series_selection_panel.get_current_series_index()
+
+        if series is None:
+            # Preload skipped for not fitting in memory, started again
+            # if the series was selected before being skipped
+            if is_current:
+                self._start_series_load(series_index)
+
+        elif is_current:
+            self._show_series(series_index)
+        else:
+            self._refresh_series_loaded_list()
+
+    def _fail_series_load(self,
+                          series_load: SeriesLoad,
+                          exception: Exception):
+
+        self._model.finish_series_load(series_load, None)
+
+        warning_popup(f"Could not load series: {exception}")
+
+    def _preload_adjacent_series(self, series_index: int):
+        """
+        Read the series next to the current one in the background so
+        that stepping through the list doesn't wait for reading
+
+        Preloaded series are only kept within the memory budget.
+        """
+
+        n_series = len(self._model.get_series_info())
+
+        for offset in PRELOAD_OFFSETS:
+
+            preload_index = series_index + offset
+
+            if not 0 <= preload_index < n_series:
+                continue
+
+            series_load = self._model.start_series_load(
+                preload_index,
+                preload=True)
+
+            if series_load is None:
+                continue
+
+            start_worker(
+                series_load.read,
+                on_finished=partial(
+                    self._finish_series_load,
+                    series_load),
+                on_failed=partial(
+                    self._fail_series_preload,
+                    series_load))
+
+    def _fail_series_preload(self,
+                             series_load: SeriesLoad,
+                             exception: Exception):
+
+        series_index = \
+            self._model.finish_series_load(series_load, None)
+
+        # Only reported if the series was selected in the meantime
+        if series_index is not None and series_index == \
+                self._series_selection_panel.get_current_series_index():
+            warning_popup(f"Could not load series: {exception}")
 
     def _slot_delete_series(self, series_index, _):
 
@@ -114,6 +337,144 @@ class SeriesSelectionController:
         self._refresh_series_list()
         self._display_controller.refresh_image()
 
+    def _start_scan(self,
+                    scan_task: Callable,
+                    *args,
+                    on_scanned: Callable,
+                    clear_list: bool = True):
+        """
+        Run a scan of a DICOM directory in the background
+
+        scan_task is called with args, a cancellation event and a
+        progress callback. on_scanned is called with its result. If
+        clear_list is True, discovered series are listed as the scan
+        progresses and can be selected once it is over.
+        """
+
+        self._cancel_scan()
+        self._cancel_header_read()
+
+        cancel_event = Event()
+        self._scan_cancel_event = cancel_event
+
+        self._series_selection_panel.start_scan_progress(clear_list)
+
+        if clear_list:
+            self._display_controller.refresh_image()
+
+        def on_progress(progress: ScanProgress):
+
+            if cancel_event.is_set():
+                return
+
+            if clear_list:
+                for series_name in progress.new_series_list:
+                    self._series_selection_panel.\
+                        add_discovered_series(series_name)
+
+            self._series_selection_panel.set_scan_progress(
+                progress.n_files_read,
+                progress.n_files)
+
+        def on_finished(scan_result):
+
+            if cancel_event.is_set():
+                return
+
+            self._scan_cancel_event = None
+            self._series_selection_panel.stop_scan_progress()
+
+            on_scanned(scan_result)
+
+        def on_failed(exception: Exception):
+
+            # Includes the exception raised when cancelling
+            if cancel_event.is_set():
+                return
+
+            self._scan_cancel_event = None
+            self._series_selection_panel.stop_scan_progress()
+
+            # Restore the series of the current directory
+            self._refresh_series_list()
+
+            warning_popup(
+                f"Could not scan DICOM directory: {exception}")
+
+        start_worker(
+            scan_task,
+            *args,
+            cancel_event,
+            on_finished=on_finished,
+            on_failed=on_failed,
+            on_progress=on_progress)
+
+    def _cancel_scan(self):
+
+        if self._scan_cancel_event is None:
+            return
+
+        self._scan_cancel_event.set()
+        self._scan_cancel_event = None
+
+        self._series_selection_panel.stop_scan_progress()
+
+        # Restore the series of the current directory
+        self._refresh_series_list()
+
+    def _start_header_read(self):
+        """
+        Read in the background the headers of the files that were only
+        listed when the directory was scanned
+
+        Headers tell the files of each series, which are used to
+        preview series and to find the series changed by a rescan.
+        """
+
+        self._cancel_header_read()
+
+        dicom_dir_index = self._model.get_dicom_dir_index()
+
+        if dicom_dir_index is None or \
+                all(file_header.header_read
+                    for file_header in dicom_dir_index.file_header_list):
+            return
+
+        cancel_event = Event()
+        self._header_cancel_event = cancel_event
+
+        def on_finished(completed_index: DicomDirIndex):
+
+            if cancel_event.is_set():
+                return
+
+            self._header_cancel_event = None
+            self._model.complete_dicom_dir_index(
+                dicom_dir_index,
+                completed_index)
+
+        def on_failed(_):
+
+            # Includes the exception raised when cancelling. Headers
+            # are otherwise read again after the next rescan.
+            if not cancel_event.is_set():
+                self._header_cancel_event = None
+
+        start_worker(
+            read_missing_headers,
+            dicom_dir_index,
+            cancel_event,
+            on_finished=on_finished,
+            on_failed=on_failed)
+
+    def _cancel_header_read(self):
+
+        if self._header_cancel_event is None:
+            return
+
+        self._header_cancel_event.set()
+        self._header_cancel_event = None
+
     def _refresh_series_list(self):
 
         series_info = self._model.get_series_info()
@@ -123,3 +484,20 @@ class SeriesSelectionController:
             self._slot_delete_series)
 
         self._seg_selection_controller.refresh_seg_list()
+
+    def _refresh_series_loaded_list(self):
+        """
+        Loading a series may have released others to save memory
+        """
+
+        series_info = self._model.get_series_info()
+
+        # While scanning, the list may hold the series discovered so
+        # far. It is refreshed once the scan is over.
+        if self._scan_cancel_event is not None or \
+                len(series_info) != \
+                self._series_selection_panel.series_list.count():
+            return
+
+        self._series_selection_panel.set_series_loaded_list(
+            [series_loaded for _, series_loaded in series_info])
@@ -0,0 +1,96 @@
+"""
+Worker for running tasks in the background
+"""
+
+from typing import Callable, Optional
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    """
+    Signals emitted by a worker, delivered in the GUI thread
+    """
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    progress = pyqtSignal(object)
+
+
+class Worker(QRunnable):
+    """
+    Runnable executing a task on the global thread pool
+    """
+
+    def __init__(self, task: Callable, *args, **kwargs):
+        super().__init__()
+
+        self._task = task
+        self._args = args
+        self._kwargs = kwargs
+
+        # Created in the GUI thread so that connected slots are
+        # executed in the GUI thread
+        self.signals = WorkerSignals()
+
+        # Lifetime is managed on the Python side
+        self.setAutoDelete(False)
+
+    def set_report_progress(self):
+
+        self._kwargs['report_progress'] = self.signals.progress.emit
+
+    def run(self):
+
+        try:
+            result = self._task(*self._args, **self._kwargs)
+
+        except Exception as exception:
+            self.signals.failed.emit(exception)
+
+        else:
+            self.signals.finished.emit(result)
+
+
+# Workers are kept alive until their signals have been delivered
+_running_workers = set()
+
+
+def start_worker(task: Callable,
+                 *args,
+                 on_finished: Optional[Callable] = None,
+                 on_failed: Optional[Callable] = None,
+                 on_progress: Optional[Callable] = None,
+                 **kwargs) -> Worker:
+    """
+    Run task(*args, **kwargs) in the background
+
+    on_finished is called with the result of the task and on_failed
+    with the exception it raised, both in the GUI thread. If
+    on_progress is given, the task is also passed report_progress, a
+    function whose arguments are forwarded to on_progress in the GUI
+    thread.
+    """
+
+    worker = Worker(task, *args, **kwargs)
+
+    if on_progress is not None:
+        worker.signals.progress.connect(on_progress)
+        worker.set_report_progress()
+
+    def release(_):
+        _running_workers.discard(worker)
+
+    if on_finished is not None:
+        worker.signals.finished.connect(on_finished)
+    if on_failed is not None:
+        worker.signals.failed.connect(on_failed)
+
+    worker.signals.finished.connect(release)
+    worker.signals.failed.connect(release)
+
+    _running_workers.add(worker)
+
+    QThreadPool.globalInstance().start(worker)
+
+    return worker
@@ -37,7 +37,13 @@ class ZoomController:
 
     def _select_region(self):
 
-        region = select_region(self._display_area.get_fig())
+        # The slice must not change while the region is selected
+        self._display_area.set_slice_navigation_enabled(False)
+
+        try:
+            region = select_region(self._display_area.get_fig())
+        finally:
+            self._display_area.set_slice_navigation_enabled(True)
 
         if region is None:
             return
@@ -0,0 +1,120 @@
+"""
+Utility class for redrawing interactive artists with blitting
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from matplotlib.artist import Artist
+from matplotlib.backend_bases import DrawEvent
+from matplotlib.figure import Figure
+from matplotlib.transforms import Bbox
+
+# Extra margin around the artist to cover antialiasing (pixels)
+BLIT_MARGIN = 2
+
+
+class ArtistBlitter:
+    """
+    Redraw a single animated artist over a cached background
+
+    The figure is fully drawn once without the artist and the result
+    is kept as background. Updates then only restore the background
+    and draw the artist on top of it, and only the rectangle covering
+    the artist before and after the update is copied to the screen.
+    The background is captured again whenever the figure is fully
+    redrawn (e.g. on resize).
+    """
+
+    def __init__(self, fig: Figure, artist: Artist):
+
+        self._fig = fig
+        self._canvas = fig.canvas
+        self._artist = artist
+        self._background = None
+
+        # Rectangle covered by the artist on the screen when last
+        # drawn
+        self._extent: Optional[Bbox] = None
+
+        # Animated artists are skipped by full draws
+        self._artist.set_animated(True)
+
+        self._draw_cid = \
+            self._canvas.mpl_connect('draw_event', self._on_draw)
+
+        self._canvas.draw()
+
+    def update(self):
+
+        if self._background is None:
+
+            self._canvas.draw()
+            return
+
+        self._canvas.restore_region(self._background)
+        self._fig.draw_artist(self._artist)
+
+        last_extent = self._extent
+        self._extent = self._get_extent()
+
+        self._blit(last_extent, self._extent)
+
+    def remove(self):
+        """
+        Remove the artist and restore the background
+        """
+
+        self._canvas.mpl_disconnect(self._draw_cid)
+
+        self._artist.remove()
+
+        if self._background is not None:
+
+            self._canvas.restore_region(self._background)
+            self._blit(self._extent)
+
+    def _get_extent(self) -> Optional[Bbox]:
+        """
+        Rectangle covered by the artist on the screen, None if it
+        isn't drawn
+        """
+
+        extent = self._artist.get_window_extent(
+            self._canvas.get_renderer())
+
+        if not np.all(np.isfinite(extent.extents)):
+            return None
+
+        # Window extents don't include the line width
+        line_width = self._artist.get_linewidth() \
+            if hasattr(self._artist, 'get_linewidth') else 0
+
+        return extent.padded(
+            line_width * self._fig.dpi / 72 + BLIT_MARGIN)
+
+    def _blit(self, *extent_list: Optional[Bbox]):
+        """
+        Copy the rectangle covering all given extents to the screen
+        """
+
+        extent_list = [extent for extent in extent_list
+                       if extent is not None]
+
+        if not extent_list:
+            return
+
+        bbox = Bbox.intersection(Bbox.union(extent_list), self._fig.bbox)
+
+        if bbox is not None:
+            self._canvas.blit(bbox)
+
+    def _on_draw(self, event: DrawEvent):
+
+        self._background = \
+            self._canvas.copy_from_bbox(self._fig.bbox)
+
+        self._fig.draw_artist(self._artist)
+
+        self._extent = self._get_extent()
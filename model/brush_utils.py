@@ -0,0 +1,240 @@
+"""
+Utility functions for implementing brush tools
+"""
+
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from matplotlib._blocking_input import blocking_input_loop
+from matplotlib.backend_bases import MouseButton, Event
+
+from QuickSeg.model.lasso_utils import BoundingBox
+
+
+_float = np.float32
+
+# TODO: Make this a settable parameter
+BRUSH_RADIUS = 5
+
+# Distance between consecutive disks stamped along a stroke, as a
+# fraction of the radius
+STAMP_SPACING = 0.5
+
+
+@lru_cache
+def get_disk_offsets(radius: int) -> Tuple[np.array, np.array]:
+    """
+    Offsets (i, j) from its center of the pixels of a disk
+    """
+
+    i, j = np.mgrid[-radius:radius+1, -radius:radius+1]
+
+    in_disk = i**2 + j**2 <= radius**2
+
+    return i[in_disk], j[in_disk]
+
+
+def interpolate_stroke(start_ij: np.array,
+                       end_ij: np.array,
+                       radius: int) -> np.array:
+    """
+    Points from start (excluded) to end (included) close enough for
+    the disks stamped on them to overlap
+    """
+
+    spacing = max(STAMP_SPACING * radius, 1)
+
+    distance = np.linalg.norm(end_ij - start_ij)
+
+    n_points = max(int(np.ceil(distance / spacing)), 1)
+
+    fractions = np.arange(1, n_points + 1, dtype=_float) / n_points
+
+    return start_ij + fractions[:, np.newaxis] * (end_ij - start_ij)
+
+
+def get_disks_bounding_box(shape: Tuple[int, int],
+                           centers_ij: np.array,
+                           radius: int) -> Optional[BoundingBox]:
+    """
+    Bounding box of the pixels of a slice of the given shape within
+    disks centered on the given points (None if the disks don't touch
+    the slice)
+    """
+
+    centers_ij = np.rint(np.asarray(centers_ij)).astype(int)
+
+    i_range, j_range = [
+        (max(0, int(centers.min()) - radius),
+         min(dim_size - 1, int(centers.max()) + radius))
+        for centers, dim_size in zip(centers_ij.T, shape)]
+
+    if i_range[0] > i_range[1] or j_range[0] > j_range[1]:
+        return None
+
+    return i_range, j_range
+
+
+def stamp_disks(im_slice: np.array,
+                centers_ij: np.array,
+                radius: int,
+                value) -> Optional[BoundingBox]:
+    """
+    Set to value the pixels of im_slice within disks centered on the
+    given points
+
+    Only the region of the slice within the bounding box of the disks
+    is accessed. The bounding box that was written is returned (None if
+    the disks don't touch the slice).
+    """
+
+    centers_ij = np.rint(np.asarray(centers_ij)).astype(int)
+
+    bbox = get_disks_bounding_box(im_slice.shape, centers_ij, radius)
+
+    if bbox is None:
+        return None
+
+    i_range, j_range = bbox
+
+    # Pixels of every disk with respect to the bounding box
+    offsets_i, offsets_j = get_disk_offsets(radius)
+
+    pixels_i = \
+        (centers_ij[:, 0, np.newaxis] + offsets_i - i_range[0]).ravel()
+    pixels_j = \
+        (centers_ij[:, 1, np.newaxis] + offsets_j - j_range[0]).ravel()
+
+    sub_slice = im_slice[i_range[0]:i_range[1]+1,
+                         j_range[0]:j_range[1]+1]
+
+    in_slice = \
+        (pixels_i >= 0) & (pixels_i < sub_slice.shape[0]) & \
+        (pixels_j >= 0) & (pixels_j < sub_slice.shape[1])
+
+    sub_slice[pixels_i[in_slice], pixels_j[in_slice]] = value
+
+    return i_range, j_range
+
+
+class StrokeBackup:
+    """
+    Pixels of a slice within the bounding box of a stroke as they were
+    before the stroke, for undoing it
+
+    Only pixels within the bounding box are copied, as it grows.
+    """
+
+    def __init__(self, im_slice: np.array):
+
+        self._im_slice = im_slice
+
+        # None until the stroke touches the slice
+        self.bbox: Optional[BoundingBox] = None
+        self.region: Optional[np.array] = None
+
+    def extend(self, bbox: BoundingBox):
+        """
+        Grow the bounding box to cover bbox before its pixels are
+        painted
+        """
+
+        if self.bbox is not None:
+            bbox = tuple(
+                (min(first, other_first), max(last, other_last))
+                for (first, last), (other_first, other_last)
+                in zip(self.bbox, bbox))
+
+            if bbox == self.bbox:
+                return
+
+        (i_first, i_last), (j_first, j_last) = bbox
+
+        region = \
+            self._im_slice[i_first:i_last+1, j_first:j_last+1].copy()
+
+        if self.bbox is not None:
+
+            # Pixels already covered may have been painted since
+            (i_start, i_end), (j_start, j_end) = [
+                (first - region_first, last - region_first + 1)
+                for (first, last), (region_first, _)
+                in zip(self.bbox, bbox)]
+
+            region[i_start:i_end, j_start:j_end] = self.region
+
+        self.bbox = bbox
+        self.region = region
+
+
+def paint_stroke(fig,
+                 paint: Callable[[np.array], None],
+                 radius: int) -> bool:
+    """
+    Follow a stroke of the mouse with its left button pressed
+
+    paint is called with the points (i, j) reached since its last call,
+    interpolated so that disks of the given radius stamped on them
+    overlap. Returns False if no stroke was made.
+    """
+
+    last_position_ij = None
+
+    def handler(event: Event):
+
+        nonlocal last_position_ij
+
+        left_button_pressed = \
+            event.name == "button_press_event" \
+            and event.button == MouseButton.LEFT
+        left_button_released = \
+            event.name == "button_release_event" \
+            and event.button == MouseButton.LEFT
+        mouse_moved = event.name == "motion_notify_event"
+        key_pressed = event.name == "key_press_event"
+        escape_pressed = key_pressed and event.key in ['escape']
+
+        in_axes = event.inaxes is not None
+
+        stroke_started = last_position_ij is not None
+
+        if escape_pressed or left_button_released:
+
+            fig.canvas.stop_event_loop()
+            return
+
+        if not in_axes:
+            # TODO: Add logic for out of bounds
+            return
+
+        current_position_ij = \
+            np.array([event.ydata, event.xdata], dtype=_float)
+
+        if left_button_pressed:
+
+            last_position_ij = current_position_ij
+
+            paint(current_position_ij[np.newaxis])
+
+        elif mouse_moved and stroke_started:
+
+            paint(interpolate_stroke(
+                last_position_ij,
+                current_position_ij,
+                radius))
+
+            last_position_ij = current_position_ij
+
+    events = ["button_press_event",
+              "button_release_event",
+              "motion_notify_event",
+              "key_press_event"]
+
+    # Necessary to record keyboard events correctly
+    fig.canvas.setFocus()
+
+    blocking_input_loop(fig, events, -1, handler)
+
+    return last_position_ij is not None
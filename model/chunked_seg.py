@@ -0,0 +1,430 @@
+"""
+Chunked segmentation files with partial writes and on-demand reads
+"""
+
+import os
+import struct
+import zlib
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, Mapping, Optional, Tuple, Self
+
+import numpy as np
+
+from QuickSeg.model.sparse_seg import SliceChunk, SparseSeg
+
+
+CHUNKED_SEG_FILE_SUFFIX = '.qseg'
+
+CHUNKED_SEG_MAGIC = b'QSEGCHNK'
+CHUNKED_SEG_VERSION = 1
+
+# Magic, version, shape, offset and size of the chunk index
+_HEADER = struct.Struct('<8sI3QQQ')
+
+# Origin and shape of the bounding box of a chunk
+_CHUNK_HEADER = struct.Struct('<4I')
+
+# Offset and size in the file of the chunk of each axial slice (size 0
+# for empty slices)
+_INDEX_DTYPE = np.dtype([('offset', '<u8'), ('size', '<u8')])
+
+# The file is rewritten once its size exceeds this multiple of the
+# size of its live chunks, chunks being appended on partial writes
+COMPACTION_RATIO = 2.0
+
+# Level of zlib compression of chunks
+COMPRESSION_LEVEL = 6
+
+
+def _encode_chunk(chunk: SliceChunk) -> bytes:
+
+    return _CHUNK_HEADER.pack(chunk.i_first, chunk.j_first, *chunk.shape) + \
+        zlib.compress(chunk.bits.tobytes(), COMPRESSION_LEVEL)
+
+
+def _decode_chunk(data: bytes) -> SliceChunk:
+
+    i_first, j_first, n_rows, n_cols = \
+        _CHUNK_HEADER.unpack_from(data)
+
+    bits = np.frombuffer(
+        zlib.decompress(data[_CHUNK_HEADER.size:]),
+        dtype=np.uint8)
+
+    return SliceChunk(i_first, j_first, (n_rows, n_cols), bits)
+
+
+def _read_header(seg_file) -> Tuple[Tuple[int, int, int], np.ndarray]:
+    """
+    Shape and chunk index of an open file
+
+    Raises ValueError if the file is not a valid segmentation file.
+    """
+
+    seg_file.seek(0)
+    header = seg_file.read(_HEADER.size)
+
+    if len(header) != _HEADER.size:
+        raise ValueError("Invalid segmentation file: Truncated header")
+
+    magic, version, *shape, index_offset, index_size = \
+        _HEADER.unpack(header)
+
+    if magic != CHUNKED_SEG_MAGIC:
+        raise ValueError("Invalid segmentation file: Wrong magic number")
+
+    if version != CHUNKED_SEG_VERSION:
+        raise ValueError(
+            f"Unsupported segmentation file version: {version}")
+
+    seg_file.seek(index_offset)
+    index = np.frombuffer(
+        zlib.decompress(seg_file.read(index_size)),
+        dtype=_INDEX_DTYPE)
+
+    if len(index) != shape[0]:
+        raise ValueError("Invalid segmentation file: Wrong index size")
+
+    return tuple(shape), index.copy()
+
+
+def _append_index(seg_file,
+                  shape: Tuple[int, int, int],
+                  index: np.ndarray):
+    """
+    Append the chunk index at the end of an open file, then point the
+    header to it
+
+    The header is written last so that an interrupted write leaves the
+    previous index in use.
+    """
+
+    index_data = zlib.compress(index.tobytes(), COMPRESSION_LEVEL)
+
+    index_offset = seg_file.seek(0, os.SEEK_END)
+    seg_file.write(index_data)
+    seg_file.flush()
+    os.fsync(seg_file.fileno())
+
+    seg_file.seek(0)
+    seg_file.write(_HEADER.pack(
+        CHUNKED_SEG_MAGIC,
+        CHUNKED_SEG_VERSION,
+        *shape,
+        index_offset,
+        len(index_data)))
+
+
+def write_chunked_seg(seg_file_path: str,
+                      shape: Tuple[int, int, int],
+                      get_chunk: Callable[[int], Optional[SliceChunk]]):
+    """
+    Write a whole segmentation given the chunk of each axial slice
+
+    The file is written to a temporary file first so that an
+    interrupted write doesn't corrupt an existing file.
+    """
+
+    temp_file_path = f'{seg_file_path}.tmp'
+
+    index = np.zeros(shape[0], dtype=_INDEX_DTYPE)
+
+    with open(temp_file_path, 'wb') as seg_file:
+
+        # Placeholder for the header
+        seg_file.write(bytes(_HEADER.size))
+
+        for slice_index in range(shape[0]):
+
+            chunk = get_chunk(slice_index)
+
+            if chunk is None:
+                continue
+
+            data = _encode_chunk(chunk)
+
+            index[slice_index] = seg_file.tell(), len(data)
+            seg_file.write(data)
+
+        _append_index(seg_file, shape, index)
+
+    os.replace(temp_file_path, seg_file_path)
+
+
+def update_chunked_seg(seg_file_path: str,
+                       chunk_dict: Mapping[int, Optional[SliceChunk]]) \
+        -> bool:
+    """
+    Write the chunks of the given axial slices only (None for empty
+    slices)
+
+    New chunks are appended, leaving the others in place. The file is
+    compacted by rewriting it once too much of it is taken by chunks
+    that were replaced. Returns True if the file was compacted.
+    """
+
+    if not chunk_dict:
+        return False
+
+    with open(seg_file_path, 'r+b') as seg_file:
+
+        shape, index = _read_header(seg_file)
+
+        live_size = int(index['size'].sum())
+        file_size = seg_file.seek(0, os.SEEK_END)
+
+        new_data_dict = \
+            {slice_index: _encode_chunk(chunk)
+             for slice_index, chunk in chunk_dict.items()
+             if chunk is not None}
+
+        new_live_size = \
+            live_size - \
+            sum(int(index[slice_index]['size'])
+                for slice_index in chunk_dict) + \
+            sum(len(data) for data in new_data_dict.values())
+
+        new_file_size = \
+            file_size + sum(len(data) for data in new_data_dict.values())
+
+        if new_file_size <= COMPACTION_RATIO * max(new_live_size, 1):
+
+            for slice_index in chunk_dict:
+
+                data = new_data_dict.get(slice_index)
+
+                if data is None:
+                    index[slice_index] = 0, 0
+                    continue
+
+                index[slice_index] = seg_file.tell(), len(data)
+                seg_file.write(data)
+
+            _append_index(seg_file, shape, index)
+
+            return False
+
+        def get_chunk(slice_index: int) -> Optional[SliceChunk]:
+
+            if slice_index in chunk_dict:
+                return chunk_dict[slice_index]
+
+            return _read_chunk(seg_file, index, slice_index)
+
+        # The file is read while a new one is written in its place
+        write_chunked_seg(seg_file_path, shape, get_chunk)
+
+    return True
+
+
+def _read_chunk(seg_file,
+                index: np.ndarray,
+                slice_index: int) -> Optional[SliceChunk]:
+
+    offset, size = index[slice_index]
+
+    if size == 0:
+        return None
+
+    seg_file.seek(int(offset))
+
+    return _decode_chunk(seg_file.read(int(size)))
+
+
+class _SharedFile:
+    """
+    Open file shared by a chunked segmentation and its copies, closed
+    once all of them are closed
+    """
+
+    def __init__(self, file):
+
+        self.file = file
+
+        # Also serializes reads, which move the file position
+        self.lock = Lock()
+
+        self._n_users = 0
+
+    def acquire(self):
+
+        with self.lock:
+            self._n_users += 1
+
+    def release(self):
+
+        with self.lock:
+
+            self._n_users -= 1
+
+            if self._n_users == 0:
+                self.file.close()
+
+
+def _open_chunked_seg(seg_file_path: Path) \
+        -> Tuple[Tuple[int, int, int], _SharedFile, np.ndarray]:
+    """
+    Open a chunked file and read its shape and chunk index
+
+    Raises ValueError if the file is not a valid segmentation file.
+    """
+
+    seg_file = open(seg_file_path, 'rb')
+
+    try:
+        shape, index = _read_header(seg_file)
+
+    except ValueError:
+        seg_file.close()
+        raise
+
+    except (zlib.error, struct.error) as error:
+        seg_file.close()
+        raise ValueError(
+            f"Invalid segmentation file: {error}") from error
+
+    return shape, _SharedFile(seg_file), index
+
+
+class ChunkedSeg(SparseSeg):
+    """
+    Sparse segmentation whose chunks are read from a chunked file the
+    first time their slice is accessed
+
+    The file is kept open so that chunks can still be read once it has
+    been replaced by a compacted file, until close is called.
+    """
+
+    def __init__(self,
+                 shape: Tuple[int, int, int],
+                 shared_file: _SharedFile,
+                 index: np.ndarray):
+
+        super().__init__(shape)
+
+        # Reads from copies share the file
+        self._shared_file = shared_file
+        self._shared_file.acquire()
+        self._closed = False
+
+        self._index = index
+
+        # Slices edited since loading, with None for empty slices
+        self._edited_chunks: Dict[int, Optional[SliceChunk]] = {}
+
+    @classmethod
+    def load(cls, seg_file_path: Path) -> Self:
+        """
+        Only the header and chunk index are read
+
+        Raises ValueError if the file is not a valid segmentation file.
+        """
+
+        shape, shared_file, index = _open_chunked_seg(seg_file_path)
+
+        return cls(shape, shared_file, index)
+
+    def copy(self) -> Self:
+        """
+        The copy must be closed as well
+        """
+
+        chunked_seg = type(self)(
+            self.shape,
+            self._shared_file,
+            self._index)
+
+        chunked_seg._chunks = dict(self._chunks)
+        chunked_seg._edited_chunks = dict(self._edited_chunks)
+
+        return chunked_seg
+
+    def close(self):
+        """
+        Stop reading from the file, which is closed once copies are
+        closed too
+
+        Chunks not read yet can't be accessed anymore.
+        """
+
+        if self._closed:
+            return
+
+        self._closed = True
+        self._shared_file.release()
+
+    def switch_file(self, seg_file_path: Path):
+        """
+        Read the chunks not read yet from a file holding the same
+        chunks, such as the file compacted in place of the current one,
+        and close the current one
+
+        Does nothing once closed. Raises ValueError if the file is not
+        a valid segmentation file of the same shape.
+        """
+
+        if self._closed:
+            return
+
+        shape, shared_file, index = _open_chunked_seg(seg_file_path)
+
+        if shape != self.shape:
+            shared_file.file.close()
+            raise ValueError(
+                "Invalid segmentation file: Wrong shape")
+
+        shared_file.acquire()
+        self._shared_file.release()
+
+        self._shared_file = shared_file
+        self._index = index
+
+    def get_non_empty_slice_indices(self):
+
+        slice_index_set = \
+            {int(slice_index)
+             for slice_index in np.flatnonzero(self._index['size'])}
+
+        for slice_index, chunk in self._edited_chunks.items():
+            if chunk is not None:
+                slice_index_set.add(slice_index)
+            else:
+                slice_index_set.discard(slice_index)
+
+        return sorted(slice_index_set)
+
+    def get_chunk(self, slice_index: int) -> Optional[SliceChunk]:
+
+        slice_index = int(slice_index)
+
+        if slice_index in self._edited_chunks:
+            return self._edited_chunks[slice_index]
+
+        if slice_index not in self._chunks:
+
+            with self._shared_file.lock:
+                chunk = _read_chunk(
+                    self._shared_file.file,
+                    self._index,
+                    slice_index)
+
+            if chunk is None:
+                return None
+
+            self._chunks[slice_index] = chunk
+
+        return self._chunks[slice_index]
+
+    def set_chunk(self, slice_index: int, chunk: Optional[SliceChunk]):
+
+        self._chunks.pop(int(slice_index), None)
+        self._edited_chunks[int(slice_index)] = chunk
+
+    @property
+    def nbytes(self) -> int:
+
+        return sum(chunk.nbytes
+                   for chunk_dict in (self._chunks, self._edited_chunks)
+                   for chunk in chunk_dict.values()
+                   if chunk is not None)
@@ -0,0 +1,636 @@
+"""
+Scanning of DICOM directories with progress reporting
+"""
+
+import json
+import os
+from copy import copy
+from itertools import chain
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from threading import Event
+from typing import Callable, Optional, Sequence, Set, Tuple, Self
+
+from pydicom.errors import InvalidDicomError
+from pydicom.filereader import read_partial
+from pydicom.tag import BaseTag, Tag
+
+from DicomSeriesManager.reader import DicomDirContent
+
+
+# Header elements identifying the series of a file
+SERIES_TAGS = [Tag('SeriesInstanceUID'), Tag('SeriesDescription')]
+
+# Reading stops past this element
+LAST_SERIES_TAG = max(SERIES_TAGS)
+
+# Number of files read by a process at a time, which is also the
+# number of files read between progress reports
+INDEX_CHUNK_SIZE = 100
+
+# Number of processes used for reading headers
+# (None: default number of ProcessPoolExecutor)
+INDEX_MAX_WORKERS = None
+
+# Below this number of files, headers and content are read without
+# starting processes
+PARALLEL_MIN_FILES = 1000
+
+# Interval at which cancellation is checked while the content of a
+# directory is read in another process (seconds)
+CANCEL_CHECK_INTERVAL = 0.1
+
+INDEX_FILE_SUFFIX = '.index.json'
+INDEX_VERSION = 1
+
+
+@dataclass
+class FileHeader:
+
+    path: str
+    mtime_ns: int
+    size: int
+
+    # None if the file is not a DICOM file or if its header wasn't
+    # read
+    series_uid: Optional[str] = None
+    series_description: Optional[str] = None
+
+    # False if the file was only listed, in which case its series is
+    # unknown
+    header_read: bool = True
+
+
+@dataclass
+class ScanProgress:
+
+    n_files_read: int
+    n_files: int
+
+    # Descriptions of the series discovered since the last report
+    new_series_list: Sequence[str]
+
+
+class ScanCancelled(Exception):
+    pass
+
+
+@dataclass
+class DicomDirIndex:
+    """
+    Headers of the files of a DICOM directory, used to find the files
+    that changed since the directory was read
+    """
+
+    dicom_dir_path: str
+    file_header_list: Sequence[FileHeader]
+
+    def save(self, index_file_path: Path):
+
+        content = {
+            'version': INDEX_VERSION,
+            'dicom_dir_path': self.dicom_dir_path,
+            'file_header_list':
+                [asdict(file_header)
+                 for file_header in self.file_header_list]}
+
+        # Write to a temporary file first so that an interrupted
+        # write doesn't corrupt an existing index
+        temp_file_path = index_file_path.with_name(
+            index_file_path.name + '.tmp')
+
+        with open(temp_file_path, 'w') as index_file:
+            json.dump(content, index_file)
+
+        os.replace(temp_file_path, index_file_path)
+
+    @classmethod
+    def load(cls, index_file_path: Path) -> Optional[Self]:
+        """
+        Load index from file (None if missing or invalid)
+        """
+
+        try:
+            with open(index_file_path) as index_file:
+                content = json.load(index_file)
+
+            if content['version'] != INDEX_VERSION:
+                return None
+
+            return cls(
+                content['dicom_dir_path'],
+                [FileHeader(**file_header)
+                 for file_header in content['file_header_list']])
+
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+
+@dataclass
+class RescanResult:
+
+    # Content of the directory read again (None if no series has
+    # changed)
+    dicom_dir_content: Optional[DicomDirContent]
+
+    dicom_dir_index: DicomDirIndex
+
+    # SeriesInstanceUIDs of the series with new, modified or deleted
+    # files
+    changed_series_uid_set: Set[str]
+
+    # Directory read again: The DICOM directory or one of its
+    # subdirectories, in which case the content only holds the series
+    # found there (None if no series has changed)
+    content_dir_path: Optional[str] = None
+
+    def is_partial(self) -> bool:
+
+        return self.content_dir_path is not None and \
+            os.path.normpath(self.content_dir_path) != \
+            os.path.normpath(self.dicom_dir_index.dicom_dir_path)
+
+
+def get_index_file_path(content_file_path: str) -> Path:
+    """
+    Path of the index file kept alongside a DICOM directory content
+    file
+    """
+
+    return Path(content_file_path).with_suffix(INDEX_FILE_SUFFIX)
+
+
+def list_files(dir_path: str) -> Sequence[str]:
+
+    return [os.path.join(root, file_name)
+            for root, _, file_name_list in sorted(os.walk(dir_path))
+            for file_name in sorted(file_name_list)]
+
+
+def _stat_file(file_path: str) -> Optional[FileHeader]:
+    """
+    Header of a file whose header is not read (None if the file can't
+    be read)
+    """
+
+    try:
+        stat = os.stat(file_path)
+
+    except OSError:
+        return None
+
+    return FileHeader(file_path, stat.st_mtime_ns, stat.st_size,
+                      header_read=False)
+
+
+def read_file_header(file_path: str) -> Optional[FileHeader]:
+    """
+    Read only the header elements identifying the series of a file
+
+    None if the file can't be read.
+    """
+
+    file_header = _stat_file(file_path)
+
+    if file_header is None:
+        return None
+
+    file_header.header_read = True
+
+    def stop_when(tag: BaseTag, VR: Optional[str], length: int):
+
+        return tag > LAST_SERIES_TAG
+
+    try:
+        with open(file_path, 'rb') as file:
+            dataset = read_partial(
+                file,
+                stop_when=stop_when,
+                specific_tags=SERIES_TAGS)
+
+    except (InvalidDicomError, OSError):
+        # Not a DICOM file
+        return file_header
+
+    series_uid = dataset.get('SeriesInstanceUID')
+
+    if series_uid is not None:
+        file_header.series_uid = str(series_uid)
+        file_header.series_description = \
+            str(dataset.get('SeriesDescription', ''))
+
+    return file_header
+
+
+def _read_file_headers(file_path_list: Sequence[str]) \
+        -> Sequence[FileHeader]:
+
+    return [file_header for file_path in file_path_list
+            if (file_header := read_file_header(file_path))
+            is not None]
+
+
+def list_dicom_dir(dicom_dir_path: str) -> DicomDirIndex:
+    """
+    Index of the files of a DICOM directory without their headers,
+    which only takes the time of listing the directory
+    """
+
+    return DicomDirIndex(
+        dicom_dir_path,
+        [file_header for file_path in list_files(dicom_dir_path)
+         if (file_header := _stat_file(file_path)) is not None])
+
+
+def read_missing_headers(
+        dicom_dir_index: DicomDirIndex,
+        cancel_event: Optional[Event] = None,
+        max_workers: Optional[int] = INDEX_MAX_WORKERS) \
+        -> DicomDirIndex:
+    """
+    Read the headers of the files of an index that were only listed
+
+    Files modified since they were listed keep no header, so that the
+    next rescan still finds them changed. Raises ScanCancelled once
+    cancel_event is set.
+    """
+
+    listed_header_dict = \
+        {file_header.path: file_header
+         for file_header in dicom_dir_index.file_header_list
+         if not file_header.header_read}
+
+    header_dict = \
+        {file_header.path: file_header
+         for file_header in _read_file_headers_with_progress(
+             list(listed_header_dict),
+             cancel_event,
+             None,
+             max_workers)
+         if _same_file(file_header, listed_header_dict[file_header.path])}
+
+    return DicomDirIndex(
+        dicom_dir_index.dicom_dir_path,
+        [header_dict.get(file_header.path, file_header)
+         for file_header in dicom_dir_index.file_header_list])
+
+
+def _same_file(file_header: FileHeader, other_header: FileHeader) \
+        -> bool:
+    """
+    Whether the modification time and size of a file haven't changed
+    """
+
+    return file_header.mtime_ns == other_header.mtime_ns and \
+        file_header.size == other_header.size
+
+
+def update_dicom_dir_index(
+        previous_index: DicomDirIndex,
+        cancel_event: Optional[Event] = None,
+        report_progress: Optional[
+            Callable[[ScanProgress], None]] = None,
+        max_workers: Optional[int] = INDEX_MAX_WORKERS) \
+        -> Tuple[DicomDirIndex, Set[str]]:
+    """
+    Update an index with the current files of its directory
+
+    Only the headers of new files, of files whose modification time or
+    size has changed and of files that were only listed are read. Also
+    returns the SeriesInstanceUIDs of the series with new, modified or
+    deleted files. If the header of a modified or deleted file was
+    never read, its series is unknown and every series is returned.
+    Raises ScanCancelled once cancel_event is set.
+    """
+
+    previous_header_dict = \
+        {file_header.path: file_header
+         for file_header in previous_index.file_header_list}
+
+    unchanged_header_list = []
+    unchanged_file_list = []
+    changed_file_list = []
+
+    for file_path in list_files(previous_index.dicom_dir_path):
+
+        previous_header = previous_header_dict.get(file_path)
+
+        file_header = _stat_file(file_path)
+
+        if file_header is None:
+            continue
+
+        if previous_header is None or \
+                not _same_file(file_header, previous_header):
+            changed_file_list.append(file_path)
+        elif previous_header.header_read:
+            unchanged_header_list.append(previous_header)
+        else:
+            unchanged_file_list.append(file_path)
+
+    # Headers of unchanged files are read along with the others but
+    # don't change their series
+    read_header_list = _read_file_headers_with_progress(
+        unchanged_file_list + changed_file_list,
+        cancel_event,
+        report_progress,
+        max_workers)
+
+    unchanged_path_set = \
+        {file_header.path for file_header in unchanged_header_list} | \
+        set(unchanged_file_list)
+
+    changed_header_list = \
+        [file_header for file_header in read_header_list
+         if file_header.path not in unchanged_path_set]
+
+    # Modified and deleted files
+    removed_header_list = \
+        [file_header for file_header in previous_index.file_header_list
+         if file_header.path not in unchanged_path_set]
+
+    dicom_dir_index = DicomDirIndex(
+        previous_index.dicom_dir_path,
+        sorted(unchanged_header_list + read_header_list,
+               key=lambda file_header: file_header.path))
+
+    if all(file_header.header_read
+           for file_header in removed_header_list):
+
+        # Series of new and modified files along with those of
+        # modified and deleted files
+        changed_series_uid_set = \
+            {file_header.series_uid
+             for file_header in changed_header_list} | \
+            {file_header.series_uid
+             for file_header in removed_header_list}
+
+    else:
+        changed_series_uid_set = \
+            {file_header.series_uid
+             for file_header in chain(previous_index.file_header_list,
+                                      dicom_dir_index.file_header_list)}
+
+    changed_series_uid_set.discard(None)
+
+    return dicom_dir_index, changed_series_uid_set
+
+
+def get_content_dir_path(
+        previous_index: DicomDirIndex,
+        dicom_dir_index: DicomDirIndex,
+        changed_series_uid_set: Set[str]) -> str:
+    """
+    Smallest directory holding every file that the changed series had
+    before and after the update of an index
+    """
+
+    return os.path.commonpath(
+        [os.path.dirname(file_header.path)
+         for index in (previous_index, dicom_dir_index)
+         for file_header in index.file_header_list
+         if file_header.series_uid in changed_series_uid_set])
+
+
+def get_series_uid(series_files) -> Optional[str]:
+
+    series_uid = series_files.info.get('SeriesInstanceUID')
+
+    return str(series_uid) if series_uid is not None else None
+
+
+def merge_dicom_dir_content(
+        dicom_dir_content: DicomDirContent,
+        changed_content: DicomDirContent,
+        changed_series_uid_set: Set[str]) -> DicomDirContent:
+    """
+    Content of a DICOM directory in which the changed series are
+    replaced by the series read from one of its subdirectories
+
+    The subdirectory must hold every file of the changed series (see
+    get_content_dir_path). Series keep their position and new series
+    come last. Changed series not found in the subdirectory have no
+    files left and are removed.
+    """
+
+    changed_series_dict = \
+        {series_uid: series_files
+         for series_files in changed_content.series_list
+         if (series_uid := get_series_uid(series_files)) is not None}
+
+    series_list = []
+
+    for series_files in dicom_dir_content.series_list:
+
+        series_uid = get_series_uid(series_files)
+
+        if series_uid in changed_series_dict:
+            series_list.append(changed_series_dict.pop(series_uid))
+
+        elif series_uid not in changed_series_uid_set:
+            series_list.append(series_files)
+
+    series_list.extend(
+        series_files
+        for series_uid, series_files in changed_series_dict.items()
+        if series_uid in changed_series_uid_set)
+
+    merged_content = copy(dicom_dir_content)
+    merged_content.series_list = series_list
+
+    return merged_content
+
+
+def _read_file_headers_with_progress(
+        file_list: Sequence[str],
+        cancel_event: Optional[Event],
+        report_progress: Optional[Callable[[ScanProgress], None]],
+        max_workers: Optional[int]) -> Sequence[FileHeader]:
+    """
+    Read file headers in chunks, spread over a pool of processes for
+    large numbers of files
+
+    Progress and newly discovered series are reported after each
+    chunk. Cancellation is checked between chunks.
+    """
+
+    n_files = len(file_list)
+
+    file_chunk_list = \
+        [file_list[first:first+INDEX_CHUNK_SIZE]
+         for first in range(0, n_files, INDEX_CHUNK_SIZE)]
+
+    file_header_list = []
+    series_uid_set = set()
+    n_files_read = 0
+
+    def add_chunk(chunk_size: int,
+                  chunk_header_list: Sequence[FileHeader]):
+
+        nonlocal n_files_read
+
+        file_header_list.extend(chunk_header_list)
+        n_files_read += chunk_size
+
+        new_series_list = []
+
+        for file_header in chunk_header_list:
+
+            if file_header.series_uid is not None and \
+                    file_header.series_uid not in series_uid_set:
+
+                series_uid_set.add(file_header.series_uid)
+                new_series_list.append(file_header.series_description)
+
+        if report_progress is not None:
+            report_progress(
+                ScanProgress(n_files_read, n_files, new_series_list))
+
+    def check_cancelled():
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise ScanCancelled()
+
+    if n_files < PARALLEL_MIN_FILES or max_workers == 1:
+
+        for file_chunk in file_chunk_list:
+
+            check_cancelled()
+
+            add_chunk(len(file_chunk), _read_file_headers(file_chunk))
+
+    else:
+        # Processes are spawned rather than forked from a process
+        # running threads
+        with ProcessPoolExecutor(
+                max_workers,
+                mp_context=get_context('spawn')) as executor:
+
+            future_dict = \
+                {executor.submit(_read_file_headers, file_chunk):
+                 len(file_chunk)
+                 for file_chunk in file_chunk_list}
+
+            try:
+                for future in as_completed(future_dict):
+
+                    check_cancelled()
+
+                    add_chunk(future_dict[future], future.result())
+
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    check_cancelled()
+
+    return sorted(file_header_list,
+                  key=lambda file_header: file_header.path)
+
+
+def read_dicom_dir_content(dicom_dir_path: str,
+                           n_files: int,
+                           cancel_event: Event) -> DicomDirContent:
+    """
+    Read the content of a DICOM directory of n_files files
+
+    DicomDirContent can't be interrupted, so large directories are read
+    in another process, which is terminated once cancel_event is set.
+    Small directories are read in the calling thread, where
+    cancellation is only checked once the read is over. Raises
+    ScanCancelled once cancel_event is set.
+    """
+
+    if n_files < PARALLEL_MIN_FILES:
+
+        dicom_dir_content = DicomDirContent(dicom_dir_path)
+
+    else:
+        # Leaving the pool terminates its process, even while reading
+        with get_context('spawn').Pool(1) as pool:
+
+            result = pool.apply_async(DicomDirContent, (dicom_dir_path,))
+
+            while not result.ready():
+
+                if cancel_event.is_set():
+                    raise ScanCancelled()
+
+                result.wait(CANCEL_CHECK_INTERVAL)
+
+            dicom_dir_content = result.get()
+
+    if cancel_event.is_set():
+        raise ScanCancelled()
+
+    return dicom_dir_content
+
+
+def scan_dicom_dir(dicom_dir_path: str,
+                   cancel_event: Event,
+                   report_progress: Callable[[ScanProgress], None]) \
+        -> Tuple[DicomDirContent, DicomDirIndex]:
+    """
+    Read the content of a DICOM directory
+
+    Files are only listed before the content is read by
+    DicomDirContent, which doesn't report progress. Reading the headers
+    of the files first would about double the time taken, so the index
+    is returned without them (see read_missing_headers). Raises
+    ScanCancelled once cancel_event is set.
+    """
+
+    # Listed before the content is read, so that files modified in the
+    # meantime are found changed by the next rescan
+    dicom_dir_index = list_dicom_dir(dicom_dir_path)
+
+    dicom_dir_content = read_dicom_dir_content(
+        dicom_dir_path,
+        len(dicom_dir_index.file_header_list),
+        cancel_event)
+
+    return dicom_dir_content, dicom_dir_index
+
+
+def rescan_dicom_dir(previous_index: DicomDirIndex,
+                     cancel_event: Event,
+                     report_progress: Callable[[ScanProgress], None]) \
+        -> RescanResult:
+    """
+    Read the changes made to a DICOM directory since it was indexed
+
+    Only the smallest subdirectory holding the changed series is read
+    again by DicomDirContent, and only if a series has changed. Raises
+    ScanCancelled once cancel_event is set.
+    """
+
+    dicom_dir_index, changed_series_uid_set = \
+        update_dicom_dir_index(
+            previous_index,
+            cancel_event,
+            report_progress)
+
+    if not changed_series_uid_set:
+        return RescanResult(None, dicom_dir_index, set())
+
+    content_dir_path = get_content_dir_path(
+        previous_index,
+        dicom_dir_index,
+        changed_series_uid_set)
+
+    n_files = sum(
+        1 for file_header in dicom_dir_index.file_header_list
+        if file_header.path.startswith(
+            os.path.join(content_dir_path, '')))
+
+    dicom_dir_content = read_dicom_dir_content(
+        content_dir_path,
+        n_files,
+        cancel_event)
+
+    return RescanResult(
+        dicom_dir_content,
+        dicom_dir_index,
+        changed_series_uid_set,
+        content_dir_path)
@@ -3,11 +3,16 @@ Model for representing and extracting display windows
 """
 
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import reduce
 from typing import Any, Optional, Sequence, Tuple, Self
 
 import numpy as np
 
+from pydicom.dataset import Dataset
+from pydicom.pixels import pixel_array as decode_pixel_data
+
 from DicomSeriesManager.series import BaseSeries
 
 
@@ -15,6 +20,259 @@ EXPLANATION_TAG = 'WindowCenterWidthExplanation'
 CENTER_TAG = 'WindowCenter'
 WIDTH_TAG = 'WindowWidth'
 
+# Number of threads used for scanning pixel data
+# (None: default number of ThreadPoolExecutor)
+SCAN_MAX_WORKERS = None
+
+# Default percentiles for percentile windows
+PERCENTILE_RANGE = (0.5, 99.5)
+
+# Maximum number of histogram bins, as a power of two. Pixel data
+# types of up to this number of bits get one bin per stored value.
+MAX_HISTOGRAM_BITS = 16
+
+# Minimum and maximum stored pixel values
+MinMax = Tuple[float, float]
+
+
+@dataclass
+class Histogram:
+    """
+    Histogram of stored pixel values with fixed bins
+
+    Bin b covers the stored values from b << shift to
+    ((b + 1) << shift) - 1. The shift is the smallest one for which
+    the range of values fits in 2**MAX_HISTOGRAM_BITS bins, so bins
+    hold exactly one value unless the range is wider (e.g. for 32-bit
+    data). Only bins from first_bin to the last non-empty bin are kept
+    in counts.
+    """
+
+    shift: int
+    first_bin: int
+    counts: np.ndarray
+
+    @classmethod
+    def from_pixel_array(cls, pixel_array: np.ndarray) \
+            -> Optional[Self]:
+        """
+        None if pixel values are not integers
+        """
+
+        if not np.issubdtype(pixel_array.dtype, np.integer):
+            return None
+
+        values = pixel_array.astype(np.int64).ravel()
+
+        min_value, max_value = int(values.min()), int(values.max())
+
+        shift = _get_histogram_shift(min_value, max_value)
+
+        first_bin = min_value >> shift
+        counts = np.bincount((values >> shift) - first_bin)
+
+        return cls(shift, first_bin, counts)
+
+    @property
+    def end_bin(self) -> int:
+
+        return self.first_bin + len(self.counts)
+
+    def coarsen(self, shift: int) -> Self:
+        """
+        Same histogram with wider bins (shift can't be smaller)
+        """
+
+        assert shift >= self.shift
+
+        if shift == self.shift:
+            return self
+
+        bins = (self.first_bin + np.arange(len(self.counts))) >> \
+            (shift - self.shift)
+
+        first_bin = self.first_bin >> (shift - self.shift)
+        counts = np.bincount(bins - first_bin, weights=self.counts).\
+            astype(np.int64)
+
+        return Histogram(shift, first_bin, counts)
+
+    def merge(self, other: Self) -> Self:
+
+        # Bins of the histogram with the widest bins, widened until
+        # the merged range fits
+        shift = max(
+            self.shift,
+            other.shift,
+            _get_histogram_shift(
+                min(self.first_bin << self.shift,
+                    other.first_bin << other.shift),
+                max((self.end_bin << self.shift) - 1,
+                    (other.end_bin << other.shift) - 1)))
+
+        histogram_list = [self.coarsen(shift), other.coarsen(shift)]
+
+        first_bin = min(histogram.first_bin
+                        for histogram in histogram_list)
+        end_bin = max(histogram.end_bin
+                      for histogram in histogram_list)
+
+        counts = np.zeros(end_bin - first_bin, dtype=np.int64)
+
+        for histogram in histogram_list:
+
+            start = histogram.first_bin - first_bin
+            counts[start:start+len(histogram.counts)] += \
+                histogram.counts
+
+        return Histogram(shift, first_bin, counts)
+
+    def get_percentile(self, percentile: float) -> float:
+        """
+        Stored value below which the given percentage of pixels lie
+        """
+
+        cumulative_counts = np.cumsum(self.counts)
+
+        target = percentile / 100 * cumulative_counts[-1]
+
+        ind = min(
+            int(np.searchsorted(cumulative_counts, target)),
+            len(self.counts) - 1)
+
+        # Center of the bin
+        bin_start = (self.first_bin + ind) << self.shift
+
+        return bin_start + ((1 << self.shift) - 1) / 2
+
+
+def _get_histogram_shift(min_value: int, max_value: int) -> int:
+    """
+    Smallest shift for which bins of stored values from min_value to
+    max_value fit in 2**MAX_HISTOGRAM_BITS bins
+    """
+
+    shift = max(0, (max_value - min_value).bit_length() -
+                MAX_HISTOGRAM_BITS)
+
+    # Bins are aligned on multiples of their width, so the range may
+    # need one more bin than its width
+    while (max_value >> shift) - (min_value >> shift) >= \
+            1 << MAX_HISTOGRAM_BITS:
+        shift += 1
+
+    return shift
+
+
+def get_stored_pixel_array(dataset: Dataset) -> np.ndarray:
+    """
+    Stored pixel values of a dataset of a series
+
+    Pixel data already decoded by the dataset, such as when the volume
+    of the series was read from it, is used as is. Otherwise it is
+    decoded without being kept by the dataset, which would hold a copy
+    of the volume for as long as the series is kept.
+    """
+
+    # pydicom has no public way of telling whether pixel data was
+    # decoded
+    if isinstance(dataset, Dataset) and \
+            getattr(dataset, '_pixel_array', None) is None:
+        return decode_pixel_data(dataset)
+
+    return dataset.pixel_array
+
+
+def has_integer_pixel_data(series: BaseSeries) -> bool:
+    """
+    Whether pixel values are integers, in which case histograms and
+    percentile windows are available
+    """
+
+    exemplar = series.get_dataset(0, 0)
+
+    if 'PixelData' not in exemplar:
+        # E.g. float pixel data
+        return False
+
+    try:
+        pixel_array = get_stored_pixel_array(exemplar)
+
+    except (AttributeError, TypeError, ValueError,
+            NotImplementedError, RuntimeError):
+        return False
+
+    return np.issubdtype(pixel_array.dtype, np.integer)
+
+
+def scan_frame_statistics(
+        series: BaseSeries,
+        max_workers: Optional[int] = SCAN_MAX_WORKERS) \
+        -> Tuple[Sequence[MinMax], Optional[Sequence[Histogram]]]:
+    """
+    Get the minimum and maximum stored pixel values of each frame
+    along with its histogram (None if pixel values are not integers)
+
+    Slices are decoded in parallel and read in a single pass, without
+    being kept by their dataset (see get_stored_pixel_array). The
+    statistics of each slice are merged into those of its frame as
+    they come in, so only one histogram per frame is kept. The result
+    can be kept and passed to DisplayWindow.extract_*_windows so that
+    pixel data doesn't have to be read again.
+    """
+
+    def get_slice_statistics(slice_key: Tuple[int, int]):
+
+        ind, frame = slice_key
+
+        pixel_array = \
+            get_stored_pixel_array(series.get_dataset(ind, frame))
+
+        return pixel_array.min(), pixel_array.max(), \
+            Histogram.from_pixel_array(pixel_array)
+
+    n_frames = series.get_number_of_frames()
+
+    slice_key_list = [(ind, frame)
+                      for frame in range(n_frames)
+                      for ind in range(series.get_number_of_slices(frame))]
+
+    frame_min_list = [np.inf] * n_frames
+    frame_max_list = [-np.inf] * n_frames
+    frame_histogram_list: list[Optional[Histogram]] = [None] * n_frames
+    integer_pixel_data = True
+
+    with ThreadPoolExecutor(max_workers) as executor:
+
+        # Results are released as soon as they are merged
+        for (_, frame), (slice_min, slice_max, slice_histogram) in \
+                zip(slice_key_list,
+                    executor.map(get_slice_statistics, slice_key_list)):
+
+            frame_min_list[frame] = min(frame_min_list[frame], slice_min)
+            frame_max_list[frame] = max(frame_max_list[frame], slice_max)
+
+            if slice_histogram is None:
+                integer_pixel_data = False
+
+            if not integer_pixel_data:
+                continue
+
+            frame_histogram = frame_histogram_list[frame]
+
+            frame_histogram_list[frame] = \
+                frame_histogram.merge(slice_histogram) \
+                if frame_histogram is not None else slice_histogram
+
+    frame_minmax_list = \
+        [(float(frame_min), float(frame_max))
+         for frame_min, frame_max in zip(frame_min_list, frame_max_list)]
+
+    if not integer_pixel_data:
+        frame_histogram_list = None
+
+    return frame_minmax_list, frame_histogram_list
+
 
 @dataclass
 class DisplayWindow:
@@ -55,32 +313,62 @@ class DisplayWindow:
     @classmethod
     def extract_tight_windows(
             cls,
-            series: BaseSeries) \
+            series: BaseSeries,
+            frame_minmax_list: Optional[Sequence[MinMax]] = None) \
             -> Tuple[Self, Optional[Sequence[Self]]]:
 
-        def get_frame_minmax(frame):
+        # Scan pixel data unless previously scanned
+        if frame_minmax_list is None:
+            frame_minmax_list, _ = scan_frame_statistics(series)
 
-            def get_slice_minmax(ind, frame):
+        return cls._make_windows(series, frame_minmax_list)
 
-                dataset = series.get_dataset(ind, frame)
-                pixel_array = dataset.pixel_array
-                return pixel_array.min(), pixel_array.max()
+    @classmethod
+    def extract_percentile_windows(
+            cls,
+            series: BaseSeries,
+            frame_histogram_list: Sequence[Histogram],
+            percentile_range: Tuple[float, float] = PERCENTILE_RANGE) \
+            -> Tuple[Self, Optional[Sequence[Self]]]:
+        """
+        Windows going from one percentile of pixel values to another
+
+        Only histograms are used, so any percentiles can be evaluated
+        without reading pixel data again.
+        """
+
+        low_percentile, high_percentile = percentile_range
+
+        def get_range(histogram: Histogram):
+
+            return histogram.get_percentile(low_percentile), \
+                histogram.get_percentile(high_percentile)
 
-            n_slices = series.get_number_of_slices(frame)
-            slice_minmax_list = [get_slice_minmax(ind, frame)
-                                 for ind in range(n_slices)]
+        global_histogram = \
+            reduce(Histogram.merge, frame_histogram_list)
 
-            slice_min_list, slice_max_list = \
-                zip(*slice_minmax_list)
+        global_range = get_range(global_histogram)
 
-            slice_min = np.array(slice_min_list).min()
-            slice_max = np.array(slice_max_list).max()
+        frame_range_list = \
+            [get_range(histogram)
+             for histogram in frame_histogram_list]
 
-            return slice_min, slice_max
+        global_window, _ = \
+            cls._make_windows(series, [global_range])
+        _, frame_window_list = \
+            cls._make_windows(series, frame_range_list)
 
-        n_frames = series.get_number_of_frames()
-        frame_minmax_list = [get_frame_minmax(frame)
-                             for frame in range(n_frames)]
+        return global_window, frame_window_list
+
+    @classmethod
+    def _make_windows(
+            cls,
+            series: BaseSeries,
+            frame_minmax_list: Sequence[MinMax]) \
+            -> Tuple[Self, Optional[Sequence[Self]]]:
+        """
+        Global and per-frame windows from ranges of stored values
+        """
 
         exemplar = series.get_dataset(0, 0)
         rescale_slope = float(exemplar.RescaleSlope)
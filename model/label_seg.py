@@ -0,0 +1,126 @@
+"""
+Binary segmentations stored as bits of a shared label volume
+"""
+
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+# Type of label volumes, whose number of bits is the number of
+# segmentations that can share one (e.g. np.uint64 for 64)
+LABEL_VOLUME_DTYPE = np.uint8
+
+
+class LabelVolume:
+    """
+    Volume storing one binary segmentation per bit
+    """
+
+    def __init__(self,
+                 shape: Tuple[int, int, int],
+                 dtype: type = LABEL_VOLUME_DTYPE):
+
+        self.array = np.zeros(shape, dtype=dtype)
+
+        self._free_bit_list = list(range(8 * self.array.itemsize))
+
+    @property
+    def n_free_labels(self) -> int:
+
+        return len(self._free_bit_list)
+
+    def add_label(self) -> 'LabelSeg':
+
+        assert self.n_free_labels > 0
+
+        return LabelSeg(self, self._free_bit_list.pop(0))
+
+    def remove_label(self, label_seg: 'LabelSeg'):
+
+        assert label_seg.label_volume is self
+        assert label_seg.bit not in self._free_bit_list
+
+        # Clear the bit so that it can be reused
+        self.array &= ~label_seg.bit_mask
+
+        self._free_bit_list.append(label_seg.bit)
+        self._free_bit_list.sort()
+
+
+class LabelSeg:
+    """
+    Binary segmentation stored as one bit of a label volume
+
+    Regions of the label volume, including reoriented views, are read
+    with extract and written in place with update.
+    """
+
+    dtype = np.dtype(np.uint8)
+
+    def __init__(self, label_volume: LabelVolume, bit: int):
+
+        self.label_volume = label_volume
+        self.bit = bit
+
+        self.bit_mask = label_volume.array.dtype.type(1 << bit)
+
+    def __len__(self) -> int:
+
+        return len(self.label_volume.array)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+
+        return self.label_volume.array.shape
+
+    @property
+    def ndim(self) -> int:
+
+        return self.label_volume.array.ndim
+
+    def extract(self, label_region: np.ndarray) -> np.ndarray:
+        """
+        Values of the segmentation in a region of the label volume
+        """
+
+        return ((label_region & self.bit_mask) != 0).astype(self.dtype)
+
+    def update(self, label_region: np.ndarray, values: np.ndarray):
+        """
+        Set the values of the segmentation in a region (a view) of the
+        label volume, leaving the other labels unchanged
+        """
+
+        label_region &= ~self.bit_mask
+        label_region |= \
+            (values != 0).astype(label_region.dtype) * self.bit_mask
+
+    def to_dense(self) -> np.ndarray:
+
+        return self.extract(self.label_volume.array)
+
+    def set_dense(self, seg: np.ndarray):
+
+        self.update(self.label_volume.array, seg)
+
+    def remove(self):
+
+        self.label_volume.remove_label(self)
+
+
+def add_label_seg(shape: Tuple[int, int, int],
+                  label_seg_list: Sequence[LabelSeg]) -> LabelSeg:
+    """
+    Add a segmentation to the first label volume with a free label
+    among those of existing segmentations, or to a new one
+    """
+
+    for label_seg in label_seg_list:
+
+        label_volume = label_seg.label_volume
+
+        if label_volume.n_free_labels > 0:
+            return label_volume.add_label()
+
+    return LabelVolume(shape).add_label()
@@ -12,6 +12,7 @@ from matplotlib.lines import Line2D
 
 from scipy.ndimage import binary_fill_holes
 
+from QuickSeg.model.blit_utils import ArtistBlitter
 from QuickSeg.model.siddon import compute_path
 
 
@@ -23,6 +24,9 @@ Point = tuple[_float, _float]
 # Line defined as a list of points
 Line = list[Point]
 
+# Bounding box defined as inclusive index ranges (i_range, j_range)
+BoundingBox = tuple[tuple[int, int], tuple[int, int]]
+
 # TODO: Make this a settable parameter
 DISTANCE = 1
 
@@ -32,16 +36,21 @@ COLOR = '#0f0a'
 LINE_WIDTH = 3
 MARKER_SIZE = 7
 
+# Fill rules for the area enclosed by a line
+EVEN_ODD = 'even-odd'
+NONZERO = 'nonzero'
+
 
 def trace_line(fig) -> Optional[Line]:
 
     line_data_x = []
     line_data_y = []
     line = None
+    blitter = None
 
     def handler(event: Event):
 
-        nonlocal line_data_x, line_data_y, line
+        nonlocal line_data_x, line_data_y, line, blitter
 
         left_button_pressed = \
             event.name == "button_press_event" \
@@ -67,8 +76,7 @@ def trace_line(fig) -> Optional[Line]:
             # the following statement is removed
             if tracing_started:
 
-                line.remove()
-                fig.canvas.draw()
+                blitter.remove()
 
             fig.canvas.stop_event_loop()
             return
@@ -90,7 +98,7 @@ def trace_line(fig) -> Optional[Line]:
 
             axes.add_line(line)
 
-            fig.canvas.draw()
+            blitter = ArtistBlitter(fig, line)
 
         elif mouse_moved and tracing_started:
 
@@ -120,7 +128,7 @@ def trace_line(fig) -> Optional[Line]:
 
                     line.set_data(line_data_x, line_data_y)
 
-                    fig.canvas.draw()
+                    blitter.update()
             else:
                 # TODO: Add logic for out of bounds
                 pass
@@ -129,8 +137,7 @@ def trace_line(fig) -> Optional[Line]:
 
             if tracing_started:
 
-                line.remove()
-                fig.canvas.draw()
+                blitter.remove()
 
             fig.canvas.stop_event_loop()
 
@@ -147,15 +154,160 @@ def trace_line(fig) -> Optional[Line]:
     return list(zip(line_data_y, line_data_x))
 
 
-def trace_line_on_mask(im_shape, line_ij: Line) -> np.array:
+def trace_line_on_mask(im_shape,
+                       line_ij: Line,
+                       fill_rule: str = EVEN_ODD) -> np.array:
 
-    path_i, path_j = compute_path(im_shape, line_ij, True)
-
-    # Trace path on mask
     mask = np.zeros(im_shape, dtype=bool)
-    mask[path_i, path_j] = True
 
-    # Fill path
-    binary_fill_holes(mask, output=mask)
+    fill_line_on_slice(mask, line_ij, True, fill_rule)
 
     return mask
+
+
+def get_line_bounding_box(im_shape, line_ij: Line) \
+        -> Optional[BoundingBox]:
+    """
+    Bounding box of the pixels of a slice touched by a line
+
+    None if the line doesn't touch the slice.
+    """
+
+    if len(line_ij) == 0:
+        return None
+
+    vertices_ij = np.asarray(line_ij, dtype=_float)
+
+    # A point touches the pixel whose center is the closest
+    i_range, j_range = [
+        (max(0, int(np.floor(vertices.min() + 0.5))),
+         min(dim_size - 1, int(np.floor(vertices.max() + 0.5))))
+        for vertices, dim_size in zip(vertices_ij.T, im_shape)]
+
+    if i_range[0] > i_range[1] or j_range[0] > j_range[1]:
+        return None
+
+    return i_range, j_range
+
+
+def fill_line_on_slice(im_slice: np.array,
+                       line_ij: Line,
+                       value,
+                       fill_rule: str = EVEN_ODD,
+                       bbox: Optional[BoundingBox] = None) \
+        -> Optional[BoundingBox]:
+    """
+    Set to value the pixels of im_slice traced by the closed line
+    and those enclosed by it
+
+    The slice is written in place and only its region within the
+    bounding box of the line is accessed. The bounding box can be
+    given if already known. The bounding box that was written is
+    returned (None if the line doesn't touch the slice).
+    """
+
+    if fill_rule not in (EVEN_ODD, NONZERO):
+        raise ValueError(f"Invalid fill rule: {fill_rule}")
+
+    if bbox is None:
+        bbox = get_line_bounding_box(im_slice.shape, line_ij)
+
+    if bbox is None:
+        return None
+
+    (i_first, i_last), (j_first, j_last) = bbox
+
+    sub_slice = im_slice[i_first:i_last+1, j_first:j_last+1]
+
+    # Line coordinates with respect to the bounding box
+    sub_line_ij = np.asarray(line_ij, dtype=_float) - \
+        np.array([i_first, j_first], dtype=_float)
+
+    # Fill enclosed area
+    winding = _scanline_winding(sub_line_ij, sub_slice.shape)
+
+    if fill_rule == EVEN_ODD:
+        mask = winding % 2 != 0
+    else:
+        mask = winding != 0
+
+    # Trace path
+    path_i, path_j = compute_path(sub_slice.shape, sub_line_ij, True)
+    mask[path_i, path_j] = True
+
+    # Pixels whose centers are outside the line can still be cut off
+    # from the outside by the traced path (e.g. in narrow concavities).
+    # Those are filled, unlike holes made by self-intersections, whose
+    # winding number is nonzero. The area outside the bounding box is
+    # empty, so holes are the same as within the whole slice.
+    mask |= binary_fill_holes(mask) & (winding == 0)
+
+    sub_slice[mask] = value
+
+    return bbox
+
+
+def _scanline_winding(vertices_ij: np.array,
+                      im_shape: tuple[int, int]) -> np.array:
+    """
+    Winding number of the closed polygon around each pixel center,
+    computed with scanlines
+    """
+
+    height, width = im_shape
+
+    # Edges of the closed polygon
+    r1 = vertices_ij.astype(np.float64)
+    r2 = np.roll(r1, -1, axis=0)
+
+    i1, j1 = r1.T
+    i2, j2 = r2.T
+
+    # Rows whose center is crossed by each edge, using half-open
+    # intervals so that shared vertices are only counted once
+    first_row = np.maximum(np.ceil(np.minimum(i1, i2)), 0)
+    end_row = np.minimum(np.ceil(np.maximum(i1, i2)), height)
+    n_rows = np.maximum(end_row - first_row, 0).astype(int)
+
+    # One crossing per edge and row
+    edge = np.repeat(np.arange(len(r1)), n_rows)
+    row = np.repeat(first_row, n_rows) + \
+        np.arange(n_rows.sum()) - \
+        np.repeat(np.cumsum(n_rows) - n_rows, n_rows)
+
+    crossing_j = j1[edge] + (row - i1[edge]) * \
+        (j2[edge] - j1[edge]) / (i2[edge] - i1[edge])
+    winding = np.where(i2[edge] > i1[edge], 1, -1)
+
+    # Sort crossings along each row
+    order = np.lexsort((crossing_j, row))
+    row = row[order].astype(int)
+    crossing_j = crossing_j[order]
+    winding = winding[order]
+
+    # Winding number of each span going from a crossing to the next
+    # one. Every row has a zero total winding, so counts can be
+    # accumulated over all rows.
+    span_winding = np.cumsum(winding)[:-1]
+    span_inside = span_winding != 0
+
+    # Pixels whose center lies within each span
+    span_row = row[:-1][span_inside]
+    span_winding = span_winding[span_inside]
+    span_start = np.clip(
+        np.ceil(crossing_j[:-1][span_inside]), 0, width)
+    span_end = np.clip(
+        np.ceil(crossing_j[1:][span_inside]), 0, width)
+
+    non_empty = span_end > span_start
+    span_row = span_row[non_empty]
+    span_winding = span_winding[non_empty]
+    span_start = span_start[non_empty].astype(int)
+    span_end = span_end[non_empty].astype(int)
+
+    # Rasterize spans with a difference array
+    transitions = np.zeros((height, width + 1), dtype=np.int32)
+    np.add.at(transitions, (span_row, span_start), span_winding)
+    np.add.at(transitions, (span_row, span_end), -span_winding)
+
+    return np.cumsum(transitions[:, :-1], axis=1)
@@ -2,16 +2,81 @@
 Main application model
 """
 
+import os
+from collections import Counter, OrderedDict
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Sequence
+from typing import \
+    Callable, Dict, Iterable, Optional, Sequence, Set, Tuple
 
 import numpy as np
 
 from DicomSeriesManager.reader import DicomDirContent
 from DicomSeriesManager.series import series_factory, BaseSeries
 
-from QuickSeg.model.display_window_model import DisplayWindow
+from QuickSeg.model.chunked_seg import (
+    CHUNKED_SEG_FILE_SUFFIX,
+    ChunkedSeg,
+    update_chunked_seg,
+    write_chunked_seg)
+from QuickSeg.model.dicom_dir_scan import (
+    DicomDirIndex,
+    get_index_file_path,
+    get_series_uid,
+    list_dicom_dir,
+    merge_dicom_dir_content,
+    RescanResult)
+from QuickSeg.model.display_window_model import (
+    DisplayWindow,
+    Histogram,
+    MinMax)
+from QuickSeg.model.label_seg import add_label_seg, LabelSeg
+from QuickSeg.model.seg_history import (
+    SEG_HISTORY_BUDGET,
+    SegEdit,
+    SegHistory)
+from QuickSeg.model.seg_utils import (
+    get_axial_slice_chunk,
+    get_seg_slice,
+    Seg,
+    store_seg_slice)
+from QuickSeg.model.series_preview import estimate_n_bytes_from_headers
+from QuickSeg.model.slice_cache import SLICE_CACHE_BUDGET, SliceCache
+from QuickSeg.model.sparse_seg import (
+    SliceChunk,
+    SPARSE_SEG_FILE_SUFFIX,
+    SparseSeg)
+from QuickSeg.model.window_cache import (
+    FrameStatistics,
+    get_cache_file_path,
+    SeriesKey,
+    WindowCache)
+
+
+# Maximum total size of the loaded volumes (bytes)
+SERIES_MEMORY_BUDGET = 4 * 2**30
+
+# Whether segmentation files are memory-mapped instead of read into
+# memory, in which case edits are written to the file by the OS
+MEMORY_MAP_SEGS = False
+
+# Storage of segmentations in memory:
+# - Dense: One byte per voxel
+# - Sparse: Packed bits of the non-empty region of each slice, which
+#   takes orders of magnitude less memory for typical masks at the
+#   cost of slower edits
+# - Packed: One bit of a label volume shared by the segmentations of
+#   a series, so that several segmentations cost the memory of one
+DENSE_SEG_STORAGE = 'dense'
+SPARSE_SEG_STORAGE = 'sparse'
+PACKED_SEG_STORAGE = 'packed'
+
+# Storage of new segmentations, also used for loaded .npy files when
+# packed and not memory-mapped
+SEG_STORAGE = DENSE_SEG_STORAGE
+
+# File suffix of dense segmentation files
+DENSE_SEG_FILE_SUFFIX = '.npy'
 
 
 @dataclass
@@ -19,7 +84,22 @@ class SegItem:
 
     name: str
     path: Optional[Path]
-    seg: np.array
+    seg: Seg
+
+    # Modification time and size of the file at path when the
+    # segmentation was last loaded from it or saved to it
+    file_signature: Optional[Tuple[int, int]] = None
+
+    # Whether there are changes not saved to a file
+    modified: bool = False
+
+    # Axial slices edited since the last save
+    dirty_slices: Set[int] = field(default_factory=set)
+
+    # Whether the segmentation is being saved in the background
+    saving: bool = False
+
+    history: SegHistory = field(default_factory=SegHistory)
 
 
 @dataclass
@@ -47,6 +127,16 @@ class ExtractedWindows:
     global_window: Optional[DisplayWindow] = None
     frame_window_list: Optional[Sequence[DisplayWindow]] = None
 
+    # Percentile windows (None if not available)
+    global_percentile_window: Optional[DisplayWindow] = None
+    frame_percentile_window_list: \
+        Optional[Sequence[DisplayWindow]] = None
+
+    # Stored pixel value range and histogram of each frame from
+    # which the windows are derived
+    frame_minmax_list: Optional[Sequence[MinMax]] = None
+    frame_histogram_list: Optional[Sequence[Histogram]] = None
+
     initialized: bool = False
 
 
@@ -66,27 +156,362 @@ class SeriesItem:
     extracted_display_window: ExtractedWindows = \
         field(default_factory=ExtractedWindows)
 
+    # Whether the series is being read in the background
+    loading: bool = False
+
+    # Estimated size of the loaded volume (bytes)
+    n_bytes: int = 0
+
+    # Whether the volume has been released to save memory
+    evicted: bool = False
+
+
+@dataclass
+class SeriesMemoryStats:
+    """
+    Memory used by loaded volumes and eviction counters
+    """
+
+    budget: int
+    n_bytes_loaded: int = 0
+    n_series_loaded: int = 0
+    n_evictions: int = 0
+    n_bytes_evicted: int = 0
+
+    # Loads of series that had been evicted
+    n_reloads: int = 0
+
+
+@dataclass
+class SegSave:
+    """
+    Handle to a segmentation saved in the background
+    (see Model.start_seg_save)
+    """
+
+    seg_file_path: str
+    seg_item: SegItem
+
+    # Copy of the segmentation taken when saving started (None if
+    # only flushed to the file it is mapped to or if only dirty slices
+    # are written)
+    seg: Optional[Seg]
+
+    # Axial slices that were dirty when saving started
+    dirty_slices: Set[int]
+
+    # Chunks of the dirty slices when only those are written to a
+    # chunked file the segmentation was saved to or loaded from
+    dirty_chunk_dict: Optional[Dict[int, Optional[SliceChunk]]] = None
+
+    # Whether writing the dirty chunks compacted the file
+    compacted: bool = False
+
+    def write(self):
+        """
+        Write the segmentation (can be called from any thread)
+
+        Whole files are written to a temporary file first so that an
+        interrupted save doesn't corrupt an existing file.
+        """
+
+        if self.dirty_chunk_dict is not None:
+            self.compacted = update_chunked_seg(
+                self.seg_file_path,
+                self.dirty_chunk_dict)
+            return
+
+        if self.seg is None:
+            self.seg_item.seg.flush()
+            return
+
+        if self.seg_file_path.endswith(CHUNKED_SEG_FILE_SUFFIX):
+
+            write_chunked_seg(
+                self.seg_file_path,
+                self.seg.shape,
+                lambda slice_index:
+                    get_axial_slice_chunk(self.seg, slice_index))
+            return
+
+        # The format is given by the suffix of the file
+        if self.seg_file_path.endswith(SPARSE_SEG_FILE_SUFFIX):
+
+            sparse_seg = self.seg if isinstance(self.seg, SparseSeg) \
+                else SparseSeg.from_dense(self.seg)
+
+            sparse_seg.save(self.seg_file_path)
+            return
+
+        dense_seg = self.seg.to_dense() \
+            if isinstance(self.seg, SparseSeg) else self.seg
+
+        temp_file_path = f'{self.seg_file_path}.tmp'
+
+        with open(temp_file_path, 'wb') as seg_file:
+            np.save(seg_file, dense_seg)
+
+        os.replace(temp_file_path, self.seg_file_path)
+
+
+@dataclass
+class SeriesLoad:
+    """
+    Handle to a series read in the background
+    (see Model.start_series_load)
+    """
+
+    dicom_dir_content: DicomDirContent
+    series_index: int
+    series_item: SeriesItem
+
+    # Whether the series is read ahead of being selected, cleared if it
+    # is selected in the meantime
+    preload: bool = False
+
+    # Files of the series, if known, and memory left within the budget
+    # when the preload was started
+    file_path_list: Optional[Sequence[str]] = None
+    n_bytes_available: int = 0
+
+    def read(self) -> Optional[BaseSeries]:
+        """
+        Read the series (can be called from any thread)
+
+        A preloaded series that wouldn't fit within the memory budget
+        according to the header of one of its files isn't read (None).
+
+        The slice decoded for the preview (see read_preview_slice) is
+        decoded again here: series_factory reads the files of the
+        series itself and can't be given pixel data.
+        """
+
+        if self.preload and self.file_path_list:
+
+            n_bytes = estimate_n_bytes_from_headers(self.file_path_list)
+
+            if n_bytes is not None and n_bytes > self.n_bytes_available:
+                return None
+
+        return series_factory(
+            self.dicom_dir_content,
+            self.series_index)
+
 
 class Model:
 
-    def __init__(self):
+    def __init__(self,
+                 series_memory_budget: int = SERIES_MEMORY_BUDGET,
+                 memory_map_segs: bool = MEMORY_MAP_SEGS,
+                 seg_storage: str = SEG_STORAGE,
+                 seg_history_budget: int = SEG_HISTORY_BUDGET,
+                 slice_cache_budget: int = SLICE_CACHE_BUDGET):
 
         self._dicom_dir_content: Optional[DicomDirContent] = None
 
+        # Headers of the files of the DICOM directory, if known, for
+        # finding changed files when rescanning
+        self._dicom_dir_index: Optional[DicomDirIndex] = None
+
         self._series_list: Sequence[SeriesItem] = []
 
+        # Cache of scanned pixel value ranges, saved alongside the
+        # DICOM directory content file if there is one
+        self._window_cache = WindowCache()
+        self._content_file_path: Optional[str] = None
+
+        # Cache of rendered slices, replaced whenever series indices
+        # may refer to different series
+        self._slice_cache_budget = slice_cache_budget
+        self._slice_cache = SliceCache(slice_cache_budget)
+
+        # Series with a loaded volume, from least to most recently
+        # used, keyed by id of their item
+        self._loaded_series: OrderedDict[int, SeriesItem] = \
+            OrderedDict()
+        self._current_series_item: Optional[SeriesItem] = None
+        self._series_memory_stats = \
+            SeriesMemoryStats(series_memory_budget)
+
+        # Series being read in the background, keyed by id of their
+        # item
+        self._series_loads: Dict[int, SeriesLoad] = {}
+
+        # Segmentation edited by a tool outside of the model, which
+        # must stay in place until the edit is stored
+        self._edited_seg: Optional[Seg] = None
+
+        self._memory_map_segs = memory_map_segs
+        if seg_storage not in (DENSE_SEG_STORAGE,
+                               SPARSE_SEG_STORAGE,
+                               PACKED_SEG_STORAGE):
+            raise ValueError(f"Invalid segmentation storage: {seg_storage}")
+
+        self._seg_storage = seg_storage
+
+        # Maximum size of the undo history of each segmentation
+        self._seg_history_budget = seg_history_budget
+
     def read_dicom_dir(self, dicom_dir_path: str):
+        """
+        Read the content of a DICOM directory
+
+        Files are listed without their headers, as by scan_dicom_dir.
+        """
+
+        dicom_dir_index = list_dicom_dir(dicom_dir_path)
 
         dicom_dir_content = DicomDirContent(dicom_dir_path)
 
+        self.set_dicom_dir_content(dicom_dir_content, dicom_dir_index)
+
+    def set_dicom_dir_content(
+            self,
+            dicom_dir_content: DicomDirContent,
+            dicom_dir_index: Optional[DicomDirIndex] = None):
+        """
+        Use the content of a DICOM directory read beforehand
+        """
+
         self._replace_dicom_dir_content(dicom_dir_content)
 
+        self._dicom_dir_index = dicom_dir_index
+
+        self._window_cache = WindowCache()
+        self._content_file_path = None
+
+    def update_dicom_dir_content(self, rescan_result: RescanResult) \
+            -> Sequence[Optional[int]]:
+        """
+        Apply the result of a rescan of the DICOM directory
+
+        Series are matched by SeriesInstanceUID. Unchanged series are
+        kept as they are, including loaded volumes and segmentations.
+        Changed series keep their display parameters, and their
+        segmentations if their number of files is the same. Returns
+        the new index of each previous series (None if removed).
+        """
+
+        assert self._check_dicom_dir_content()
+
+        dicom_dir_index = rescan_result.dicom_dir_index
+        changed_series_uid_set = rescan_result.changed_series_uid_set
+
+        previous_index = self._dicom_dir_index
+        self._dicom_dir_index = dicom_dir_index
+
+        if rescan_result.dicom_dir_content is None:
+            return list(range(len(self._series_list)))
+
+        dicom_dir_content = \
+            merge_dicom_dir_content(
+                self._dicom_dir_content,
+                rescan_result.dicom_dir_content,
+                changed_series_uid_set) \
+            if rescan_result.is_partial() else \
+            rescan_result.dicom_dir_content
+
+        def count_files(dicom_dir_index: Optional[DicomDirIndex]):
+
+            return Counter(
+                file_header.series_uid
+                for file_header in dicom_dir_index.file_header_list) \
+                if dicom_dir_index is not None else {}
+
+        previous_n_files = count_files(previous_index)
+        n_files = count_files(dicom_dir_index)
+
+        previous_item_dict = {}
+        for previous_series_index, (series_files, series_item) in \
+                enumerate(zip(self._dicom_dir_content.series_list,
+                              self._series_list)):
+
+            series_uid = get_series_uid(series_files)
+
+            if series_uid is not None:
+                previous_item_dict.setdefault(
+                    series_uid,
+                    (previous_series_index, series_item))
+
+        new_index_list = [None] * len(self._series_list)
+        series_list = []
+
+        for series_index, series_files in \
+                enumerate(dicom_dir_content.series_list):
+
+            series_uid = get_series_uid(series_files)
+
+            series_item = _make_series_item(series_files)
+
+            if series_uid in previous_item_dict:
+
+                previous_series_index, previous_item = \
+                    previous_item_dict.pop(series_uid)
+
+                new_index_list[previous_series_index] = series_index
+
+                if series_uid not in changed_series_uid_set:
+                    series_item = previous_item
+
+                else:
+                    series_item.display_params = \
+                        previous_item.display_params
+
+                    if series_uid in previous_n_files and \
+                            previous_n_files[series_uid] == \
+                            n_files[series_uid]:
+                        series_item.seg_list = previous_item.seg_list
+
+            series_list.append(series_item)
+
+        # Segmentations kept by changed series
+        kept_seg_lists = \
+            {id(series_item.seg_list) for series_item in series_list}
+
+        # Forget the volumes and segmentations of the series that were
+        # replaced
+        for series_item in self._series_list:
+            if series_item not in series_list:
+
+                self._remove_loaded_series(series_item)
+
+                if id(series_item.seg_list) not in kept_seg_lists:
+                    _close_seg_files(series_item.seg_list)
+
+        self._dicom_dir_content = dicom_dir_content
+        self._series_list = series_list
+
+        self._slice_cache = SliceCache(self._slice_cache_budget)
+
+        return new_index_list
+
+    def get_dicom_dir_index(self) -> Optional[DicomDirIndex]:
+
+        return self._dicom_dir_index
+
+    def complete_dicom_dir_index(
+            self,
+            listed_index: DicomDirIndex,
+            dicom_dir_index: DicomDirIndex):
+        """
+        Use the index of the DICOM directory with the headers of its
+        files read, unless the index was replaced in the meantime (e.g.
+        by a rescan)
+        """
+
+        if self._dicom_dir_index is listed_index:
+            self._dicom_dir_index = dicom_dir_index
+
     def save_dir_content(self, content_file_path: str):
 
         assert self._check_dicom_dir_content()
 
         self._dicom_dir_content.save(content_file_path)
 
+        self._content_file_path = content_file_path
+        self._save_window_cache()
+        self._save_dicom_dir_index()
+
     def load_dicom_dir_content(self, content_file_path: str):
 
         dicom_dir_content = \
@@ -94,6 +519,13 @@ class Model:
 
         self._replace_dicom_dir_content(dicom_dir_content)
 
+        self._dicom_dir_index = DicomDirIndex.load(
+            get_index_file_path(content_file_path))
+
+        self._window_cache = WindowCache.load(
+            get_cache_file_path(content_file_path))
+        self._content_file_path = content_file_path
+
     def dicom_dir_is_loaded(self) -> bool:
 
         return self._dicom_dir_content is not None
@@ -122,31 +554,192 @@ class Model:
 
         return series.extracted_display_window
 
+    def get_slice_cache(self) -> SliceCache:
+
+        return self._slice_cache
+
+    def get_cached_frame_statistics(self, series_key: SeriesKey) \
+            -> Optional[FrameStatistics]:
+
+        return self._window_cache.get(series_key)
+
+    def cache_frame_statistics(self,
+                               series_key: SeriesKey,
+                               frame_statistics: FrameStatistics):
+
+        self._window_cache.put(series_key, frame_statistics)
+
+        self._save_window_cache()
+
     def goc_series(self, series_index: int) -> BaseSeries:
 
         assert self._check_dicom_dir_content()
         assert self._check_series_index(series_index)
 
-        series = self._series_list[series_index].series
+        series_item = self._series_list[series_index]
 
-        if series is None:
+        if series_item.series is None:
 
             series = series_factory(
                 self._dicom_dir_content,
                 series_index)
 
-            self._series_list[series_index].series = series
+            self._add_loaded_series(series_item, series)
+
+        else:
+            self._loaded_series.move_to_end(id(series_item))
+
+        return series_item.series
+
+    def set_current_series(self, series_index: Optional[int]):
+        """
+        The current series is never evicted
+        """
+
+        self._current_series_item = \
+            self._series_list[series_index] \
+            if series_index is not None else None
+
+    def get_series_memory_stats(self) -> SeriesMemoryStats:
+
+        return self._series_memory_stats
+
+    def is_series_loaded(self, series_index: int) -> bool:
+
+        assert self._check_series_index(series_index)
+
+        return self._series_list[series_index].series is not None
+
+    def start_series_load(self,
+                          series_index: int,
+                          preload: bool = False) \
+            -> Optional[SeriesLoad]:
+        """
+        Get a handle for reading a series in the background
+
+        None if the series is already loaded or being loaded, or if it
+        is preloaded and the memory budget is used up. The series must
+        then be passed to finish_series_load.
+
+        A series being preloaded is no longer preloaded once it is
+        loaded for being selected, so that it is kept once read.
+        """
+
+        assert self._check_dicom_dir_content()
+        assert self._check_series_index(series_index)
+
+        series_item = self._series_list[series_index]
+
+        if series_item.loading and not preload:
+            self._series_loads[id(series_item)].preload = False
+
+        if series_item.series is not None or series_item.loading:
+            return None
+
+        stats = self._series_memory_stats
+
+        if preload and stats.n_bytes_loaded >= stats.budget:
+            return None
+
+        series_item.loading = True
+
+        series_load = SeriesLoad(
+            self._dicom_dir_content,
+            series_index,
+            series_item,
+            preload,
+            self.get_series_file_paths(series_index)
+            if preload else None,
+            stats.budget - stats.n_bytes_loaded)
+
+        self._series_loads[id(series_item)] = series_load
+
+        return series_load
 
-        return series
+    def finish_series_load(
+            self,
+            series_load: SeriesLoad,
+            series: Optional[BaseSeries]) -> Optional[int]:
+        """
+        Keep a series read in the background (None if reading failed
+        or if the preload was skipped)
+
+        Preloaded series are only kept if they fit within the memory
+        budget without evicting other series.
+
+        Returns the current index of the series, which may have changed
+        while it was being read (None if it has been removed).
+        """
+
+        series_load.series_item.loading = False
+        self._series_loads.pop(id(series_load.series_item), None)
+
+        series_index = self.find_series_load(series_load)
+
+        if series_index is not None and series is not None:
+            self._add_loaded_series(
+                series_load.series_item,
+                series,
+                series_load.preload)
+
+        return series_index
+
+    def find_series_load(self, series_load: SeriesLoad) \
+            -> Optional[int]:
+        """
+        Current index of a series being loaded (None if removed)
+        """
+
+        for series_index, series_item in enumerate(self._series_list):
+            if series_item is series_load.series_item:
+                return series_index
+
+        return None
+
+    def get_series_file_paths(self, series_index: int) \
+            -> Optional[Sequence[str]]:
+        """
+        Paths of the files of a series according to the directory
+        index (None if unknown, such as before the headers of the
+        files are read)
+        """
+
+        assert self._check_series_index(series_index)
+
+        if self._dicom_dir_index is None or \
+                not all(file_header.header_read
+                        for file_header in
+                        self._dicom_dir_index.file_header_list):
+            return None
+
+        series_uid = get_series_uid(
+            self._dicom_dir_content.series_list[series_index])
+
+        if series_uid is None:
+            return None
+
+        return [file_header.path
+                for file_header in self._dicom_dir_index.file_header_list
+                if file_header.series_uid == series_uid]
 
     def delete_series(self, series_index):
 
         assert self._check_dicom_dir_content()
         assert self._check_series_index(series_index)
 
+        series_item = self._series_list[series_index]
+
+        self._remove_loaded_series(series_item)
+        _close_seg_files(series_item.seg_list)
+
+        if series_item is self._current_series_item:
+            self._current_series_item = None
+
         del self._series_list[series_index]
         del self._dicom_dir_content.series_list[series_index]
 
+        self._slice_cache = SliceCache(self._slice_cache_budget)
+
     def add_new_seg(self, seg_name: str, series_index: int):
 
         assert self._check_series_index(series_index)
@@ -155,9 +748,20 @@ class Model:
 
         # Create empty segmentation with the right shape
         vol_shape = series_item.series.get_vol_shape()
-        seg = np.zeros(vol_shape, dtype=np.uint8)
 
-        seg_list_item = SegItem(seg_name, None, seg)
+        if self._seg_storage == SPARSE_SEG_STORAGE:
+            seg = SparseSeg(vol_shape)
+        elif self._seg_storage == PACKED_SEG_STORAGE:
+            seg = self._add_label_seg(series_item)
+        else:
+            seg = np.zeros(vol_shape, dtype=np.uint8)
+
+        seg_list_item = SegItem(
+            seg_name,
+            None,
+            seg,
+            modified=True,
+            history=SegHistory(self._seg_history_budget))
 
         series_item.seg_list.append(seg_list_item)
 
@@ -167,15 +771,141 @@ class Model:
                  seg_file_path: str,
                  series_index: int,
                  seg_index: int):
+        """
+        Save a segmentation synchronously
+        """
+
+        seg_save = self.start_seg_save(
+            seg_file_path,
+            series_index,
+            seg_index)
+
+        assert seg_save is not None
+
+        try:
+            seg_save.write()
+
+        except Exception:
+            self.finish_seg_save(seg_save, False)
+            raise
+
+        self.finish_seg_save(seg_save, True)
+
+    def start_seg_save(self,
+                       seg_file_path: str,
+                       series_index: int,
+                       seg_index: int) -> Optional[SegSave]:
+        """
+        Get a handle for saving a segmentation in the background
+
+        The segmentation is copied so that it can be edited while
+        being saved, unless it is only flushed to the file it is
+        mapped to. None if it is already being saved. The handle must
+        then be passed to finish_seg_save.
+        """
 
         assert self._check_series_index(series_index)
         assert self._check_seg_index(series_index, seg_index)
 
-        series_item = self._series_list[series_index]
+        seg_item = self._series_list[series_index].seg_list[seg_index]
 
-        seg = series_item.seg_list[seg_index].seg
+        if seg_item.saving:
+            return None
 
-        np.save(seg_file_path, seg)
+        # Dense format by default
+        seg_file_path = str(seg_file_path)
+        if not seg_file_path.endswith(
+                (DENSE_SEG_FILE_SUFFIX,
+                 SPARSE_SEG_FILE_SUFFIX,
+                 CHUNKED_SEG_FILE_SUFFIX)):
+            seg_file_path += DENSE_SEG_FILE_SUFFIX
+
+        # Only dirty slices are written to a chunked file that holds
+        # the segmentation as of the last save or load, unless the file
+        # was changed since then
+        dirty_chunk_dict = None
+
+        if seg_file_path.endswith(CHUNKED_SEG_FILE_SUFFIX) and \
+                seg_item.path is not None and \
+                Path(seg_item.path).resolve() == \
+                Path(seg_file_path).resolve() and \
+                seg_item.file_signature is not None and \
+                _get_file_signature(seg_file_path) == \
+                seg_item.file_signature:
+
+            dirty_chunk_dict = \
+                {slice_index:
+                 get_axial_slice_chunk(seg_item.seg, slice_index)
+                 for slice_index in seg_item.dirty_slices}
+
+        if dirty_chunk_dict is not None or \
+                _is_mapped_to(seg_item.seg, seg_file_path):
+            seg = None
+        elif isinstance(seg_item.seg, SparseSeg):
+            seg = seg_item.seg.copy()
+        elif isinstance(seg_item.seg, LabelSeg):
+            seg = seg_item.seg.to_dense()
+        else:
+            seg = np.array(seg_item.seg)
+
+        seg_save = SegSave(
+            seg_file_path,
+            seg_item,
+            seg,
+            seg_item.dirty_slices,
+            dirty_chunk_dict)
+
+        seg_item.saving = True
+        seg_item.dirty_slices = set()
+
+        return seg_save
+
+    def finish_seg_save(self, seg_save: SegSave, succeeded: bool):
+        """
+        With memory-mapped segmentations, a segmentation saved to a
+        new file is mapped to it unless edited while being saved
+        """
+
+        seg_item = seg_save.seg_item
+        seg_item.saving = False
+
+        # The copy of a chunked segmentation shares its file
+        if isinstance(seg_save.seg, ChunkedSeg):
+            seg_save.seg.close()
+
+        if not succeeded:
+            seg_item.dirty_slices |= seg_save.dirty_slices
+            return
+
+        # The file now holds the segmentation as of when saving started
+        seg_item.path = seg_save.seg_file_path
+        seg_item.file_signature = \
+            _get_file_signature(seg_save.seg_file_path)
+
+        # Chunks not read yet are read from the compacted file so that
+        # the replaced one can be closed
+        if seg_save.compacted and isinstance(seg_item.seg, ChunkedSeg):
+            seg_item.seg.switch_file(seg_save.seg_file_path)
+
+        if seg_item.dirty_slices:
+            # Edited while being saved
+            return
+
+        # Not replaced while being edited by a tool (see
+        # set_edited_seg)
+        if self._memory_map_segs and seg_save.seg is not None and \
+                seg_save.seg_file_path.endswith(DENSE_SEG_FILE_SUFFIX) \
+                and seg_item.seg is not self._edited_seg:
+
+            _release_seg(seg_item.seg)
+
+            seg_item.seg = np.load(
+                seg_save.seg_file_path,
+                mmap_mode='r+')
+
+            seg_item.path = seg_save.seg_file_path
+
+        seg_item.modified = False
 
     def load_seg(self, seg_path: str, series_index: int) \
             -> Optional[int]:
@@ -189,8 +919,20 @@ class Model:
         # if seg_path in [seg.path for seg in series.seg_list]:
         #    return None
 
-        # Load segmentation
-        seg = np.load(seg_path)
+        # Taken before reading so that a file changed while being read
+        # is found changed
+        file_signature = _get_file_signature(seg_path)
+
+        # Load segmentation, only reading the header if mapped
+        if str(seg_path).endswith(SPARSE_SEG_FILE_SUFFIX):
+            seg = SparseSeg.load(seg_path)
+        elif str(seg_path).endswith(CHUNKED_SEG_FILE_SUFFIX):
+            # Chunks are read when their slice is displayed
+            seg = ChunkedSeg.load(seg_path)
+        else:
+            seg = np.load(
+                seg_path,
+                mmap_mode='r+' if self._memory_map_segs else None)
 
         if seg.dtype != np.uint8:
             # TODO: Add warning window
@@ -200,12 +942,26 @@ class Model:
         vol_shape = series_item.series.get_vol_shape()
         if not np.array_equal(seg_shape, vol_shape):
             # TODO: Add warning window
+            _release_seg(seg)
             return None
 
+        if self._seg_storage == PACKED_SEG_STORAGE and \
+                isinstance(seg, np.ndarray) and \
+                not isinstance(seg, np.memmap):
+
+            label_seg = self._add_label_seg(series_item)
+            label_seg.set_dense(seg)
+
+            seg = label_seg
+
         # Create segmentation list item
         seg_file_stem = Path(seg_path).stem
         seg_item = \
-            SegItem(seg_file_stem, seg_path, seg)
+            SegItem(seg_file_stem,
+                    seg_path,
+                    seg,
+                    file_signature,
+                    history=SegHistory(self._seg_history_budget))
 
         # Add segmentation to list
         series_item.seg_list.append(seg_item)
@@ -231,7 +987,7 @@ class Model:
         return series_item.seg_list[seg_index].name
 
     def get_seg(self, series_index: int, seg_index: int) \
-            -> Optional[np.array]:
+            -> Optional[Seg]:
 
         assert self._check_series_index(series_index)
 
@@ -242,29 +998,287 @@ class Model:
 
         return series_item.seg_list[seg_index].seg
 
+    def set_seg_modified(self,
+                         series_index: int,
+                         seg_index: int,
+                         slice_range: Optional[Iterable[int]] = None):
+        """
+        Record that axial slices of a segmentation were edited
+        (all of them if slice_range is None)
+        """
+
+        assert self._check_series_index(series_index)
+        assert self._check_seg_index(series_index, seg_index)
+
+        seg_item = self._series_list[series_index].seg_list[seg_index]
+
+        if slice_range is None:
+            slice_range = range(len(seg_item.seg))
+
+        seg_item.modified = True
+        seg_item.dirty_slices.update(slice_range)
+
+    def set_edited_seg(self, seg: Optional[Seg]):
+        """
+        Keep a segmentation in place while a tool edits one of its
+        slices (None once the tool is done)
+
+        A segmentation saved in the meantime is not replaced by the
+        memory-mapped file it was saved to.
+        """
+
+        self._edited_seg = seg
+
+    def find_seg(self, seg: Seg) -> Optional[Tuple[int, int]]:
+        """
+        Current series and segmentation indices of a segmentation
+        (None if it has been removed)
+        """
+
+        for series_index, series_item in enumerate(self._series_list):
+            for seg_index, seg_item in enumerate(series_item.seg_list):
+                if seg_item.seg is seg:
+                    return series_index, seg_index
+
+        return None
+
+    def get_dirty_seg_slices(self, series_index: int, seg_index: int) \
+            -> Set[int]:
+        """
+        Axial slices of a segmentation edited since it was last saved
+        """
+
+        assert self._check_series_index(series_index)
+        assert self._check_seg_index(series_index, seg_index)
+
+        return set(
+            self._series_list[series_index].seg_list[seg_index].
+            dirty_slices)
+
+    def record_seg_edit(self,
+                        series_index: int,
+                        seg_index: int,
+                        seg_edit: Optional[SegEdit]):
+        """
+        Add an edit to the undo history of a segmentation (nothing to
+        add if None)
+        """
+
+        assert self._check_series_index(series_index)
+        assert self._check_seg_index(series_index, seg_index)
+
+        if seg_edit is not None:
+            self._series_list[series_index].seg_list[seg_index].\
+                history.push(seg_edit)
+
+    def undo_seg_edit(self, series_index: int, seg_index: int) -> bool:
+        """
+        Returns False if there was nothing to undo
+        """
+
+        return self._apply_seg_edit(
+            series_index,
+            seg_index,
+            SegHistory.pop_undo)
+
+    def redo_seg_edit(self, series_index: int, seg_index: int) -> bool:
+        """
+        Returns False if there was nothing to redo
+        """
+
+        return self._apply_seg_edit(
+            series_index,
+            seg_index,
+            SegHistory.pop_redo)
+
     def delete_seg(self, series_index: int, seg_index: int):
 
         assert self._check_series_index(series_index)
         assert self._check_seg_index(series_index, seg_index)
 
-        del self._series_list[series_index].seg_list[seg_index]
+        seg_list = self._series_list[series_index].seg_list
 
-    def _replace_dicom_dir_content(self, dicom_dir_content):
+        _release_seg(seg_list[seg_index].seg)
 
-        self._dicom_dir_content = dicom_dir_content
+        del seg_list[seg_index]
 
-        def make_series_list_item(series_files):
+    def _replace_dicom_dir_content(self, dicom_dir_content):
 
-            series_description = \
-                series_files.info['SeriesDescription']
+        for series_item in self._series_list:
+            _close_seg_files(series_item.seg_list)
 
-            return SeriesItem(series_description)
+        self._dicom_dir_content = dicom_dir_content
 
         self._series_list = \
-            [make_series_list_item(series_files)
+            [_make_series_item(series_files)
              for series_files in
              self._dicom_dir_content.series_list]
 
+        for series_item in list(self._loaded_series.values()):
+            self._remove_loaded_series(series_item)
+
+        self._current_series_item = None
+
+        self._slice_cache = SliceCache(self._slice_cache_budget)
+
+    def _add_loaded_series(self,
+                           series_item: SeriesItem,
+                           series: BaseSeries,
+                           preload: bool = False):
+
+        # Already read again synchronously (see goc_series) while
+        # being read in the background: The series in use is kept
+        if series_item.series is not None:
+            return
+
+        stats = self._series_memory_stats
+
+        n_bytes = _estimate_series_n_bytes(series)
+
+        if preload and stats.n_bytes_loaded + n_bytes > stats.budget:
+            return
+
+        series_item.series = series
+        series_item.n_bytes = n_bytes
+
+        if series_item.evicted:
+            series_item.evicted = False
+            stats.n_reloads += 1
+
+        self._loaded_series[id(series_item)] = series_item
+
+        stats.n_bytes_loaded += series_item.n_bytes
+        stats.n_series_loaded += 1
+
+        if preload:
+            # Evicted first until it is used
+            self._loaded_series.move_to_end(id(series_item), last=False)
+        else:
+            self._evict_series(series_item)
+
+    def _remove_loaded_series(self, series_item: SeriesItem):
+
+        if self._loaded_series.pop(id(series_item), None) is None:
+            return
+
+        stats = self._series_memory_stats
+        stats.n_bytes_loaded -= series_item.n_bytes
+        stats.n_series_loaded -= 1
+
+        series_item.series = None
+        series_item.n_bytes = 0
+
+    def _evict_series(self, new_series_item: SeriesItem):
+        """
+        Release least recently used volumes until the budget is met
+
+        The current series, the one just loaded and those with
+        unsaved segmentations are kept. Evicted series are read again
+        when next accessed.
+        """
+
+        stats = self._series_memory_stats
+
+        for series_item in list(self._loaded_series.values()):
+
+            if stats.n_bytes_loaded <= stats.budget:
+                break
+
+            if series_item is new_series_item or \
+                    series_item is self._current_series_item or \
+                    any(seg_item.modified
+                        for seg_item in series_item.seg_list):
+                continue
+
+            stats.n_evictions += 1
+            stats.n_bytes_evicted += series_item.n_bytes
+
+            self._remove_loaded_series(series_item)
+            series_item.evicted = True
+
+    def _apply_seg_edit(self,
+                        series_index: int,
+                        seg_index: int,
+                        pop_edit: Callable[[SegHistory], Optional[SegEdit]]) \
+            -> bool:
+        """
+        Flip the pixels changed by an edit popped from the history,
+        only accessing the bounding box of the edit
+        """
+
+        assert self._check_series_index(series_index)
+        assert self._check_seg_index(series_index, seg_index)
+
+        seg_item = self._series_list[series_index].seg_list[seg_index]
+
+        seg_edit = pop_edit(seg_item.history)
+
+        if seg_edit is None:
+            return False
+
+        series = self.goc_series(series_index)
+
+        FOV = list(seg_edit.FOV) if seg_edit.FOV is not None else None
+
+        seg_slice = get_seg_slice(
+            seg_item.seg,
+            series,
+            seg_edit.orientation,
+            seg_edit.slice_index,
+            FOV)
+
+        seg_edit.apply(seg_slice)
+
+        slice_range = store_seg_slice(
+            seg_item.seg,
+            series,
+            seg_edit.orientation,
+            seg_edit.slice_index,
+            FOV,
+            seg_slice,
+            seg_edit.bbox)
+
+        self.set_seg_modified(series_index, seg_index, slice_range)
+
+        return True
+
+    def _add_label_seg(self, series_item: SeriesItem) -> LabelSeg:
+        """
+        Add a segmentation to a label volume of the series
+        """
+
+        return add_label_seg(
+            series_item.series.get_vol_shape(),
+            [seg_item.seg for seg_item in series_item.seg_list
+             if isinstance(seg_item.seg, LabelSeg)])
+
+    def _save_window_cache(self):
+
+        if self._content_file_path is None:
+            # Kept in memory until the content file is saved
+            return
+
+        try:
+            self._window_cache.save(
+                get_cache_file_path(self._content_file_path))
+
+        except OSError:
+            # The cache is only an optimization
+            pass
+
+    def _save_dicom_dir_index(self):
+
+        if self._dicom_dir_index is None:
+            return
+
+        try:
+            self._dicom_dir_index.save(
+                get_index_file_path(self._content_file_path))
+
+        except OSError:
+            # The index is only used for rescanning
+            pass
+
     def _check_dicom_dir_content(self):
 
         return self._dicom_dir_content is not None
@@ -285,3 +1299,70 @@ class Model:
 
         return seg_index is not None and \
             0 <= seg_index < n_segs
+
+
+def _make_series_item(series_files) -> SeriesItem:
+
+    series_description = series_files.info['SeriesDescription']
+
+    return SeriesItem(series_description)
+
+
+def _estimate_series_n_bytes(series: BaseSeries) -> int:
+    """
+    Size of the volumes of a series assuming that they are stored
+    with the number of bits allocated to pixel data
+    """
+
+    exemplar = series.get_dataset(0, 0)
+    bytes_per_pixel = (int(getattr(exemplar, 'BitsAllocated', 16)) + 7) // 8
+
+    return sum(int(np.prod(series.get_vol_shape(frame))) * bytes_per_pixel
+               for frame in range(series.get_number_of_frames()))
+
+
+def _get_file_signature(file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Modification time and size of a file (None if it can't be read)
+    """
+
+    try:
+        stat = os.stat(file_path)
+
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _is_mapped_to(seg: Seg, seg_file_path: str) -> bool:
+
+    return isinstance(seg, np.memmap) and \
+        seg.filename is not None and \
+        Path(seg.filename).resolve() == Path(seg_file_path).resolve()
+
+
+def _release_seg(seg: Seg):
+    """
+    Free the label of a segmentation stored in a label volume for
+    other segmentations, or close the file of a chunked segmentation
+    """
+
+    if isinstance(seg, LabelSeg):
+        seg.remove()
+
+    elif isinstance(seg, ChunkedSeg):
+        seg.close()
+
+
+def _close_seg_files(seg_list: Sequence[SegItem]):
+    """
+    Close the files of the chunked segmentations of a removed series
+
+    Labels are not freed since label volumes are only shared within a
+    series.
+    """
+
+    for seg_item in seg_list:
+        if isinstance(seg_item.seg, ChunkedSeg):
+            seg_item.seg.close()
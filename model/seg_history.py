@@ -0,0 +1,150 @@
+"""
+Undo and redo history of segmentation edits
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Tuple, Self
+
+import numpy as np
+
+from QuickSeg.model.lasso_utils import BoundingBox
+
+
+# Maximum size of the edits kept for each segmentation (bytes)
+SEG_HISTORY_BUDGET = 16 * 2**20
+
+
+@dataclass(frozen=True)
+class SegEdit:
+    """
+    Pixels of a displayed segmentation slice flipped by an edit,
+    packed 8 per byte within the bounding box of the edit
+
+    Applying an edit flips the same pixels, which undoes it or, once
+    undone, redoes it.
+    """
+
+    orientation: str
+    slice_index: int
+    FOV: Optional[Tuple[float, ...]]
+    bbox: BoundingBox
+    changed_bits: np.ndarray
+
+    @classmethod
+    def make(cls,
+             orientation: str,
+             slice_index: int,
+             FOV: Optional[list[float]],
+             bbox: BoundingBox,
+             region_before: np.ndarray,
+             region_after: np.ndarray) -> Optional[Self]:
+        """
+        None if the edit didn't change anything
+        """
+
+        changed = (region_before != 0) != (region_after != 0)
+
+        if not changed.any():
+            return None
+
+        return cls(orientation,
+                   slice_index,
+                   tuple(FOV) if FOV is not None else None,
+                   bbox,
+                   np.packbits(changed))
+
+    @property
+    def region(self) -> Tuple[slice, slice]:
+
+        (i_first, i_last), (j_first, j_last) = self.bbox
+
+        return np.s_[i_first:i_last+1, j_first:j_last+1]
+
+    @property
+    def nbytes(self) -> int:
+
+        return self.changed_bits.nbytes
+
+    def apply(self, seg_slice: np.ndarray):
+        """
+        Flip the changed pixels of a binary segmentation slice in place
+        """
+
+        region = seg_slice[self.region]
+
+        changed = np.unpackbits(
+            self.changed_bits,
+            count=region.size).reshape(region.shape)
+
+        region[...] = (region != 0) ^ (changed != 0)
+
+
+class SegHistory:
+    """
+    Edits that can be undone and redone
+
+    The oldest edits are dropped once the total size of the edits
+    exceeds the budget.
+    """
+
+    def __init__(self, budget: int = SEG_HISTORY_BUDGET):
+
+        self._budget = budget
+        self._size = 0
+
+        self._undo_stack: deque[SegEdit] = deque()
+        self._redo_stack: list[SegEdit] = []
+
+    @property
+    def nbytes(self) -> int:
+
+        return self._size
+
+    def can_undo(self) -> bool:
+
+        return len(self._undo_stack) > 0
+
+    def can_redo(self) -> bool:
+
+        return len(self._redo_stack) > 0
+
+    def push(self, seg_edit: SegEdit):
+        """
+        Record a new edit, which can't be followed by redone edits
+        """
+
+        self._size -= sum(edit.nbytes for edit in self._redo_stack)
+        self._redo_stack.clear()
+
+        self._undo_stack.append(seg_edit)
+        self._size += seg_edit.nbytes
+
+        while self._size > self._budget and self._undo_stack:
+            self._size -= self._undo_stack.popleft().nbytes
+
+    def pop_undo(self) -> Optional[SegEdit]:
+        """
+        Edit to apply for undoing, moved to the redo stack
+        """
+
+        if not self._undo_stack:
+            return None
+
+        seg_edit = self._undo_stack.pop()
+        self._redo_stack.append(seg_edit)
+
+        return seg_edit
+
+    def pop_redo(self) -> Optional[SegEdit]:
+        """
+        Edit to apply for redoing, moved back to the undo stack
+        """
+
+        if not self._redo_stack:
+            return None
+
+        seg_edit = self._redo_stack.pop()
+        self._undo_stack.append(seg_edit)
+
+        return seg_edit
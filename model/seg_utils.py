@@ -0,0 +1,223 @@
+"""
+Utility functions for accessing segmentations
+"""
+
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from DicomSeriesManager.reorientation import (
+    get_reoriented_PS,
+    reorient_from_axial)
+from DicomSeriesManager.series import BaseSeries
+from DicomSeriesManager.utils import get_slice_limits
+
+from QuickSeg.model.label_seg import LabelSeg
+from QuickSeg.model.lasso_utils import BoundingBox
+from QuickSeg.model.sparse_seg import SliceChunk, SparseSeg
+
+
+# Segmentation volume, either dense, sparse or a label of a label
+# volume
+Seg = Union[np.ndarray, SparseSeg, LabelSeg]
+
+
+def get_seg_slice(seg: Seg,
+                  series: BaseSeries,
+                  orientation: str,
+                  slice_index: int,
+                  FOV: Optional[list[float]]) -> np.array:
+    """
+    Get the slice of a segmentation as displayed for the given
+    orientation and field of view
+
+    For dense segmentations, the slice is a view: Writing to it updates
+    the segmentation. For others, it is a copy whose edits must be
+    written back with store_seg_slice.
+    """
+
+    if isinstance(seg, LabelSeg):
+        return seg.extract(_get_label_slice(
+            seg,
+            series,
+            orientation,
+            slice_index,
+            FOV))
+
+    if isinstance(seg, SparseSeg):
+        return seg.take(*_get_slice_indices(
+            seg.shape,
+            series,
+            orientation,
+            slice_index,
+            FOV))
+
+    seg_slice = reorient_from_axial(
+        seg,
+        orientation,
+        slice_index)
+
+    return _crop_to_FOV(seg_slice, series, orientation, FOV)
+
+
+def store_seg_slice(seg: Seg,
+                    series: BaseSeries,
+                    orientation: str,
+                    slice_index: int,
+                    FOV: Optional[list[float]],
+                    seg_slice: np.array,
+                    bbox: BoundingBox) -> range:
+    """
+    Write back the region of an edited segmentation slice within a
+    bounding box (nothing to write for views of dense segmentations)
+
+    Returns the range of the axial slices covered by the region.
+    """
+
+    (i_first, i_last), (j_first, j_last) = bbox
+    region = np.s_[i_first:i_last+1, j_first:j_last+1]
+
+    if isinstance(seg, LabelSeg):
+
+        label_region = _get_label_slice(
+            seg,
+            series,
+            orientation,
+            slice_index,
+            FOV)[region]
+
+        seg.update(label_region, seg_slice[region])
+
+        return get_axial_slice_range(
+            seg.label_volume.array,
+            label_region)
+
+    if not isinstance(seg, SparseSeg):
+        return get_axial_slice_range(seg, seg_slice[region])
+
+    z_index, y_index, x_index = \
+        [index[region] for index in _get_slice_indices(
+            seg.shape,
+            series,
+            orientation,
+            slice_index,
+            FOV)]
+
+    seg.put(z_index, y_index, x_index, seg_slice[region])
+
+    if z_index.size == 0:
+        return range(0)
+
+    return range(int(z_index.min()), int(z_index.max()) + 1)
+
+
+def get_axial_slice_chunk(seg: Seg, slice_index: int) \
+        -> Optional[SliceChunk]:
+    """
+    Packed bits of the non-empty region of an axial slice of a
+    segmentation (None if empty)
+    """
+
+    if isinstance(seg, SparseSeg):
+        return seg.get_chunk(slice_index)
+
+    if isinstance(seg, LabelSeg):
+        return SliceChunk.from_dense(
+            seg.extract(seg.label_volume.array[slice_index]))
+
+    return SliceChunk.from_dense(seg[slice_index])
+
+
+def _crop_to_FOV(seg_slice: np.array,
+                 series: BaseSeries,
+                 orientation: str,
+                 FOV: Optional[list[float]]) -> np.array:
+
+    if FOV is not None:
+
+        pixel_spacing = \
+            get_reoriented_PS(series.get_frame(), orientation)
+
+        x_range, y_range = \
+            get_slice_limits(
+                FOV,
+                seg_slice.shape,
+                pixel_spacing)
+
+        seg_slice = \
+            seg_slice[y_range[0]:y_range[1]+1,
+                      x_range[0]:x_range[1]+1]
+
+    return seg_slice
+
+
+def _get_label_slice(label_seg: LabelSeg,
+                     series: BaseSeries,
+                     orientation: str,
+                     slice_index: int,
+                     FOV: Optional[list[float]]) -> np.array:
+    """
+    View of the label volume of a segmentation as displayed
+    """
+
+    label_slice = reorient_from_axial(
+        label_seg.label_volume.array,
+        orientation,
+        slice_index)
+
+    return _crop_to_FOV(label_slice, series, orientation, FOV)
+
+
+def _get_slice_indices(seg_shape: Tuple[int, int, int],
+                       series: BaseSeries,
+                       orientation: str,
+                       slice_index: int,
+                       FOV: Optional[list[float]]) \
+        -> Tuple[np.array, np.array, np.array]:
+    """
+    Indices in the axial volume of the pixels of a displayed slice
+
+    Volumes of indices along each axis are broadcast without being
+    allocated and reoriented like the segmentation would be.
+    """
+
+    index_volume_list = [
+        np.broadcast_to(
+            np.arange(dim_size).reshape(
+                [-1 if other_axis == axis else 1
+                 for other_axis in range(len(seg_shape))]),
+            seg_shape)
+        for axis, dim_size in enumerate(seg_shape)]
+
+    return tuple(
+        _crop_to_FOV(
+            reorient_from_axial(index_volume, orientation, slice_index),
+            series,
+            orientation,
+            FOV)
+        for index_volume in index_volume_list)
+
+
+def get_axial_slice_range(seg: np.array, seg_region: np.array) -> range:
+    """
+    Range of the axial slices of a segmentation covered by a region
+    viewed from it in any orientation
+
+    The segmentation must be contiguous with axial slices along its
+    first axis, as created by the model.
+    """
+
+    if seg_region.size == 0:
+        return range(0)
+
+    # Byte offsets of the first and last elements of the region
+    start = seg_region.__array_interface__['data'][0] - \
+        seg.__array_interface__['data'][0]
+
+    extent = np.array(seg_region.shape) - 1
+    strides = np.array(seg_region.strides)
+
+    first = start + int(np.sum(np.minimum(strides, 0) * extent))
+    last = start + int(np.sum(np.maximum(strides, 0) * extent))
+
+    return range(first // seg.strides[0], last // seg.strides[0] + 1)
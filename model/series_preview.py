@@ -0,0 +1,133 @@
+"""
+Preview of a series read directly from its files
+"""
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+import pydicom
+from pydicom.errors import InvalidDicomError
+from pydicom.filereader import read_partial
+from pydicom.tag import BaseTag, Tag
+
+
+# Reading of headers for sorting files stops past this element
+INSTANCE_NUMBER_TAG = Tag('InstanceNumber')
+
+# Header elements giving the size of the pixel data of a file
+SIZE_TAGS = [Tag('SamplesPerPixel'), Tag('NumberOfFrames'),
+             Tag('Rows'), Tag('Columns'), Tag('BitsAllocated')]
+
+# Reading of headers for estimating sizes stops past this element
+LAST_SIZE_TAG = max(SIZE_TAGS)
+
+# Pixel values and window of a preview slice
+Preview = Tuple[np.ndarray, Tuple[float, float]]
+
+
+def _read_instance_number(file_path: str) -> int:
+
+    def stop_when(tag: BaseTag, VR: Optional[str], length: int):
+
+        return tag > INSTANCE_NUMBER_TAG
+
+    with open(file_path, 'rb') as file:
+        dataset = read_partial(
+            file,
+            stop_when=stop_when,
+            specific_tags=[INSTANCE_NUMBER_TAG])
+
+    return int(dataset.get('InstanceNumber', 0))
+
+
+def estimate_n_bytes_from_headers(file_path_list: Sequence[str]) \
+        -> Optional[int]:
+    """
+    Size of the pixel data of a series from the header of one of its
+    files, assuming that all its files have the same size
+
+    None if the header can't be read.
+    """
+
+    if len(file_path_list) == 0:
+        return None
+
+    def stop_when(tag: BaseTag, VR: Optional[str], length: int):
+
+        return tag > LAST_SIZE_TAG
+
+    try:
+        with open(file_path_list[0], 'rb') as file:
+            dataset = read_partial(
+                file,
+                stop_when=stop_when,
+                specific_tags=SIZE_TAGS)
+
+        n_bytes_per_file = \
+            int(dataset.get('SamplesPerPixel', 1)) * \
+            int(dataset.get('NumberOfFrames', 1)) * \
+            int(dataset.Rows) * int(dataset.Columns) * \
+            ((int(dataset.get('BitsAllocated', 16)) + 7) // 8)
+
+    except (InvalidDicomError, OSError, ValueError,
+            AttributeError, TypeError):
+        return None
+
+    return n_bytes_per_file * len(file_path_list)
+
+
+def read_preview_slice(file_path_list: Sequence[str]) \
+        -> Optional[Preview]:
+    """
+    Read the middle slice of a series, ordered by instance number,
+    along with a window for displaying it
+
+    Only the headers needed for sorting and the pixel data of a
+    single file are read. For multi-frame files, the middle frame is
+    used. None if the slice can't be read.
+    """
+
+    if len(file_path_list) == 0:
+        return None
+
+    try:
+        file_path_list = sorted(file_path_list,
+                                key=_read_instance_number)
+
+        dataset = pydicom.dcmread(
+            file_path_list[len(file_path_list) // 2])
+
+        pixel_array = dataset.pixel_array
+
+    except (InvalidDicomError, OSError, ValueError,
+            AttributeError, TypeError):
+        return None
+
+    if pixel_array.ndim != 2:
+
+        if int(dataset.get('NumberOfFrames', 1)) <= 1:
+            # Color images are not supported
+            return None
+
+        pixel_array = pixel_array[len(pixel_array) // 2]
+
+    pixel_array = \
+        float(dataset.get('RescaleSlope', 1)) * pixel_array + \
+        float(dataset.get('RescaleIntercept', 0))
+
+    def get_first(value):
+
+        return float(value[0] if isinstance(value, Sequence) else value)
+
+    if 'WindowCenter' in dataset and 'WindowWidth' in dataset:
+
+        window = get_first(dataset.WindowCenter), \
+            get_first(dataset.WindowWidth)
+    else:
+        min_value, max_value = pixel_array.min(), pixel_array.max()
+
+        window = float(min_value + max_value) / 2, \
+            float(max_value - min_value)
+
+    return pixel_array, window
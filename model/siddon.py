@@ -18,7 +18,19 @@ ALPHA_MIN = _float(0.0)
 ALPHA_MAX = _float(1.0)
 
 
-def compute_path(im_shape, line_ij, closed=False):
+def compute_path(im_shape, line_ij, closed=False, batch=True):
+    """
+    Compute the pixels crossed by a polyline
+
+    The batch tracer is used by default. The scalar tracer is kept
+    as a reference and yields the same path. Both trace the points
+    cast to single precision, whatever their type.
+    """
+
+    line_ij = np.asarray(line_ij, dtype=_float).reshape(-1, 2)
+
+    if batch:
+        return compute_path_batch(im_shape, line_ij, closed)
 
     segments = list(zip(line_ij[:-1], line_ij[1:]))
 
@@ -35,7 +47,7 @@ def compute_path(im_shape, line_ij, closed=False):
         path_i.extend(path_elements_i)
         path_j.extend(path_elements_j)
 
-    return path_i, path_j
+    return np.array(path_i, dtype=_int), np.array(path_j, dtype=_int)
 
 
 def compute_path_core(im_shape, r1_ij, r2_ij):
@@ -46,10 +58,10 @@ def compute_path_core(im_shape, r1_ij, r2_ij):
     setup_ij = [None] * 2
     setup_ij[0] = _dim_setup(im_shape[0], r1_ij[0], r2_ij[0])
     if setup_ij[0] is None:
-        return
+        return [], []
     setup_ij[1] = _dim_setup(im_shape[1], r1_ij[1], r2_ij[1])
     if setup_ij[1] is None:
-        return
+        return [], []
 
     # Values of alpha producing the points where the line enters
     # and exits the plane
@@ -63,7 +75,7 @@ def compute_path_core(im_shape, r1_ij, r2_ij):
         ALPHA_MAX])
 
     if alpha_min >= alpha_max:
-        return
+        return [], []
 
     # Find the variations of alpha necessary to travel between
     # neighboring inter-pixel planes for a given dimension
@@ -241,3 +253,291 @@ def _prepare_dim(pixel_width, r1, setup, position, d_alpha):
         alpha += d_alpha
 
     return alpha
+
+
+def compute_path_batch(im_shape, line_ij, closed=False):
+    """
+    Batch version of compute_path processing all segments at once
+
+    The alpha values of every crossing are computed with array
+    operations and merged per segment, reproducing the sequence of
+    floating point operations of compute_path_core so that both
+    tracers yield the same path.
+    """
+
+    points = np.asarray(line_ij, dtype=_float).reshape(-1, 2)
+
+    r1_ij = points[:-1]
+    r2_ij = points[1:]
+
+    if closed and len(points) > 0:
+        r1_ij = np.concatenate([r1_ij, points[-1:]])
+        r2_ij = np.concatenate([r2_ij, points[:1]])
+
+    # Vertical and horizontal setups for all segments
+    setup_ij = [_dim_setup_batch(dim_size, r1, r2)
+                for dim_size, r1, r2 in
+                zip(im_shape, r1_ij.T, r2_ij.T)]
+
+    # Values of alpha producing the points where each segment
+    # enters and exits the plane
+    alpha_min = np.maximum(
+        np.maximum(setup_ij[0].alpha_min, setup_ij[1].alpha_min),
+        ALPHA_MIN)
+    alpha_max = np.minimum(
+        np.minimum(setup_ij[0].alpha_max, setup_ij[1].alpha_max),
+        ALPHA_MAX)
+
+    # Only keep segments intersecting the plane
+    valid = setup_ij[0].intersects & setup_ij[1].intersects & \
+        (alpha_min < alpha_max)
+
+    r1_ij = r1_ij[valid]
+    setup_ij = [setup.select(valid) for setup in setup_ij]
+    alpha_min = alpha_min[valid]
+    alpha_max = alpha_max[valid]
+
+    n_segments = len(r1_ij)
+
+    # Find the variations of alpha necessary to travel between
+    # neighboring inter-pixel planes for a given dimension
+    d_alpha_ij = [_float(1) / np.abs(setup.diff)
+                  for setup in setup_ij]
+
+    # Pixels where the segments enter the plane
+    start_ij = [_get_start_ind_batch(dim_size, r1, setup.diff,
+                                     alpha_min)
+                for dim_size, r1, setup in
+                zip(im_shape, r1_ij.T, setup_ij)]
+
+    # Values of alpha for which the segments cross the planes
+    # between neighboring pixels, for both dimensions
+    segment_list = []
+    dim_list = []
+    alpha_list = []
+    for dim in range(2):
+
+        segment, alpha = _crossings_batch(
+            r1_ij[:, dim],
+            setup_ij[dim],
+            start_ij[dim],
+            d_alpha_ij[dim],
+            alpha_max)
+
+        segment_list.append(segment)
+        dim_list.append(np.full(len(segment), dim, dtype=_int))
+        alpha_list.append(alpha)
+
+    segment = np.concatenate(segment_list)
+    dim = np.concatenate(dim_list)
+    alpha = np.concatenate(alpha_list)
+
+    # Merge crossings of each segment in order of increasing alpha
+    order = np.lexsort((alpha, segment))
+    segment = segment[order]
+    dim = dim[order]
+    alpha = alpha[order]
+
+    # A crossing of one dimension that is within EPSILON of a
+    # crossing of the other dimension is part of the same step
+    partner = np.zeros(len(alpha), dtype=bool)
+    partner[1:] = \
+        (segment[1:] == segment[:-1]) & \
+        (dim[1:] != dim[:-1]) & \
+        (alpha[1:] - alpha[:-1] < EPSILON)
+
+    # Only steps starting before alpha_max produce a path element
+    step = np.cumsum(~partner) - 1
+    step_alpha = alpha[~partner]
+    step_segment = segment[~partner]
+    taken = (step_alpha < alpha_max[step_segment])[step]
+
+    segment = segment[taken]
+    dim = dim[taken]
+    partner = partner[taken]
+
+    # Last crossing of each step taken and first crossing of each
+    # segment having at least one step taken
+    last = np.ones(len(segment), dtype=bool)
+    last[:-1] = ~partner[1:]
+    step_end = np.flatnonzero(last)
+
+    first = np.ones(len(segment), dtype=bool)
+    first[1:] = segment[1:] != segment[:-1]
+    first = np.flatnonzero(first)
+
+    step_first = first[
+        np.searchsorted(first, step_end, side='right') - 1]
+    step_segment = segment[step_end]
+
+    # Position after each step, obtained by counting the
+    # crossings along each dimension since the segment start
+    step_position_ij = []
+    for d in range(2):
+
+        n_crossed = np.cumsum(dim == d)
+        n_crossed_before = n_crossed[step_first] - \
+            (dim[step_first] == d)
+
+        step_position_ij.append(
+            start_ij[d][step_segment] +
+            setup_ij[d].direction[step_segment] *
+            (n_crossed[step_end] - n_crossed_before))
+
+    # Path elements: entry pixel of each segment followed by the
+    # pixels reached after each step, in segment order
+    path_segment = np.concatenate(
+        [np.arange(n_segments), step_segment])
+    path_order = np.argsort(path_segment, kind='stable')
+
+    path_ij = [np.concatenate([start, step_position])[path_order]
+               for start, step_position in
+               zip(start_ij, step_position_ij)]
+
+    # Make sure path elements are within the boundaries of the
+    # plane
+    inside = \
+        (path_ij[0] >= 0) & (path_ij[0] <= im_shape[0] - 1) & \
+        (path_ij[1] >= 0) & (path_ij[1] <= im_shape[1] - 1)
+
+    path_i, path_j = [np.ascontiguousarray(path[inside], dtype=_int)
+                      for path in path_ij]
+
+    return path_i, path_j
+
+
+@dataclass
+class _BatchSetup:
+    """
+    Setup variables for a given dimension dim, with one entry per
+    segment (see _Setup)
+    """
+
+    diff: np.ndarray
+    direction: np.ndarray
+    alpha_min: np.ndarray
+    alpha_max: np.ndarray
+
+    # True where the segment has no component along dim
+    cancelled: np.ndarray
+
+    # False where a cancelled segment lies outside the plane
+    intersects: np.ndarray
+
+    def select(self, mask: np.ndarray):
+
+        return _BatchSetup(
+            self.diff[mask],
+            self.direction[mask],
+            self.alpha_min[mask],
+            self.alpha_max[mask],
+            self.cancelled[mask],
+            self.intersects[mask])
+
+
+def _dim_setup_batch(dim_size, r1: np.ndarray, r2: np.ndarray):
+
+    low_plane = _float(-0.5)
+    high_plane = _float(dim_size - 0.5)
+
+    diff = r2 - r1
+
+    cancelled = ~(np.abs(diff) > EPSILON)
+
+    intersects = ~cancelled | \
+        ((r1 >= low_plane) & (r1 <= high_plane))
+
+    # Special values for cancelled dimensions
+    diff = np.where(cancelled, EPSILON, diff)
+    direction = np.where(~cancelled & (diff > 0), DIR_POS, DIR_NEG)
+
+    low_alpha = (low_plane - r1) / diff
+    high_alpha = (high_plane - r1) / diff
+
+    positive = direction > 0
+
+    alpha_min = np.where(
+        cancelled,
+        ALPHA_MIN,
+        np.where(positive, low_alpha, high_alpha))
+    alpha_max = np.where(
+        cancelled,
+        ALPHA_MAX,
+        np.where(positive, high_alpha, low_alpha))
+
+    return _BatchSetup(
+        diff,
+        direction,
+        alpha_min,
+        alpha_max,
+        cancelled,
+        intersects)
+
+
+def _get_start_ind_batch(dim_size, r1, diff, alpha_min):
+
+    low_plane = -0.5
+
+    ind = np.floor(r1 + diff * alpha_min - low_plane).astype(_int)
+
+    # Make sure the initial coordinates are within the plane
+    return np.clip(ind, 0, dim_size - 1)
+
+
+def _crossings_batch(r1, setup, position, d_alpha, alpha_max):
+    """
+    Values of alpha for which each segment crosses the planes
+    between neighboring pixels along a given dimension, returned
+    as flat arrays of segment indices and alpha values
+    """
+
+    # Value of alpha at the first crossing (see _prepare_dim)
+    length = -0.5 + position.astype(np.float64) - r1
+    first_alpha = length / setup.diff
+    first_alpha = first_alpha + \
+        np.where(setup.direction > 0, d_alpha, 0.0)
+    first_alpha[setup.cancelled] = ALPHA_MAX
+
+    # Crossings beyond alpha_max can only be merged with a step
+    # if they are within EPSILON of it
+    alpha_limit = alpha_max.astype(np.float64) + 2 * EPSILON
+
+    n_crossings = np.floor(
+        (alpha_limit - first_alpha) / d_alpha) + 2
+    n_crossings = np.where(setup.cancelled, 1, n_crossings)
+    n_crossings = np.maximum(n_crossings, 1).astype(int)
+
+    # Successive crossings are obtained by repeated addition as in
+    # compute_path_core. Segments are grouped in buckets of
+    # similar sizes to limit padding.
+    bucket = np.ceil(np.log2(n_crossings)).astype(int)
+
+    segment_list = []
+    alpha_list = []
+    for bucket_value in np.unique(bucket):
+
+        members = np.flatnonzero(bucket == bucket_value)
+        width = n_crossings[members].max()
+
+        steps = np.empty((len(members), width))
+        steps[:, 0] = first_alpha[members]
+        steps[:, 1:] = d_alpha[members, np.newaxis]
+
+        alpha = np.add.accumulate(steps, axis=1)
+
+        keep = np.arange(width) < \
+            n_crossings[members, np.newaxis]
+
+        segment_list.append(
+            np.broadcast_to(members[:, np.newaxis],
+                            alpha.shape)[keep])
+        alpha_list.append(alpha[keep])
+
+    segment = np.concatenate(segment_list) \
+        if segment_list else np.array([], dtype=int)
+    alpha = np.concatenate(alpha_list) \
+        if alpha_list else np.array([])
+
+    keep = alpha < alpha_limit[segment]
+
+    return segment[keep], alpha[keep]
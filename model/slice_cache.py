@@ -0,0 +1,194 @@
+"""
+Cache of rendered slices
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple, Self
+
+import numpy as np
+
+from matplotlib.axes import Axes
+from matplotlib.colors import Colormap
+
+from DicomSeriesManager.display import show
+from DicomSeriesManager.series import BaseSeries
+
+
+# Maximum total size of the cached slices (bytes)
+SLICE_CACHE_BUDGET = 256 * 2**20
+
+# Number of slices rendered ahead in the direction of travel
+PREFETCH_DEPTH = 4
+
+
+@dataclass(frozen=True)
+class SliceKey:
+    """
+    Everything the pixels of a rendered slice depend on
+
+    The window is applied when displaying, so it is not part of the
+    key: Changing it doesn't require rendering again.
+    """
+
+    series_index: int
+    frame_index: int
+    orientation: str
+    slice_index: int
+    FOV: Optional[Tuple[float, ...]]
+
+    @classmethod
+    def make(cls,
+             series_index: int,
+             frame_index: int,
+             orientation: str,
+             slice_index: int,
+             FOV: Optional[list[float]]) -> Self:
+
+        return cls(series_index,
+                   frame_index,
+                   orientation,
+                   slice_index,
+                   tuple(FOV) if FOV is not None else None)
+
+    def with_slice_index(self, slice_index: int) -> Self:
+
+        return replace(self, slice_index=slice_index)
+
+    def get_direction(self, previous: Optional[Self]) -> int:
+        """
+        Direction of travel from a previous key (0 if the slice index
+        hasn't changed or if something else has)
+        """
+
+        if previous is None or \
+                replace(previous, slice_index=self.slice_index) != self:
+            return 0
+
+        return int(np.sign(self.slice_index - previous.slice_index))
+
+
+def get_window_limits(window: Tuple[float, float]) \
+        -> Tuple[float, float]:
+    """
+    Lowest and highest displayed pixel values of a window given as
+    (center, width)
+    """
+
+    center, width = window
+
+    return center - width/2, center + width/2
+
+
+@dataclass
+class RenderedSlice:
+    """
+    Pixel values of a slice, before windowing, along with its color
+    map and the layout of the axes it was drawn on
+    """
+
+    data: np.ndarray
+    cmap: Colormap
+    extent: Tuple[float, float, float, float]
+    origin: str
+    xlim: Tuple[float, float]
+    ylim: Tuple[float, float]
+    aspect: object
+    title: str
+    axison: bool
+
+    @classmethod
+    def from_axes(cls, axes: Axes) -> Self:
+
+        image = axes.get_images()[-1]
+
+        # Copied so that the slice doesn't keep a whole volume alive
+        return cls(np.ma.getdata(image.get_array()).copy(),
+                   image.get_cmap(),
+                   tuple(image.get_extent()),
+                   image.origin,
+                   axes.get_xlim(),
+                   axes.get_ylim(),
+                   axes.get_aspect(),
+                   axes.get_title(),
+                   axes.axison)
+
+    @property
+    def layout(self) -> tuple:
+        """
+        Properties of the axes that require a full redraw when changed
+        """
+
+        return self.extent, self.origin, self.xlim, self.ylim, \
+            self.aspect, self.title, self.axison
+
+    @property
+    def nbytes(self) -> int:
+
+        return self.data.nbytes
+
+
+def render_slice(series: BaseSeries,
+                 axes: Axes,
+                 key: SliceKey,
+                 window: Tuple[float, float]) -> RenderedSlice:
+    """
+    Render a slice on offscreen axes
+
+    The window only affects the color limits of the rendered image,
+    which are not kept. Axes must not be shared with other threads.
+    """
+
+    # Removing images is much cheaper than clearing the axes
+    for image in axes.get_images():
+        image.remove()
+
+    show(series, axes,
+         ind=key.slice_index,
+         frame=key.frame_index,
+         orientation=key.orientation,
+         window=window,
+         FOV=list(key.FOV) if key.FOV is not None else None)
+
+    return RenderedSlice.from_axes(axes)
+
+
+class SliceCache:
+    """
+    Rendered slices with least recently used eviction once the total
+    size exceeds the budget
+    """
+
+    def __init__(self, budget: int = SLICE_CACHE_BUDGET):
+
+        self._budget = budget
+        self._size = 0
+
+        self._slices: OrderedDict[SliceKey, RenderedSlice] = \
+            OrderedDict()
+
+    def __contains__(self, key: SliceKey) -> bool:
+
+        return key in self._slices
+
+    def get(self, key: SliceKey) -> Optional[RenderedSlice]:
+
+        rendered = self._slices.get(key)
+
+        if rendered is not None:
+            self._slices.move_to_end(key)
+
+        return rendered
+
+    def put(self, key: SliceKey, rendered: RenderedSlice):
+
+        if key in self._slices:
+            self._size -= self._slices.pop(key).nbytes
+
+        self._slices[key] = rendered
+        self._size += rendered.nbytes
+
+        while self._size > self._budget and len(self._slices) > 1:
+
+            _, evicted = self._slices.popitem(last=False)
+            self._size -= evicted.nbytes
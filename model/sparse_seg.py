@@ -0,0 +1,293 @@
+"""
+Sparse storage of binary segmentations
+"""
+
+import os
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Self
+from zipfile import BadZipFile
+
+import numpy as np
+
+
+# File suffix of compressed segmentation files
+SPARSE_SEG_FILE_SUFFIX = '.npz'
+SPARSE_SEG_VERSION = 1
+
+
+@dataclass(frozen=True)
+class SliceChunk:
+    """
+    Packed bits of the bounding box of the nonzero pixels of an axial
+    slice
+    """
+
+    i_first: int
+    j_first: int
+    shape: Tuple[int, int]
+    bits: np.ndarray
+
+    @classmethod
+    def from_dense(cls, im_slice: np.ndarray) -> Optional[Self]:
+        """
+        None if the slice is empty
+        """
+
+        rows = np.flatnonzero(im_slice.any(axis=1))
+
+        if len(rows) == 0:
+            return None
+
+        cols = np.flatnonzero(im_slice.any(axis=0))
+
+        region = im_slice[rows[0]:rows[-1]+1, cols[0]:cols[-1]+1] != 0
+
+        return cls(int(rows[0]),
+                   int(cols[0]),
+                   region.shape,
+                   np.packbits(region))
+
+    def write_to(self, im_slice: np.ndarray):
+
+        n_rows, n_cols = self.shape
+
+        im_slice[self.i_first:self.i_first+n_rows,
+                 self.j_first:self.j_first+n_cols] = \
+            np.unpackbits(self.bits, count=n_rows*n_cols).\
+            reshape(self.shape)
+
+    @property
+    def nbytes(self) -> int:
+
+        return self.bits.nbytes
+
+
+class SparseSeg:
+    """
+    Binary segmentation volume storing only the bounding box of the
+    nonzero pixels of each axial slice, packed 8 pixels per byte
+
+    Empty slices take no memory. Dense slices are read with take and
+    written back with put, which work with index arrays so that slices
+    can be accessed in any orientation.
+    """
+
+    dtype = np.dtype(np.uint8)
+
+    def __init__(self, shape: Tuple[int, int, int]):
+
+        self.shape = tuple(int(dim_size) for dim_size in shape)
+
+        self._chunks: Dict[int, SliceChunk] = {}
+
+    def __len__(self) -> int:
+
+        return self.shape[0]
+
+    @property
+    def ndim(self) -> int:
+
+        return len(self.shape)
+
+    @property
+    def nbytes(self) -> int:
+
+        return sum(chunk.nbytes for chunk in self._chunks.values())
+
+    @classmethod
+    def from_dense(cls, seg: np.ndarray) -> Self:
+
+        sparse_seg = cls(seg.shape)
+
+        for slice_index in np.flatnonzero(seg.any(axis=(1, 2))):
+            sparse_seg.set_axial_slice(slice_index, seg[slice_index])
+
+        return sparse_seg
+
+    def to_dense(self) -> np.ndarray:
+
+        seg = np.zeros(self.shape, dtype=self.dtype)
+
+        for slice_index in self.get_non_empty_slice_indices():
+            self.get_chunk(slice_index).write_to(seg[slice_index])
+
+        return seg
+
+    def copy(self) -> Self:
+
+        # Chunks are immutable
+        sparse_seg = type(self)(self.shape)
+        sparse_seg._chunks = dict(self._chunks)
+
+        return sparse_seg
+
+    def get_non_empty_slice_indices(self) -> Sequence[int]:
+
+        return sorted(self._chunks)
+
+    def get_chunk(self, slice_index: int) -> Optional[SliceChunk]:
+        """
+        None if the slice is empty
+        """
+
+        return self._chunks.get(int(slice_index))
+
+    def set_chunk(self, slice_index: int, chunk: Optional[SliceChunk]):
+
+        if chunk is not None:
+            self._chunks[int(slice_index)] = chunk
+        else:
+            self._chunks.pop(int(slice_index), None)
+
+    def get_axial_slice(self, slice_index: int) -> np.ndarray:
+
+        im_slice = np.zeros(self.shape[1:], dtype=self.dtype)
+
+        chunk = self.get_chunk(slice_index)
+
+        if chunk is not None:
+            chunk.write_to(im_slice)
+
+        return im_slice
+
+    def set_axial_slice(self, slice_index: int, im_slice: np.ndarray):
+
+        self.set_chunk(slice_index, SliceChunk.from_dense(im_slice))
+
+    def take(self,
+             z_index: np.ndarray,
+             y_index: np.ndarray,
+             x_index: np.ndarray) -> np.ndarray:
+        """
+        Values at the given indices, as a new array shaped like them
+        """
+
+        values = np.zeros(z_index.shape, dtype=self.dtype)
+
+        if z_index.size == 0:
+            return values
+
+        z_first, z_last = int(z_index.min()), int(z_index.max())
+
+        # Only non-empty slices are decompressed
+        for slice_index in self.get_non_empty_slice_indices():
+
+            if not z_first <= slice_index <= z_last:
+                continue
+
+            im_slice = self.get_axial_slice(slice_index)
+
+            if z_first == z_last:
+                return im_slice[y_index, x_index]
+
+            in_slice = z_index == slice_index
+
+            values[in_slice] = \
+                im_slice[y_index[in_slice], x_index[in_slice]]
+
+        return values
+
+    def put(self,
+            z_index: np.ndarray,
+            y_index: np.ndarray,
+            x_index: np.ndarray,
+            values: np.ndarray):
+        """
+        Set values at the given indices
+        """
+
+        for slice_index in np.unique(z_index):
+
+            in_slice = z_index == slice_index
+
+            im_slice = self.get_axial_slice(slice_index)
+            im_slice[y_index[in_slice], x_index[in_slice]] = \
+                values[in_slice]
+
+            self.set_axial_slice(slice_index, im_slice)
+
+    def save(self, seg_file_path: Path):
+        """
+        Save as a compressed NumPy archive
+        """
+
+        slice_index_list = self.get_non_empty_slice_indices()
+        chunk_list = [self.get_chunk(slice_index)
+                      for slice_index in slice_index_list]
+
+        bits_offsets = np.cumsum(
+            [0] + [chunk.bits.size for chunk in chunk_list])
+
+        bits = np.concatenate(
+            [chunk.bits for chunk in chunk_list] +
+            [np.zeros(0, dtype=np.uint8)])
+
+        # Write to a temporary file first so that an interrupted
+        # write doesn't corrupt an existing file
+        temp_file_path = Path(seg_file_path).with_name(
+            Path(seg_file_path).name + '.tmp')
+
+        with open(temp_file_path, 'wb') as seg_file:
+            np.savez_compressed(
+                seg_file,
+                version=SPARSE_SEG_VERSION,
+                shape=self.shape,
+                slice_indices=np.array(slice_index_list, dtype=np.int64),
+                chunk_origins=np.array(
+                    [(chunk.i_first, chunk.j_first)
+                     for chunk in chunk_list],
+                    dtype=np.int64).reshape(-1, 2),
+                chunk_shapes=np.array(
+                    [chunk.shape for chunk in chunk_list],
+                    dtype=np.int64).reshape(-1, 2),
+                bits_offsets=bits_offsets,
+                bits=bits)
+
+        os.replace(temp_file_path, seg_file_path)
+
+    @classmethod
+    def load(cls, seg_file_path: Path) -> Self:
+        """
+        Raises ValueError if the file is not a valid segmentation file
+        """
+
+        try:
+            content = np.load(seg_file_path)
+
+        except (EOFError, BadZipFile, NotImplementedError) as error:
+            raise ValueError(
+                f"Invalid segmentation file: {error}") from error
+
+        with content:
+
+            try:
+                if int(content['version']) != SPARSE_SEG_VERSION:
+                    raise ValueError(
+                        f"Unsupported segmentation file version: "
+                        f"{int(content['version'])}")
+
+                sparse_seg = cls(content['shape'])
+
+                bits = content['bits']
+                bits_offsets = content['bits_offsets']
+
+                for chunk_index, (slice_index, origin, shape) in \
+                        enumerate(zip(content['slice_indices'],
+                                      content['chunk_origins'],
+                                      content['chunk_shapes'])):
+
+                    sparse_seg._chunks[int(slice_index)] = SliceChunk(
+                        int(origin[0]),
+                        int(origin[1]),
+                        (int(shape[0]), int(shape[1])),
+                        bits[bits_offsets[chunk_index]:
+                             bits_offsets[chunk_index+1]])
+
+            except (KeyError, EOFError, BadZipFile, NotImplementedError,
+                    zlib.error) as error:
+                raise ValueError(
+                    f"Invalid segmentation file: {error}") from error
+
+        return sparse_seg
@@ -0,0 +1,219 @@
+"""
+On-disk cache of the pixel value statistics scanned to extract
+display windows
+"""
+
+import base64
+import hashlib
+import json
+import os
+import zlib
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from DicomSeriesManager.series import BaseSeries
+
+from QuickSeg.model.display_window_model import Histogram, MinMax
+
+
+CACHE_FILE_SUFFIX = '.windows.json'
+CACHE_VERSION = 3
+
+# Per-frame pixel value ranges and histograms (see
+# scan_frame_statistics)
+FrameStatistics = Tuple[Sequence[MinMax], Optional[Sequence[Histogram]]]
+
+# Series key: SeriesInstanceUID and signature of the series files
+SeriesKey = Tuple[str, str]
+
+
+def get_cache_file_path(content_file_path: str) -> Path:
+    """
+    Path of the cache file kept alongside a DICOM directory content
+    file
+    """
+
+    return Path(content_file_path).with_suffix(CACHE_FILE_SUFFIX)
+
+
+def get_series_key(series: BaseSeries) -> Optional[SeriesKey]:
+    """
+    Get the SeriesInstanceUID of a series along with a signature of
+    the paths, modification times and sizes of its files
+
+    None if the series can't be identified from its files.
+    """
+
+    file_stat_list = []
+
+    for frame in range(series.get_number_of_frames()):
+        for ind in range(series.get_number_of_slices(frame)):
+
+            dataset = series.get_dataset(ind, frame)
+
+            file_path = getattr(dataset, 'filename', None)
+            if not isinstance(file_path, (str, os.PathLike)):
+                return None
+
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return None
+
+            file_stat_list.append(
+                (os.fspath(file_path), stat.st_mtime_ns, stat.st_size))
+
+    exemplar = series.get_dataset(0, 0)
+    series_uid = getattr(exemplar, 'SeriesInstanceUID', None)
+    if series_uid is None:
+        return None
+
+    signature = hashlib.sha1(
+        repr(sorted(file_stat_list)).encode()).hexdigest()
+
+    return str(series_uid), signature
+
+
+def _encode_histogram(histogram: Histogram) -> dict:
+
+    counts = histogram.counts.astype('<i8').tobytes()
+
+    return {
+        'shift': histogram.shift,
+        'first_bin': histogram.first_bin,
+        'counts': base64.b64encode(zlib.compress(counts)).decode()}
+
+
+def _decode_histogram(content: dict) -> Histogram:
+
+    counts = np.frombuffer(
+        zlib.decompress(base64.b64decode(content['counts'])),
+        dtype='<i8').astype(np.int64)
+
+    return Histogram(
+        int(content['shift']),
+        int(content['first_bin']),
+        counts)
+
+
+class WindowCache:
+    """
+    Per-frame pixel value statistics of series, keyed by series UID
+    and invalidated when the series files change
+
+    Entries are looked up from scanning threads while the cache is
+    saved from the GUI thread, so they are guarded by a lock.
+    """
+
+    def __init__(self):
+
+        # Series UID -> (signature, per-frame statistics)
+        self._entries: dict[str, Tuple[str, FrameStatistics]] = {}
+
+        self._lock = Lock()
+
+    def get(self, series_key: SeriesKey) \
+            -> Optional[FrameStatistics]:
+
+        series_uid, signature = series_key
+
+        with self._lock:
+
+            entry = self._entries.get(series_uid)
+
+            if entry is None:
+                return None
+
+            entry_signature, frame_statistics = entry
+
+            if entry_signature != signature:
+                # Files have changed since the entry was stored
+                del self._entries[series_uid]
+                return None
+
+        return frame_statistics
+
+    def put(self,
+            series_key: SeriesKey,
+            frame_statistics: FrameStatistics):
+
+        series_uid, signature = series_key
+
+        with self._lock:
+            self._entries[series_uid] = (signature, frame_statistics)
+
+    def save(self, cache_file_path: Path):
+
+        def encode_entry(signature, frame_statistics):
+
+            frame_minmax_list, frame_histogram_list = \
+                frame_statistics
+
+            return {
+                'signature': signature,
+                'frame_minmax_list':
+                    [list(minmax) for minmax in frame_minmax_list],
+                'frame_histogram_list':
+                    [_encode_histogram(histogram)
+                     for histogram in frame_histogram_list]
+                    if frame_histogram_list is not None else None}
+
+        # Entries are immutable once stored: Encode a snapshot
+        with self._lock:
+            entries = dict(self._entries)
+
+        content = {
+            'version': CACHE_VERSION,
+            'series': {
+                series_uid: encode_entry(*entry)
+                for series_uid, entry in entries.items()}}
+
+        # Write to a temporary file first so that an interrupted
+        # write doesn't corrupt an existing cache
+        temp_file_path = cache_file_path.with_name(
+            cache_file_path.name + '.tmp')
+
+        with open(temp_file_path, 'w') as cache_file:
+            json.dump(content, cache_file)
+
+        os.replace(temp_file_path, cache_file_path)
+
+    @classmethod
+    def load(cls, cache_file_path: Path) -> 'WindowCache':
+        """
+        Load cache from file (empty if missing or invalid)
+        """
+
+        cache = cls()
+
+        try:
+            with open(cache_file_path) as cache_file:
+                content = json.load(cache_file)
+
+            if content['version'] != CACHE_VERSION:
+                return cache
+
+            for series_uid, entry in content['series'].items():
+
+                frame_minmax_list = \
+                    [tuple(minmax)
+                     for minmax in entry['frame_minmax_list']]
+
+                frame_histogram_list = \
+                    [_decode_histogram(histogram)
+                     for histogram in entry['frame_histogram_list']] \
+                    if entry['frame_histogram_list'] is not None \
+                    else None
+
+                cache._entries[series_uid] = (
+                    entry['signature'],
+                    (frame_minmax_list, frame_histogram_list))
+
+        except (OSError, ValueError, KeyError, TypeError, zlib.error):
+            # The cache is only an optimization: Start over
+            return cls()
+
+        return cache
@@ -15,6 +15,8 @@ from DicomSeriesManager.reorientation import (
 from DicomSeriesManager.series import BaseSeries
 from DicomSeriesManager.utils import get_slice_limits
 
+from QuickSeg.model.blit_utils import ArtistBlitter
+
 
 Point = tuple[int, int]
 Region = tuple[Point, Point]
@@ -28,10 +30,11 @@ def select_region(fig: Figure) -> Optional[Region]:
     first_point = None
     second_point = None
     rect = None
+    blitter = None
 
     def handler(event: Event):
 
-        nonlocal first_point, second_point, rect
+        nonlocal first_point, second_point, rect, blitter
 
         left_button_pressed = \
             event.name == "button_press_event" \
@@ -53,8 +56,7 @@ def select_region(fig: Figure) -> Optional[Region]:
 
             if tracing_started:
 
-                rect.remove()
-                fig.canvas.draw()
+                blitter.remove()
 
             fig.canvas.stop_event_loop()
 
@@ -76,7 +78,7 @@ def select_region(fig: Figure) -> Optional[Region]:
 
             axes.add_patch(rect)
 
-            fig.canvas.draw()
+            blitter = ArtistBlitter(fig, rect)
 
         elif mouse_moved and tracing_started:
 
@@ -88,7 +90,7 @@ def select_region(fig: Figure) -> Optional[Region]:
                 rect.set_width(width)
                 rect.set_height(height)
 
-                fig.canvas.draw()
+                blitter.update()
 
             else:
                 # TODO: Add logic for out of bounds
@@ -100,8 +102,7 @@ def select_region(fig: Figure) -> Optional[Region]:
 
                 second_point = current_position_xy
 
-                rect.remove()
-                fig.canvas.draw()
+                blitter.remove()
 
             fig.canvas.stop_event_loop()
 
@@ -0,0 +1,82 @@
+"""
+Tests of the regions redrawn by the artist blitter
+"""
+
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from QuickSeg.model.blit_utils import ArtistBlitter
+
+
+def _make_figure():
+
+    figure = Figure(figsize=(4, 3), dpi=100)
+    FigureCanvasAgg(figure)
+
+    axes = figure.add_subplot()
+    axes.imshow(np.arange(100).reshape(10, 10))
+
+    blit_list = []
+    figure.canvas.blit = blit_list.append
+
+    return figure, axes, blit_list
+
+
+def _contains(outer, inner):
+
+    return outer.x0 <= inner.x0 and outer.y0 <= inner.y0 \
+        and outer.x1 >= inner.x1 and outer.y1 >= inner.y1
+
+
+def test_blits_only_artist_extent():
+
+    figure, axes, blit_list = _make_figure()
+
+    line = Line2D([1], [1], linewidth=2, marker='.')
+    axes.add_line(line)
+
+    blitter = ArtistBlitter(figure, line)
+    renderer = figure.canvas.get_renderer()
+
+    first_extent = line.get_window_extent(renderer)
+
+    line.set_data([1, 4], [1, 3])
+    blitter.update()
+
+    second_extent = line.get_window_extent(renderer)
+
+    # Covers the artist before and after the update, but not the
+    # whole axes
+    assert len(blit_list) == 1
+    assert _contains(blit_list[0], first_extent)
+    assert _contains(blit_list[0], second_extent)
+    assert blit_list[0].width < axes.bbox.width / 2
+    assert blit_list[0].height < axes.bbox.height / 2
+
+
+def test_remove_restores_background():
+
+    figure, axes, blit_list = _make_figure()
+
+    figure.canvas.draw()
+    background = np.asarray(figure.canvas.buffer_rgba()).copy()
+
+    line = Line2D([1, 8], [1, 6], linewidth=3)
+    axes.add_line(line)
+
+    blitter = ArtistBlitter(figure, line)
+    line.set_data([1, 8, 8], [1, 6, 2])
+    blitter.update()
+
+    assert not np.array_equal(
+        np.asarray(figure.canvas.buffer_rgba()), background)
+
+    blitter.remove()
+
+    assert np.array_equal(
+        np.asarray(figure.canvas.buffer_rgba()), background)
+    assert _contains(blit_list[-1], line.get_window_extent(
+        figure.canvas.get_renderer()))
@@ -0,0 +1,206 @@
+"""
+Tests of the brush tools
+"""
+
+import numpy as np
+
+from matplotlib.backend_bases import KeyEvent, MouseButton, MouseEvent
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from QuickSeg.model.brush_utils import (
+    get_disk_offsets,
+    paint_stroke,
+    stamp_disks,
+    StrokeBackup)
+
+
+def _reference_disks(shape, centers_ij, radius):
+
+    i, j = np.indices(shape)
+
+    in_disks = np.zeros(shape, dtype=bool)
+
+    for center_i, center_j in np.rint(centers_ij).astype(int):
+        in_disks |= (i - center_i)**2 + (j - center_j)**2 <= radius**2
+
+    return in_disks
+
+
+def test_disk_offsets():
+
+    offsets_i, offsets_j = get_disk_offsets(3)
+
+    assert len(offsets_i) == np.count_nonzero(
+        _reference_disks((7, 7), [(3, 3)], 3))
+    assert np.all(offsets_i**2 + offsets_j**2 <= 9)
+
+
+def test_stamp_disks_matches_reference():
+
+    rng = np.random.default_rng(0)
+    shape = (40, 30)
+
+    for _ in range(50):
+
+        radius = int(rng.integers(1, 8))
+
+        # Some disks lie partly or wholly outside of the slice
+        centers_ij = rng.uniform(-10, 50, (int(rng.integers(1, 5)), 2))
+
+        im_slice = np.zeros(shape, dtype=np.uint8)
+        bbox = stamp_disks(im_slice, centers_ij, radius, 1)
+
+        expected = _reference_disks(shape, centers_ij, radius)
+
+        np.testing.assert_array_equal(im_slice, expected)
+
+        if bbox is None:
+            assert not expected.any()
+
+        # The box around the disks may touch the slice although they
+        # don't
+        if not expected.any():
+            continue
+
+        (i_first, i_last), (j_first, j_last) = bbox
+        rows, cols = np.nonzero(expected)
+
+        # Covers the painted pixels within the slice
+        assert 0 <= i_first <= rows.min() and rows.max() <= i_last
+        assert 0 <= j_first <= cols.min() and cols.max() <= j_last
+        assert i_last < shape[0] and j_last < shape[1]
+
+
+def test_stamp_disks_erases():
+
+    im_slice = np.ones((20, 20), dtype=np.uint8)
+
+    stamp_disks(im_slice, [(10, 10)], 4, 0)
+
+    np.testing.assert_array_equal(
+        im_slice == 0,
+        _reference_disks(im_slice.shape, [(10, 10)], 4))
+
+
+def test_stroke_backup_keeps_pixels_before_stroke():
+
+    rng = np.random.default_rng(1)
+
+    im_slice = (rng.random((50, 60)) > 0.5).astype(np.uint8)
+    slice_before = im_slice.copy()
+
+    stroke_backup = StrokeBackup(im_slice)
+
+    # Stroke going back over painted pixels
+    for center_ij in [(10, 10), (12, 20), (30, 25), (11, 15), (45, 58)]:
+
+        bbox = stamp_disks(np.zeros_like(im_slice), [center_ij], 5, 1)
+
+        stroke_backup.extend(bbox)
+        stamp_disks(im_slice, [center_ij], 5, 1 - im_slice[center_ij])
+
+    (i_first, i_last), (j_first, j_last) = stroke_backup.bbox
+    region = np.s_[i_first:i_last+1, j_first:j_last+1]
+
+    np.testing.assert_array_equal(
+        stroke_backup.region, slice_before[region])
+
+    # Everything painted is within the bounding box
+    outside = np.ones(im_slice.shape, dtype=bool)
+    outside[region] = False
+
+    np.testing.assert_array_equal(
+        im_slice[outside], slice_before[outside])
+
+
+class _ScriptedCanvas(FigureCanvasAgg):
+    """
+    Canvas whose event loop processes a list of events (name, data
+    point or key) instead of user input
+    """
+
+    def __init__(self, figure, event_list):
+
+        super().__init__(figure)
+
+        self._event_list = event_list
+        self._stopped = False
+
+    def setFocus(self):
+
+        pass
+
+    def start_event_loop(self, timeout=0):
+
+        axes = self.figure.axes[0]
+
+        for name, arg in self._event_list:
+
+            if self._stopped:
+                break
+
+            if name == 'key_press_event':
+                event = KeyEvent(name, self, arg)
+            else:
+                x, y = axes.transData.transform(arg)
+                event = MouseEvent(name, self, x, y, MouseButton.LEFT)
+
+            self.callbacks.process(name, event)
+
+    def stop_event_loop(self):
+
+        self._stopped = True
+
+
+def _paint_stroke(event_list, radius=2):
+    """
+    Points passed to paint during a scripted stroke on a 30 x 40 slice
+    """
+
+    figure = Figure()
+    _ScriptedCanvas(figure, event_list)
+
+    axes = figure.add_subplot()
+    axes.imshow(np.zeros((30, 40)))
+
+    painted_list = []
+
+    stroke_made = paint_stroke(figure, painted_list.append, radius)
+
+    return stroke_made, painted_list
+
+
+def test_paint_stroke_interpolates_moves():
+
+    stroke_made, painted_list = _paint_stroke([
+        ('motion_notify_event', (5, 5)),
+        ('button_press_event', (5, 10)),
+        ('motion_notify_event', (15, 10)),
+        ('button_release_event', (15, 10)),
+        ('motion_notify_event', (30, 20))])
+
+    assert stroke_made
+
+    # Moves before the button is pressed and after it is released
+    # aren't painted
+    assert len(painted_list) == 2
+    np.testing.assert_allclose(painted_list[0], [[10, 5]], atol=1e-3)
+
+    # Points one radius apart at most, from (10, 5) to (10, 15)
+    points_ij = painted_list[1]
+
+    np.testing.assert_allclose(points_ij[-1], [10, 15], atol=1e-3)
+    assert np.all(np.linalg.norm(
+        np.diff(np.vstack([painted_list[0], points_ij]), axis=0),
+        axis=1) <= 1 + 1e-3)
+
+
+def test_paint_stroke_stopped_by_escape():
+
+    stroke_made, painted_list = _paint_stroke([
+        ('key_press_event', 'escape'),
+        ('button_press_event', (5, 10))])
+
+    assert not stroke_made
+    assert painted_list == []
@@ -0,0 +1,117 @@
+"""
+Tests of the file handling of chunked segmentations
+"""
+
+import numpy as np
+import pytest
+
+from QuickSeg.model.chunked_seg import (
+    ChunkedSeg,
+    update_chunked_seg,
+    write_chunked_seg)
+from QuickSeg.model.sparse_seg import SliceChunk
+
+
+SHAPE = (6, 32, 32)
+
+
+def _random_seg(seed):
+
+    rng = np.random.default_rng(seed)
+
+    return (rng.random(SHAPE) > 0.8).astype(np.uint8)
+
+
+def _write(seg_file_path, seg):
+
+    write_chunked_seg(
+        seg_file_path,
+        seg.shape,
+        lambda slice_index: SliceChunk.from_dense(seg[slice_index]))
+
+
+def _file(chunked_seg):
+
+    return chunked_seg._shared_file.file
+
+
+def test_copies_share_file_until_all_closed(tmp_path):
+
+    seg = _random_seg(0)
+    seg_file_path = tmp_path / 'seg.qseg'
+    _write(seg_file_path, seg)
+
+    chunked_seg = ChunkedSeg.load(seg_file_path)
+    chunked_seg_copy = chunked_seg.copy()
+
+    chunked_seg.close()
+    chunked_seg.close()
+
+    # The copy can still read chunks
+    assert not _file(chunked_seg_copy).closed
+    np.testing.assert_array_equal(chunked_seg_copy.to_dense(), seg)
+
+    chunked_seg_copy.close()
+
+    assert _file(chunked_seg_copy).closed
+
+
+def test_switch_to_compacted_file(tmp_path):
+
+    seg = _random_seg(1)
+    seg_file_path = tmp_path / 'seg.qseg'
+    _write(seg_file_path, seg)
+
+    chunked_seg = ChunkedSeg.load(seg_file_path)
+    first_file = _file(chunked_seg)
+
+    # Rewriting every slice enough times compacts the file
+    new_seg = _random_seg(2)
+    compacted = False
+
+    for _ in range(3):
+        compacted |= update_chunked_seg(
+            seg_file_path,
+            {slice_index: SliceChunk.from_dense(new_seg[slice_index])
+             for slice_index in range(SHAPE[0])})
+
+    assert compacted
+
+    # Edits not saved yet are kept
+    edited_chunk = SliceChunk.from_dense(seg[0])
+    chunked_seg.set_chunk(0, edited_chunk)
+
+    chunked_seg.switch_file(seg_file_path)
+
+    assert first_file.closed
+
+    expected = new_seg.copy()
+    expected[0] = seg[0]
+
+    np.testing.assert_array_equal(chunked_seg.to_dense(), expected)
+
+    chunked_seg.close()
+
+    assert _file(chunked_seg).closed
+
+    # Does nothing once closed
+    chunked_seg.switch_file(seg_file_path)
+
+
+def test_switch_to_file_of_other_shape(tmp_path):
+
+    seg_file_path = tmp_path / 'seg.qseg'
+    _write(seg_file_path, _random_seg(3))
+
+    other_seg_file_path = tmp_path / 'other.qseg'
+    _write(other_seg_file_path, np.zeros((2, 8, 8), dtype=np.uint8))
+
+    chunked_seg = ChunkedSeg.load(seg_file_path)
+
+    with pytest.raises(ValueError):
+        chunked_seg.switch_file(other_seg_file_path)
+
+    # Still reads from its file
+    assert not _file(chunked_seg).closed
+
+    chunked_seg.close()
@@ -0,0 +1,190 @@
+"""
+Tests of the incremental rescan of DICOM directories
+"""
+
+import os
+from types import SimpleNamespace
+
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from QuickSeg.model.dicom_dir_scan import (
+    DicomDirIndex,
+    get_content_dir_path,
+    list_dicom_dir,
+    merge_dicom_dir_content,
+    update_dicom_dir_index)
+
+
+CT_IMAGE_STORAGE = '1.2.840.10008.5.1.4.1.1.2'
+
+
+def _write_file(file_path, series_uid, description='Series'):
+
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    dataset = Dataset()
+    dataset.file_meta = FileMetaDataset()
+    dataset.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    dataset.file_meta.MediaStorageSOPClassUID = CT_IMAGE_STORAGE
+    dataset.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    dataset.SOPClassUID = CT_IMAGE_STORAGE
+    dataset.SOPInstanceUID = dataset.file_meta.MediaStorageSOPInstanceUID
+    dataset.SeriesInstanceUID = series_uid
+    dataset.SeriesDescription = description
+
+    dataset.save_as(file_path, enforce_file_format=True)
+
+
+def _make_dicom_dir(dicom_dir_path):
+    """
+    Two series of three files, each in its own subdirectory, and a
+    file that isn't a DICOM file
+    """
+
+    for series_uid in ['1.1', '1.2']:
+        for ind in range(3):
+            _write_file(
+                dicom_dir_path / series_uid / f'{ind}.dcm', series_uid)
+
+    (dicom_dir_path / 'notes.txt').write_text('Not a DICOM file')
+
+
+def _update(previous_index):
+
+    dicom_dir_index, changed_series_uid_set = \
+        update_dicom_dir_index(previous_index, max_workers=1)
+
+    return dicom_dir_index, changed_series_uid_set
+
+
+def _index(dicom_dir_path):
+
+    return _update(DicomDirIndex(str(dicom_dir_path), []))[0]
+
+
+def _touch(file_path):
+
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_unchanged_directory(tmp_path):
+
+    _make_dicom_dir(tmp_path)
+    previous_index = _index(tmp_path)
+
+    dicom_dir_index, changed_series_uid_set = _update(previous_index)
+
+    assert changed_series_uid_set == set()
+    assert dicom_dir_index == previous_index
+
+
+def test_changed_series_found(tmp_path):
+
+    _make_dicom_dir(tmp_path)
+    previous_index = _index(tmp_path)
+
+    # New file of a series, new series and changed file that isn't a
+    # DICOM file
+    _write_file(tmp_path / '1.2' / '3.dcm', '1.2')
+    _write_file(tmp_path / '1.2' / 'new' / '0.dcm', '1.3')
+    (tmp_path / 'notes.txt').write_text('Still not a DICOM file')
+
+    dicom_dir_index, changed_series_uid_set = _update(previous_index)
+
+    assert changed_series_uid_set == {'1.2', '1.3'}
+    assert len(dicom_dir_index.file_header_list) == 9
+
+    # Only the subdirectory of the changed series is read again
+    assert get_content_dir_path(
+        previous_index,
+        dicom_dir_index,
+        changed_series_uid_set) == str(tmp_path / '1.2')
+
+
+def test_modified_and_deleted_files(tmp_path):
+
+    _make_dicom_dir(tmp_path)
+    previous_index = _index(tmp_path)
+
+    # File moved to another series and file deleted
+    _write_file(tmp_path / '1.1' / '0.dcm', '1.2')
+    _touch(tmp_path / '1.1' / '0.dcm')
+    os.remove(tmp_path / '1.2' / '2.dcm')
+
+    dicom_dir_index, changed_series_uid_set = _update(previous_index)
+
+    # Both the previous and the new series of the moved file changed
+    assert changed_series_uid_set == {'1.1', '1.2'}
+    assert get_content_dir_path(
+        previous_index,
+        dicom_dir_index,
+        changed_series_uid_set) == str(tmp_path)
+
+    series_uid_dict = \
+        {file_header.path: file_header.series_uid
+         for file_header in dicom_dir_index.file_header_list}
+
+    assert series_uid_dict[str(tmp_path / '1.1' / '0.dcm')] == '1.2'
+    assert str(tmp_path / '1.2' / '2.dcm') not in series_uid_dict
+
+
+def test_deleted_file_of_listed_directory(tmp_path):
+
+    _make_dicom_dir(tmp_path)
+    listed_index = list_dicom_dir(str(tmp_path))
+
+    assert not any(file_header.header_read
+                   for file_header in listed_index.file_header_list)
+
+    os.remove(tmp_path / '1.2' / '2.dcm')
+
+    dicom_dir_index, changed_series_uid_set = _update(listed_index)
+
+    # The series of the deleted file is unknown
+    assert changed_series_uid_set == {'1.1', '1.2'}
+
+    # Headers of unchanged files are read
+    assert all(file_header.header_read
+               for file_header in dicom_dir_index.file_header_list)
+
+    assert _update(dicom_dir_index)[1] == set()
+
+
+def _content(*series_uid_list):
+
+    return SimpleNamespace(
+        series_list=[SimpleNamespace(info={'SeriesInstanceUID': series_uid})
+                     for series_uid in series_uid_list])
+
+
+def _series_uids(dicom_dir_content):
+
+    return [series_files.info['SeriesInstanceUID']
+            for series_files in dicom_dir_content.series_list]
+
+
+def test_merge_content_of_subdirectory():
+
+    dicom_dir_content = _content('1.1', '1.2', '1.3', '1.4')
+
+    # Subdirectory holding 1.2, 1.3 (unchanged) and a new series,
+    # where 1.4 no longer has files
+    changed_content = _content('1.5', '1.3', '1.2')
+
+    merged_content = merge_dicom_dir_content(
+        dicom_dir_content,
+        changed_content,
+        {'1.2', '1.4', '1.5'})
+
+    assert _series_uids(merged_content) == ['1.1', '1.2', '1.3', '1.5']
+
+    # Changed series are those read again
+    assert merged_content.series_list[1] is \
+        changed_content.series_list[2]
+    assert merged_content.series_list[0] is \
+        dicom_dir_content.series_list[0]
+
+    # The content of the directory is left as it was
+    assert _series_uids(dicom_dir_content) == ['1.1', '1.2', '1.3', '1.4']
@@ -0,0 +1,194 @@
+"""
+Tests of the histograms used for percentile windows
+"""
+
+from dataclasses import dataclass
+from functools import reduce
+
+import numpy as np
+import pytest
+
+from pydicom.dataset import Dataset, FileMetaDataset
+
+from QuickSeg.model.display_window_model import (
+    MAX_HISTOGRAM_BITS,
+    get_stored_pixel_array,
+    Histogram,
+    scan_frame_statistics)
+
+
+PERCENTILES = [0, 0.5, 1, 25, 50, 75, 99, 99.5, 100]
+
+
+def _bin_width(histogram):
+
+    return 1 << histogram.shift
+
+
+def _assert_percentiles(histogram, values):
+
+    for percentile in PERCENTILES:
+
+        expected = np.percentile(values, percentile,
+                                 method='inverted_cdf')
+
+        assert abs(histogram.get_percentile(percentile) - expected) <= \
+            _bin_width(histogram) / 2
+
+
+@pytest.mark.parametrize('dtype', [np.uint8, np.int16, np.uint16])
+def test_small_types_have_one_bin_per_value(dtype):
+
+    rng = np.random.default_rng(0)
+
+    dtype_info = np.iinfo(dtype)
+    values = rng.integers(dtype_info.min, dtype_info.max,
+                          size=(64, 64), endpoint=True, dtype=dtype)
+
+    histogram = Histogram.from_pixel_array(values)
+
+    assert histogram.shift == 0
+    assert histogram.counts.sum() == values.size
+
+    for percentile in PERCENTILES:
+        assert histogram.get_percentile(percentile) == np.percentile(
+            values, percentile, method='inverted_cdf')
+
+
+@pytest.mark.parametrize('value_range', [
+    (-1000, 3000),
+    (0, 1 << 20),
+    (-(1 << 31), (1 << 31) - 1),
+])
+def test_32_bit_bins_follow_value_range(value_range):
+
+    rng = np.random.default_rng(1)
+
+    values = rng.integers(*value_range, size=(128, 128),
+                          endpoint=True).astype(np.int32)
+
+    histogram = Histogram.from_pixel_array(values)
+
+    value_width = int(values.max()) - int(values.min()) + 1
+
+    assert len(histogram.counts) <= 1 << MAX_HISTOGRAM_BITS
+    assert _bin_width(histogram) <= \
+        max(1, 2 * value_width >> MAX_HISTOGRAM_BITS)
+
+    _assert_percentiles(histogram, values)
+
+
+def test_merge_widens_bins_to_fit_range():
+
+    rng = np.random.default_rng(2)
+
+    slice_list = [
+        rng.integers(0, 100, size=(32, 32)).astype(np.int32),
+        rng.integers(50000, 60000, size=(32, 32)).astype(np.int32),
+        rng.integers(-1 << 24, 1 << 24, size=(32, 32)).astype(np.int32)]
+
+    histogram = reduce(
+        Histogram.merge,
+        map(Histogram.from_pixel_array, slice_list))
+
+    values = np.concatenate([ar.ravel() for ar in slice_list])
+
+    assert histogram.counts.sum() == values.size
+    assert len(histogram.counts) <= 1 << MAX_HISTOGRAM_BITS
+
+    _assert_percentiles(histogram, values)
+
+    # The first two slices fit in bins of one value
+    histogram = Histogram.from_pixel_array(slice_list[0]).merge(
+        Histogram.from_pixel_array(slice_list[1]))
+
+    assert histogram.shift == 0
+
+
+def test_float_pixel_data_has_no_histogram():
+
+    assert Histogram.from_pixel_array(np.zeros((4, 4))) is None
+
+
+@dataclass
+class _Dataset:
+
+    pixel_array: np.ndarray
+
+
+class _Series:
+
+    def __init__(self, frame_list):
+
+        self._frame_list = frame_list
+
+    def get_number_of_frames(self):
+
+        return len(self._frame_list)
+
+    def get_number_of_slices(self, frame):
+
+        return len(self._frame_list[frame])
+
+    def get_dataset(self, ind, frame):
+
+        return _Dataset(self._frame_list[frame][ind])
+
+
+def test_scan_frame_statistics():
+
+    rng = np.random.default_rng(3)
+
+    frame_list = [
+        rng.integers(-1024, 3000, size=(20, 16, 16)).astype(np.int16),
+        rng.integers(0, 500, size=(10, 16, 16)).astype(np.int16)]
+
+    frame_minmax_list, frame_histogram_list = \
+        scan_frame_statistics(_Series(frame_list), max_workers=4)
+
+    for frame, minmax, histogram in \
+            zip(frame_list, frame_minmax_list, frame_histogram_list):
+
+        assert minmax == (frame.min(), frame.max())
+        assert histogram.counts.sum() == frame.size
+
+        _assert_percentiles(histogram, frame)
+
+    frame_list[1] = frame_list[1].astype(np.float32)
+
+    _, frame_histogram_list = \
+        scan_frame_statistics(_Series(frame_list))
+
+    assert frame_histogram_list is None
+
+
+def _make_dataset(pixel_array):
+
+    dataset = Dataset()
+    dataset.file_meta = FileMetaDataset()
+    dataset.set_pixel_data(
+        pixel_array,
+        photometric_interpretation='MONOCHROME2',
+        bits_stored=16)
+
+    return dataset
+
+
+def test_decoded_pixel_data_is_not_kept():
+
+    pixel_array = np.arange(-100, 156, dtype=np.int16).reshape(16, 16)
+    dataset = _make_dataset(pixel_array)
+
+    np.testing.assert_array_equal(
+        get_stored_pixel_array(dataset), pixel_array)
+
+    assert dataset._pixel_array is None
+
+
+def test_already_decoded_pixel_data_is_reused():
+
+    dataset = _make_dataset(np.zeros((16, 16), dtype=np.int16))
+
+    decoded_pixel_array = dataset.pixel_array
+
+    assert get_stored_pixel_array(dataset) is decoded_pixel_array
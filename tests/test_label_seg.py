@@ -0,0 +1,80 @@
+"""
+Tests of segmentations stored as bits of shared label volumes
+"""
+
+import numpy as np
+
+from QuickSeg.model.label_seg import LabelVolume, add_label_seg
+
+
+SHAPE = (4, 12, 10)
+
+
+def _random_seg(seed):
+
+    rng = np.random.default_rng(seed)
+
+    return (rng.random(SHAPE) > 0.6).astype(np.uint8)
+
+
+def test_labels_round_trip_independently():
+
+    label_volume = LabelVolume(SHAPE)
+
+    label_seg_list = [label_volume.add_label() for _ in range(3)]
+    seg_list = [_random_seg(seed) for seed in range(3)]
+
+    for label_seg, seg in zip(label_seg_list, seg_list):
+        label_seg.set_dense(seg)
+
+    for label_seg, seg in zip(label_seg_list, seg_list):
+        np.testing.assert_array_equal(label_seg.to_dense(), seg)
+
+    # Regions are written in place without changing other labels
+    label_region = label_volume.array[1, 2:6, 3:9]
+    label_seg_list[1].update(label_region, np.ones((4, 6)))
+
+    seg_list[1][1, 2:6, 3:9] = 1
+
+    for label_seg, seg in zip(label_seg_list, seg_list):
+        np.testing.assert_array_equal(label_seg.to_dense(), seg)
+
+    np.testing.assert_array_equal(
+        label_seg_list[1].extract(label_volume.array[1, 2:6, 3:9]),
+        np.ones((4, 6)))
+
+
+def test_removed_label_is_cleared_and_reused():
+
+    label_volume = LabelVolume(SHAPE)
+
+    label_seg_list = [label_volume.add_label() for _ in range(2)]
+
+    for seed, label_seg in enumerate(label_seg_list):
+        label_seg.set_dense(_random_seg(seed))
+
+    label_seg_list[0].remove()
+
+    assert label_volume.n_free_labels == 7
+
+    label_seg = label_volume.add_label()
+
+    assert label_seg.bit == label_seg_list[0].bit
+    assert not label_seg.to_dense().any()
+    np.testing.assert_array_equal(
+        label_seg_list[1].to_dense(), _random_seg(1))
+
+
+def test_new_label_volume_once_full():
+
+    label_seg_list = []
+
+    for _ in range(9):
+        label_seg_list.append(add_label_seg(SHAPE, label_seg_list))
+
+    label_volume_list = [label_seg.label_volume
+                         for label_seg in label_seg_list]
+
+    assert all(label_volume is label_volume_list[0]
+               for label_volume in label_volume_list[:8])
+    assert label_volume_list[8] is not label_volume_list[0]
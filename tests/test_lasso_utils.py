@@ -0,0 +1,270 @@
+"""
+Tests of the rasterization of lassos
+"""
+
+import numpy as np
+import pytest
+
+from matplotlib.path import Path
+from scipy.ndimage import binary_fill_holes
+
+from QuickSeg.model.lasso_utils import (
+    EVEN_ODD,
+    NONZERO,
+    fill_line_on_slice,
+    get_line_bounding_box,
+    trace_line_on_mask)
+from QuickSeg.model.siddon import compute_path
+
+
+IM_SHAPE = (96, 80)
+
+
+def _old_trace_line_on_mask(im_shape, line_ij):
+    """
+    Previous implementation tracing the line on the whole slice and
+    filling holes
+    """
+
+    path_i, path_j = compute_path(im_shape, line_ij, True)
+
+    mask = np.zeros(im_shape, dtype=bool)
+    mask[path_i, path_j] = True
+
+    binary_fill_holes(mask, output=mask)
+
+    return mask
+
+
+def _simple_lasso(rng, center_ij, max_radius):
+    """
+    Random star-shaped polygon, which doesn't intersect itself
+    """
+
+    n_points = rng.integers(3, 40)
+
+    angles = np.sort(rng.uniform(0, 2 * np.pi, n_points))
+    radii = rng.uniform(0.1, 1, n_points) * max_radius
+
+    return np.asarray(center_ij) + \
+        radii[:, np.newaxis] * np.c_[np.sin(angles), np.cos(angles)]
+
+
+def _self_intersecting_lasso(rng, low_ij, high_ij):
+
+    n_points = rng.integers(3, 15)
+
+    return rng.uniform(low_ij, high_ij, size=(n_points, 2))
+
+
+def _pixel_centers(im_shape):
+
+    i, j = np.indices(im_shape)
+
+    return np.c_[i.ravel(), j.ravel()]
+
+
+def _contains_pixel_centers(im_shape, line_ij):
+    """
+    Pixels whose centers are inside the closed line (even-odd rule)
+    """
+
+    vertices = np.asarray(line_ij, dtype=np.float64)
+
+    # The last vertex of a closed path is ignored
+    path = Path(np.r_[vertices, vertices[:1]], closed=True)
+
+    return path.contains_points(_pixel_centers(im_shape)).\
+        reshape(im_shape)
+
+
+def _winding_numbers(im_shape, line_ij):
+    """
+    Winding number of the closed line around each pixel center,
+    summing the angles under which its edges are seen
+    """
+
+    vertices = np.asarray(line_ij, dtype=np.float64)
+
+    v1 = vertices[np.newaxis] - \
+        _pixel_centers(im_shape)[:, np.newaxis]
+    v2 = np.roll(v1, -1, axis=1)
+
+    angles = np.arctan2(
+        v1[..., 0] * v2[..., 1] - v1[..., 1] * v2[..., 0],
+        (v1 * v2).sum(axis=-1))
+
+    return np.rint(angles.sum(axis=1) / (2 * np.pi)).astype(int).\
+        reshape(im_shape)
+
+
+def _outline(im_shape, line_ij):
+
+    path_i, path_j = compute_path(im_shape, line_ij, True)
+
+    outline = np.zeros(im_shape, dtype=bool)
+    outline[path_i, path_j] = True
+
+    return outline
+
+
+def _assert_fill(mask, inside, outline, winding):
+    """
+    The pixels inside the line and on its outline are filled, and
+    other pixels only if the outline cuts them off from the outside
+    with their centers outside all loops of the line
+    """
+
+    expected = inside | outline
+
+    assert np.all(mask[expected])
+
+    extra = mask & ~expected
+
+    assert np.all(binary_fill_holes(expected)[extra])
+    assert np.all(winding[extra] == 0)
+
+
+@pytest.mark.parametrize('fill_rule', [EVEN_ODD, NONZERO])
+def test_simple_lassos_match_old_fill(fill_rule):
+
+    rng = np.random.default_rng(0)
+
+    for _ in range(500):
+
+        line_ij = _simple_lasso(rng, (48, 40), rng.uniform(1, 38))
+
+        np.testing.assert_array_equal(
+            trace_line_on_mask(IM_SHAPE, line_ij, fill_rule),
+            _old_trace_line_on_mask(IM_SHAPE, line_ij))
+
+
+def test_nonzero_fill_matches_old_fill():
+
+    rng = np.random.default_rng(1)
+
+    for _ in range(500):
+
+        line_ij = _self_intersecting_lasso(rng, (0, 0), (95, 79))
+
+        np.testing.assert_array_equal(
+            trace_line_on_mask(IM_SHAPE, line_ij, NONZERO),
+            _old_trace_line_on_mask(IM_SHAPE, line_ij))
+
+
+def test_fill_leaves_no_holes_next_to_outline():
+
+    rng = np.random.default_rng(2)
+
+    for _ in range(2000):
+
+        line_ij = _self_intersecting_lasso(rng, (-10, -10), (105, 89))
+
+        for fill_rule in (EVEN_ODD, NONZERO):
+
+            mask = trace_line_on_mask(IM_SHAPE, line_ij, fill_rule)
+
+            holes = binary_fill_holes(mask) & ~mask
+
+            if not holes.any():
+                continue
+
+            # Only holes made by self-intersections remain
+            assert np.all(
+                _winding_numbers(IM_SHAPE, line_ij)[holes] != 0)
+
+
+def test_even_odd_fill_matches_contains_points():
+
+    rng = np.random.default_rng(3)
+
+    for _ in range(300):
+
+        line_ij = _self_intersecting_lasso(rng, (-10, -10), (105, 89))
+
+        _assert_fill(
+            trace_line_on_mask(IM_SHAPE, line_ij, EVEN_ODD),
+            _contains_pixel_centers(IM_SHAPE, line_ij),
+            _outline(IM_SHAPE, line_ij),
+            _winding_numbers(IM_SHAPE, line_ij))
+
+
+def test_nonzero_fill_matches_contains_points():
+
+    rng = np.random.default_rng(4)
+
+    for _ in range(300):
+
+        # Both fill rules agree on lassos that don't intersect
+        # themselves
+        line_ij = _simple_lasso(rng, (48, 40), rng.uniform(1, 60))
+
+        _assert_fill(
+            trace_line_on_mask(IM_SHAPE, line_ij, NONZERO),
+            _contains_pixel_centers(IM_SHAPE, line_ij),
+            _outline(IM_SHAPE, line_ij),
+            _winding_numbers(IM_SHAPE, line_ij))
+
+        line_ij = _self_intersecting_lasso(rng, (-10, -10), (105, 89))
+        winding = _winding_numbers(IM_SHAPE, line_ij)
+
+        _assert_fill(
+            trace_line_on_mask(IM_SHAPE, line_ij, NONZERO),
+            winding != 0,
+            _outline(IM_SHAPE, line_ij),
+            winding)
+
+
+def test_pentagram_fill_rules():
+
+    angles = np.arange(5) * 4 * np.pi / 5
+    line_ij = np.c_[48 - 40 * np.cos(angles), 40 + 40 * np.sin(angles)]
+
+    even_odd_mask = trace_line_on_mask(IM_SHAPE, line_ij, EVEN_ODD)
+    nonzero_mask = trace_line_on_mask(IM_SHAPE, line_ij, NONZERO)
+
+    # The center is surrounded twice
+    assert not even_odd_mask[48, 40]
+    assert nonzero_mask[48, 40]
+
+    assert np.all(nonzero_mask[even_odd_mask])
+
+
+def test_fill_only_writes_within_bounding_box():
+
+    rng = np.random.default_rng(5)
+
+    for _ in range(200):
+
+        line_ij = _self_intersecting_lasso(rng, (-10, -10), (105, 89))
+
+        im_slice = rng.integers(0, 2, IM_SHAPE).astype(np.uint8)
+        previous_slice = im_slice.copy()
+
+        bbox = fill_line_on_slice(im_slice, line_ij, 2, NONZERO)
+
+        assert bbox == get_line_bounding_box(IM_SHAPE, line_ij)
+
+        changed = im_slice != previous_slice
+
+        if bbox is None:
+            assert not changed.any()
+            continue
+
+        (i_first, i_last), (j_first, j_last) = bbox
+
+        changed[i_first:i_last+1, j_first:j_last+1] = False
+
+        assert not changed.any()
+
+        # The existing content of the slice doesn't change the fill
+        np.testing.assert_array_equal(
+            im_slice == 2,
+            trace_line_on_mask(IM_SHAPE, line_ij, NONZERO) |
+            ((previous_slice == 2) & (im_slice == 2)))
+
+
+def test_invalid_fill_rule():
+
+    with pytest.raises(ValueError):
+        trace_line_on_mask(IM_SHAPE, [(1, 1), (5, 1), (5, 5)], 'any')
@@ -0,0 +1,509 @@
+"""
+Tests of the memory management of series and segmentations by the
+model
+"""
+
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from QuickSeg.model.chunked_seg import ChunkedSeg, write_chunked_seg
+from QuickSeg.model.dicom_dir_scan import DicomDirIndex, read_file_header
+from QuickSeg.model.model import (
+    DENSE_SEG_STORAGE,
+    Model,
+    PACKED_SEG_STORAGE,
+    SPARSE_SEG_STORAGE)
+from QuickSeg.model.seg_history import SegEdit
+from QuickSeg.model.seg_utils import get_seg_slice, store_seg_slice
+from QuickSeg.model.sparse_seg import SliceChunk
+
+
+CT_IMAGE_STORAGE = '1.2.840.10008.5.1.4.1.1.2'
+
+# Size of the volume of a series
+SERIES_N_BYTES = 4 * 8 * 8 * 2
+
+
+class _Series:
+    """
+    Loaded series of a single volume of SERIES_N_BYTES bytes
+    """
+
+    def get_dataset(self, ind, frame):
+
+        return SimpleNamespace(BitsAllocated=16)
+
+    def get_number_of_frames(self):
+
+        return 1
+
+    def get_vol_shape(self, frame=0):
+
+        return 4, 8, 8
+
+
+def _content(n_series):
+
+    return SimpleNamespace(
+        series_list=[
+            SimpleNamespace(info={
+                'SeriesInstanceUID': f'1.{ind}',
+                'SeriesDescription': f'Series {ind}'})
+            for ind in range(n_series)])
+
+
+def _make_model(n_series, budget, dicom_dir_index=None):
+
+    model = Model(series_memory_budget=budget)
+    model.set_dicom_dir_content(_content(n_series), dicom_dir_index)
+
+    return model
+
+
+def _load(model, series_index, preload=False):
+
+    series_load = model.start_series_load(series_index, preload)
+
+    if series_load is not None:
+        model.finish_series_load(series_load, _Series())
+
+    return series_load
+
+
+def _loaded(model):
+
+    return [series_loaded for _, series_loaded in model.get_series_info()]
+
+
+def test_selected_preload_is_kept():
+
+    model = _make_model(2, SERIES_N_BYTES + 1)
+
+    model.set_current_series(0)
+    _load(model, 0)
+
+    series_load = model.start_series_load(1, preload=True)
+
+    # Selected while being preloaded
+    model.set_current_series(1)
+
+    assert model.start_series_load(1) is None
+    assert not series_load.preload
+
+    model.finish_series_load(series_load, _Series())
+
+    # Kept although it doesn't fit with the other series
+    assert _loaded(model) == [False, True]
+
+
+def test_preload_within_budget():
+
+    model = _make_model(3, 2 * SERIES_N_BYTES)
+
+    model.set_current_series(0)
+    _load(model, 0)
+
+    # Kept since it fits, not kept since it would evict a series, and
+    # not started once the budget is used up
+    _load(model, 1, preload=True)
+    assert _load(model, 2, preload=True) is None
+
+    assert _loaded(model) == [True, True, False]
+
+    model = _make_model(3, 2 * SERIES_N_BYTES - 1)
+
+    model.set_current_series(0)
+    _load(model, 0)
+    _load(model, 1, preload=True)
+
+    assert _loaded(model) == [True, False, False]
+
+
+def _write_file(file_path, series_uid):
+
+    dataset = Dataset()
+    dataset.file_meta = FileMetaDataset()
+    dataset.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    dataset.file_meta.MediaStorageSOPClassUID = CT_IMAGE_STORAGE
+    dataset.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    dataset.SeriesInstanceUID = series_uid
+    dataset.SamplesPerPixel = 1
+    dataset.Rows = 8
+    dataset.Columns = 8
+    dataset.BitsAllocated = 16
+
+    dataset.save_as(file_path, enforce_file_format=True)
+
+
+def test_preload_too_large_is_not_read(tmp_path):
+
+    # Series 1 has 4 files of 8 x 8 pixels, as large as a loaded series
+    for ind in range(4):
+        _write_file(tmp_path / f'{ind}.dcm', '1.1')
+
+    dicom_dir_index = DicomDirIndex(
+        str(tmp_path),
+        [read_file_header(str(file_path))
+         for file_path in sorted(tmp_path.iterdir())])
+
+    model = _make_model(2, 2 * SERIES_N_BYTES - 1, dicom_dir_index)
+
+    model.set_current_series(0)
+    _load(model, 0)
+
+    series_load = model.start_series_load(1, preload=True)
+
+    assert len(series_load.file_path_list) == 4
+
+    # Skipped without reading the series
+    assert series_load.read() is None
+
+    model.finish_series_load(series_load, None)
+
+    assert _loaded(model) == [True, False]
+    assert model.start_series_load(1) is not None
+
+
+def _write_chunked_seg(seg_file_path, seg):
+
+    write_chunked_seg(
+        seg_file_path,
+        seg.shape,
+        lambda slice_index: SliceChunk.from_dense(seg[slice_index]))
+
+
+def _load_chunked_seg(model, seg_file_path):
+    """
+    Segmentation loaded from a file with its second slice edited
+    """
+
+    model.set_current_series(0)
+    _load(model, 0)
+
+    seg = np.zeros(_Series().get_vol_shape(), dtype=np.uint8)
+    _write_chunked_seg(seg_file_path, seg)
+
+    seg_index = model.load_seg(seg_file_path, 0)
+
+    seg[1, 2:5, 3:6] = 1
+    model.get_seg(0, seg_index).set_axial_slice(1, seg[1])
+    model.set_seg_modified(0, seg_index, [1])
+
+    return seg_index, seg
+
+
+def _save(model, seg_file_path, seg_index):
+
+    seg_save = model.start_seg_save(seg_file_path, 0, seg_index)
+
+    seg_save.write()
+    model.finish_seg_save(seg_save, True)
+
+    return seg_save
+
+
+def test_dirty_slices_written_to_chunked_file(tmp_path):
+
+    model = _make_model(1, 10 * SERIES_N_BYTES)
+    seg_file_path = tmp_path / 'seg.qseg'
+
+    seg_index, seg = _load_chunked_seg(model, seg_file_path)
+
+    seg_save = _save(model, seg_file_path, seg_index)
+
+    assert list(seg_save.dirty_chunk_dict) == [1]
+    np.testing.assert_array_equal(
+        ChunkedSeg.load(seg_file_path).to_dense(), seg)
+
+    # Saved again after an edit
+    seg[2, 0, 0] = 1
+    model.get_seg(0, seg_index).set_axial_slice(2, seg[2])
+    model.set_seg_modified(0, seg_index, [2])
+
+    seg_save = _save(model, seg_file_path, seg_index)
+
+    assert list(seg_save.dirty_chunk_dict) == [2]
+    np.testing.assert_array_equal(
+        ChunkedSeg.load(seg_file_path).to_dense(), seg)
+
+
+def test_chunked_file_changed_since_load(tmp_path):
+
+    model = _make_model(1, 10 * SERIES_N_BYTES)
+    seg_file_path = tmp_path / 'seg.qseg'
+
+    seg_index, seg = _load_chunked_seg(model, seg_file_path)
+
+    # Replaced by another program
+    _write_chunked_seg(seg_file_path, np.ones_like(seg))
+
+    stat = os.stat(seg_file_path)
+    os.utime(seg_file_path,
+             ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    seg_save = _save(model, seg_file_path, seg_index)
+
+    # Written whole rather than only the dirty slice
+    assert seg_save.dirty_chunk_dict is None
+    np.testing.assert_array_equal(
+        ChunkedSeg.load(seg_file_path).to_dense(), seg)
+
+
+def test_edited_seg_not_mapped_to_saved_file(tmp_path):
+
+    model = Model(series_memory_budget=10 * SERIES_N_BYTES,
+                  memory_map_segs=True)
+    model.set_dicom_dir_content(_content(1))
+
+    model.set_current_series(0)
+    _load(model, 0)
+
+    seg_index = model.add_new_seg('seg', 0)
+    seg = model.get_seg(0, seg_index)
+
+    # Saved while a tool edits the segmentation
+    seg_save = model.start_seg_save(tmp_path / 'seg.npy', 0, seg_index)
+    seg_save.write()
+
+    model.set_edited_seg(seg)
+    model.finish_seg_save(seg_save, True)
+    model.set_edited_seg(None)
+
+    assert model.get_seg(0, seg_index) is seg
+    assert model.find_seg(seg) == (0, seg_index)
+
+    # Mapped once saved again
+    _save(model, tmp_path / 'seg.npy', seg_index)
+
+    assert isinstance(model.get_seg(0, seg_index), np.memmap)
+    assert model.find_seg(seg) is None
+
+
+def test_least_recently_used_series_evicted():
+
+    model = _make_model(4, 2 * SERIES_N_BYTES)
+
+    _load(model, 0)
+    _load(model, 1)
+
+    # Series 0 used after series 1
+    model.goc_series(0)
+
+    _load(model, 2)
+
+    assert _loaded(model) == [True, False, True, False]
+
+    _load(model, 1)
+
+    assert _loaded(model) == [False, True, True, False]
+
+    stats = model.get_series_memory_stats()
+
+    assert stats.n_bytes_loaded == 2 * SERIES_N_BYTES
+    assert stats.n_series_loaded == 2
+    assert stats.n_evictions == 2
+    assert stats.n_bytes_evicted == 2 * SERIES_N_BYTES
+    assert stats.n_reloads == 1
+
+
+def test_current_and_modified_series_not_evicted():
+
+    model = _make_model(3, SERIES_N_BYTES)
+
+    model.set_current_series(0)
+    _load(model, 0)
+    _load(model, 1)
+
+    # Over the budget rather than evicting the current series
+    assert _loaded(model) == [True, True, False]
+
+    model.add_new_seg('seg', 1)
+
+    model.set_current_series(2)
+    _load(model, 2)
+
+    assert _loaded(model) == [False, True, True]
+    assert model.get_series_memory_stats().n_evictions == 1
+
+
+def _make_dense_seg(model):
+    """
+    Empty dense segmentation of a loaded series
+    """
+
+    model.set_current_series(0)
+    _load(model, 0)
+
+    return model.add_new_seg('seg', 0)
+
+
+def test_failed_save_keeps_file_and_dirty_slices(tmp_path, monkeypatch):
+
+    model = _make_model(1, 10 * SERIES_N_BYTES)
+    seg_file_path = tmp_path / 'seg.npy'
+
+    seg_index = _make_dense_seg(model)
+    model.save_seg(seg_file_path, 0, seg_index)
+
+    model.get_seg(0, seg_index)[1, 2:5, 3:6] = 1
+    model.set_seg_modified(0, seg_index, [1])
+
+    def save_partly(seg_file, seg):
+
+        seg_file.write(b'\x93NUMPY')
+
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(np, 'save', save_partly)
+
+    with pytest.raises(OSError):
+        model.save_seg(seg_file_path, 0, seg_index)
+
+    monkeypatch.undo()
+
+    # The file saved before is left as is
+    np.testing.assert_array_equal(
+        np.load(seg_file_path),
+        np.zeros(_Series().get_vol_shape(), dtype=np.uint8))
+
+    assert model.get_dirty_seg_slices(0, seg_index) == {1}
+
+    model.save_seg(seg_file_path, 0, seg_index)
+
+    np.testing.assert_array_equal(
+        np.load(seg_file_path), model.get_seg(0, seg_index))
+    assert model.get_dirty_seg_slices(0, seg_index) == set()
+
+
+def test_edit_during_save_stays_dirty(tmp_path):
+
+    model = _make_model(1, 10 * SERIES_N_BYTES)
+    seg_file_path = tmp_path / 'seg.npy'
+
+    seg_index = _make_dense_seg(model)
+    model.set_seg_modified(0, seg_index, [0])
+
+    seg_save = model.start_seg_save(seg_file_path, 0, seg_index)
+
+    assert seg_save.dirty_slices == {0}
+
+    # Not saved twice at once
+    assert model.start_seg_save(seg_file_path, 0, seg_index) is None
+
+    # Edited while the copy taken when saving started is written
+    model.get_seg(0, seg_index)[3] = 1
+    model.set_seg_modified(0, seg_index, [3])
+
+    seg_save.write()
+    model.finish_seg_save(seg_save, True)
+
+    assert not np.load(seg_file_path).any()
+    assert model.get_dirty_seg_slices(0, seg_index) == {3}
+    assert model._series_list[0].seg_list[seg_index].modified
+
+
+def _to_dense(seg):
+
+    return seg.to_dense() if hasattr(seg, 'to_dense') else np.array(seg)
+
+
+def _edit_seg(model, seg_index, slice_index, bbox, value):
+    """
+    Paint a bounding box of an axial slice as a tool would
+    """
+
+    series = model.goc_series(0)
+    seg = model.get_seg(0, seg_index)
+
+    (i_first, i_last), (j_first, j_last) = bbox
+    region = np.s_[i_first:i_last+1, j_first:j_last+1]
+
+    seg_slice = get_seg_slice(seg, series, 'axial', slice_index, None)
+    region_before = seg_slice[region].copy()
+
+    seg_slice[region] = value
+
+    slice_range = store_seg_slice(
+        seg, series, 'axial', slice_index, None, seg_slice, bbox)
+
+    model.set_seg_modified(0, seg_index, slice_range)
+    model.record_seg_edit(0, seg_index, SegEdit.make(
+        'axial', slice_index, None, bbox,
+        region_before, seg_slice[region]))
+
+
+@pytest.mark.parametrize('seg_storage', [
+    DENSE_SEG_STORAGE,
+    SPARSE_SEG_STORAGE,
+    PACKED_SEG_STORAGE])
+def test_undo_redo_edits(seg_storage):
+
+    model = Model(series_memory_budget=10 * SERIES_N_BYTES,
+                  seg_storage=seg_storage)
+    model.set_dicom_dir_content(_content(1))
+
+    seg_index = _make_dense_seg(model)
+
+    # Another segmentation sharing the label volume when packed
+    other_seg_index = model.add_new_seg('other', 0)
+    _edit_seg(model, other_seg_index, 2, ((0, 7), (0, 7)), 1)
+
+    seg_list = [_to_dense(model.get_seg(0, seg_index))]
+
+    for slice_index, bbox, value in [(1, ((2, 5), (3, 6)), 1),
+                                     (2, ((0, 3), (0, 7)), 1),
+                                     (1, ((3, 7), (4, 5)), 0)]:
+
+        _edit_seg(model, seg_index, slice_index, bbox, value)
+        seg_list.append(_to_dense(model.get_seg(0, seg_index)))
+
+    for expected in reversed(seg_list[:-1]):
+        assert model.undo_seg_edit(0, seg_index)
+        np.testing.assert_array_equal(
+            _to_dense(model.get_seg(0, seg_index)), expected)
+
+    assert not model.undo_seg_edit(0, seg_index)
+
+    for expected in seg_list[1:]:
+        assert model.redo_seg_edit(0, seg_index)
+        np.testing.assert_array_equal(
+            _to_dense(model.get_seg(0, seg_index)), expected)
+
+    assert not model.redo_seg_edit(0, seg_index)
+
+    assert model.get_dirty_seg_slices(0, seg_index) == {1, 2}
+    assert _to_dense(model.get_seg(0, other_seg_index))[2].all()
+
+
+@pytest.mark.parametrize('seg_storage, suffix', [
+    (DENSE_SEG_STORAGE, '.npy'),
+    (SPARSE_SEG_STORAGE, '.npz'),
+    (PACKED_SEG_STORAGE, '.npy'),
+    (PACKED_SEG_STORAGE, '.qseg')])
+def test_saved_seg_loads_back(tmp_path, seg_storage, suffix):
+
+    model = Model(series_memory_budget=10 * SERIES_N_BYTES,
+                  seg_storage=seg_storage)
+    model.set_dicom_dir_content(_content(1))
+
+    seg_index = _make_dense_seg(model)
+
+    _edit_seg(model, seg_index, 0, ((1, 6), (2, 3)), 1)
+    _edit_seg(model, seg_index, 3, ((0, 7), (7, 7)), 1)
+
+    seg_file_path = tmp_path / f'seg{suffix}'
+    model.save_seg(seg_file_path, 0, seg_index)
+
+    loaded_seg_index = model.load_seg(str(seg_file_path), 0)
+
+    assert loaded_seg_index is not None
+
+    np.testing.assert_array_equal(
+        _to_dense(model.get_seg(0, loaded_seg_index)),
+        _to_dense(model.get_seg(0, seg_index)))
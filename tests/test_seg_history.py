@@ -0,0 +1,121 @@
+"""
+Tests of the undo and redo history of segmentation edits
+"""
+
+import numpy as np
+
+from QuickSeg.model.seg_history import SegEdit, SegHistory
+
+
+def _make_edit(seg_slice, bbox, paint):
+    """
+    Edit painting a slice within a bounding box, applied to the slice
+    """
+
+    (i_first, i_last), (j_first, j_last) = bbox
+    region = np.s_[i_first:i_last+1, j_first:j_last+1]
+
+    region_before = seg_slice[region].copy()
+    paint(seg_slice[region])
+
+    return SegEdit.make('axial', 0, None, bbox,
+                        region_before, seg_slice[region])
+
+
+def test_edit_flips_changed_pixels():
+
+    rng = np.random.default_rng(0)
+
+    seg_slice = (rng.random((30, 40)) > 0.5).astype(np.uint8)
+    slice_before = seg_slice.copy()
+
+    def paint(region):
+
+        region[rng.random(region.shape) > 0.7] ^= 1
+
+    seg_edit = _make_edit(seg_slice, ((5, 17), (8, 30)), paint)
+    slice_after = seg_slice.copy()
+
+    # Packed 8 pixels per byte
+    assert seg_edit.nbytes == int(np.ceil(13 * 23 / 8))
+
+    seg_edit.apply(seg_slice)
+    np.testing.assert_array_equal(seg_slice, slice_before)
+
+    seg_edit.apply(seg_slice)
+    np.testing.assert_array_equal(seg_slice, slice_after)
+
+
+def test_edit_without_change():
+
+    seg_slice = np.ones((10, 10), dtype=np.uint8)
+
+    def paint(region):
+
+        region[...] = 1
+
+    assert _make_edit(seg_slice, ((0, 9), (0, 9)), paint) is None
+
+
+def test_undo_redo_order():
+
+    seg_slice = np.zeros((20, 20), dtype=np.uint8)
+    history = SegHistory()
+
+    slice_list = [seg_slice.copy()]
+
+    for ind in range(3):
+
+        def paint(region):
+
+            region[ind] = 1
+
+        history.push(_make_edit(seg_slice, ((ind, 10), (0, 10)), paint))
+        slice_list.append(seg_slice.copy())
+
+    assert not history.can_redo()
+
+    for expected in reversed(slice_list[:-1]):
+        history.pop_undo().apply(seg_slice)
+        np.testing.assert_array_equal(seg_slice, expected)
+
+    assert not history.can_undo()
+    assert history.pop_undo() is None
+
+    history.pop_redo().apply(seg_slice)
+    np.testing.assert_array_equal(seg_slice, slice_list[1])
+
+    # A new edit can't be followed by the edits that were undone
+    def paint(region):
+
+        region[:, 5] = 1
+
+    history.push(_make_edit(seg_slice, ((0, 19), (0, 19)), paint))
+
+    assert not history.can_redo()
+    assert history.pop_redo() is None
+    assert history.nbytes == \
+        sum(edit.nbytes for edit in history._undo_stack)
+
+
+def test_oldest_edits_dropped_over_budget():
+
+    seg_slice = np.zeros((16, 16), dtype=np.uint8)
+
+    # Edits of the whole slice take 32 bytes
+    history = SegHistory(budget=80)
+
+    for ind in range(4):
+
+        def paint(region):
+
+            region[ind] = 1
+
+        history.push(_make_edit(seg_slice, ((0, 15), (0, 15)), paint))
+
+    assert history.nbytes == 64
+
+    history.pop_undo()
+    history.pop_undo()
+
+    assert not history.can_undo()
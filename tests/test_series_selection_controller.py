@@ -0,0 +1,157 @@
+"""
+Tests of the series list while series are loaded in the background
+"""
+
+import os
+import time
+from threading import Event
+from types import SimpleNamespace
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+# Created before the Qt backend of matplotlib is selected
+APP = QApplication.instance() or QApplication([])
+
+from QuickSeg.controller.series_selection_controller import \
+    SeriesSelectionController  # noqa: E402
+from QuickSeg.model.model import Model  # noqa: E402
+from QuickSeg.view.series_selection_panel import \
+    SeriesSelectionPanel  # noqa: E402
+
+
+class _Series:
+    """
+    Loaded series of a single volume
+    """
+
+    def get_dataset(self, ind, frame):
+
+        return SimpleNamespace(BitsAllocated=16)
+
+    def get_number_of_frames(self):
+
+        return 1
+
+    def get_vol_shape(self, frame):
+
+        return 4, 8, 8
+
+
+def _content(n_series):
+
+    return SimpleNamespace(
+        series_list=[
+            SimpleNamespace(info={
+                'SeriesInstanceUID': f'1.{ind}',
+                'SeriesDescription': f'Series {ind}'})
+            for ind in range(n_series)])
+
+
+def _make_controller(model):
+
+    panel = SeriesSelectionPanel()
+
+    controller = SeriesSelectionController(
+        model,
+        panel,
+        SimpleNamespace(refresh_seg_list=lambda: None,
+                        restore_seg=lambda: False),
+        SimpleNamespace(refresh_image=lambda: None,
+                        update_series=lambda: None))
+
+    model.set_dicom_dir_content(_content(3))
+    controller._refresh_series_list()
+
+    return controller, panel
+
+
+def _wait_until(condition, timeout=10):
+
+    end_time = time.monotonic() + timeout
+
+    while not condition():
+
+        assert time.monotonic() < end_time
+
+        APP.processEvents()
+        time.sleep(0.01)
+
+
+def test_load_finished_while_scanning():
+
+    model = Model()
+    controller, panel = _make_controller(model)
+
+    series_load = model.start_series_load(1)
+
+    finish_scan = Event()
+    scanned_content_list = []
+
+    def scan(cancel_event, report_progress):
+
+        finish_scan.wait()
+
+        return _content(2)
+
+    def apply_scan(dicom_dir_content):
+
+        model.set_dicom_dir_content(dicom_dir_content)
+        controller._refresh_series_list()
+        scanned_content_list.append(dicom_dir_content)
+
+    controller._start_scan(scan, on_scanned=apply_scan)
+
+    try:
+        assert panel.series_list.count() == 0
+
+        # The series of the previous directory is kept while the list
+        # is cleared
+        controller._finish_series_load(series_load, _Series())
+
+        assert model.get_series_info()[1] == ('Series 1', True)
+
+    finally:
+        finish_scan.set()
+
+    _wait_until(lambda: scanned_content_list)
+
+    assert panel.series_list.count() == 2
+    assert len(panel.color_patch_list) == 2
+    assert model.get_series_info() == \
+        [('Series 0', False), ('Series 1', False)]
+
+
+def test_load_finished_while_rescanning():
+
+    model = Model()
+    controller, panel = _make_controller(model)
+
+    series_load = model.start_series_load(2)
+
+    finish_scan = Event()
+    scan_over_list = []
+
+    def rescan(cancel_event, report_progress):
+
+        finish_scan.wait()
+
+    controller._start_scan(
+        rescan,
+        on_scanned=scan_over_list.append,
+        clear_list=False)
+
+    try:
+        controller._finish_series_load(series_load, _Series())
+
+    finally:
+        finish_scan.set()
+
+    _wait_until(lambda: scan_over_list)
+
+    # Shown loaded once the list is refreshed after the scan
+    controller._refresh_series_list()
+
+    assert model.get_series_info()[2] == ('Series 2', True)
+    assert panel.series_list.count() == 3
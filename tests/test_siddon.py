@@ -0,0 +1,106 @@
+"""
+Tests of the batch Siddon tracer against the scalar reference tracer
+"""
+
+import numpy as np
+import pytest
+
+from QuickSeg.model.siddon import compute_path, compute_path_batch
+
+
+IM_SHAPE = (64, 48)
+
+
+def _random_polylines(rng, n_polylines):
+    """
+    Polylines with random, grid-aligned and out-of-image points
+    """
+
+    for _ in range(n_polylines):
+
+        n_points = rng.integers(1, 12)
+
+        kind = rng.integers(3)
+
+        if kind == 0:
+            # Anywhere in or slightly around the image
+            line_ij = rng.uniform(-10, 70, size=(n_points, 2))
+
+        elif kind == 1:
+            # On pixel centers and pixel edges, giving axis-aligned
+            # segments and crossings through pixel corners
+            line_ij = rng.integers(-4, 68, size=(n_points, 2)) / 2
+
+        else:
+            # Far outside the image on some points
+            line_ij = rng.uniform(-200, 200, size=(n_points, 2))
+
+        yield line_ij, bool(rng.integers(2))
+
+
+def _assert_same_path(line_ij, closed):
+
+    expected_i, expected_j = \
+        compute_path(IM_SHAPE, line_ij, closed, batch=False)
+    path_i, path_j = compute_path(IM_SHAPE, line_ij, closed)
+
+    np.testing.assert_array_equal(path_i, expected_i)
+    np.testing.assert_array_equal(path_j, expected_j)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_batch_matches_scalar_on_random_polylines(seed):
+
+    rng = np.random.default_rng(seed)
+
+    for line_ij, closed in _random_polylines(rng, 1000):
+        _assert_same_path(line_ij.astype(np.float32), closed)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_batch_matches_scalar_on_double_precision_polylines(seed):
+
+    rng = np.random.default_rng(seed)
+
+    for line_ij, closed in _random_polylines(rng, 1000):
+        _assert_same_path(line_ij, closed)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_batch_matches_scalar_on_list_polylines(seed):
+
+    rng = np.random.default_rng(seed)
+
+    for line_ij, closed in _random_polylines(rng, 300):
+        _assert_same_path(line_ij.tolist(), closed)
+
+
+@pytest.mark.parametrize('line_ij', [
+    # Horizontal, vertical and diagonal segments
+    [(10, 2), (10, 40)],
+    [(2, 10), (60, 10)],
+    [(0, 0), (47, 47)],
+    # Segment along the edge of the image
+    [(-0.5, 0), (-0.5, 40)],
+    # Segment missing the image
+    [(-20, -20), (-10, -30)],
+    # Degenerate segment
+    [(5, 5), (5, 5)],
+])
+def test_batch_matches_scalar_on_special_segments(line_ij):
+
+    for points in (line_ij, np.array(line_ij, dtype=np.float32)):
+        _assert_same_path(points, closed=False)
+        _assert_same_path(points, closed=True)
+
+
+def test_path_dtype_and_contiguity():
+
+    path_i, path_j = compute_path_batch(
+        IM_SHAPE,
+        np.array([(1, 1), (30, 20), (5, 40)], dtype=np.float32),
+        closed=True)
+
+    for path in (path_i, path_j):
+        assert path.dtype == np.int32
+        assert path.flags['C_CONTIGUOUS']
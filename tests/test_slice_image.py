@@ -0,0 +1,155 @@
+"""
+Tests of the slice artist against the equivalent AxesImage artists
+"""
+
+import numpy as np
+import pytest
+
+from matplotlib import colormaps
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from QuickSeg.view.slice_image import SEG_COLOR, SliceImage
+
+
+WINDOW_LIMITS = (-160.0, 240.0)
+
+
+def _get_extent(shape, origin):
+
+    n_rows, n_cols = shape
+
+    if origin == 'upper':
+        return -0.5, n_cols - 0.5, n_rows - 0.5, -0.5
+
+    return -0.5, n_cols - 0.5, -0.5, n_rows - 0.5
+
+
+def _draw(shape, origin, add_artists):
+    """
+    Pixels of a figure on whose axes the artists are added
+    """
+
+    figure = Figure(figsize=(4, 3), dpi=100)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+
+    add_artists(axes)
+
+    left, right, bottom, top = _get_extent(shape, origin)
+    axes.set_xlim(left, right)
+    axes.set_ylim(bottom, top)
+    axes.set_aspect('equal')
+    axes.set_axis_off()
+
+    figure.canvas.draw()
+
+    return np.asarray(figure.canvas.buffer_rgba()).astype(int), axes
+
+
+def _draw_reference(data, seg_slice, origin):
+
+    def add_artists(axes):
+
+        extent = _get_extent(data.shape, origin)
+
+        axes.imshow(data, cmap='gray', vmin=WINDOW_LIMITS[0],
+                    vmax=WINDOW_LIMITS[1], origin=origin, extent=extent,
+                    interpolation='none')
+
+        overlay = np.zeros((*data.shape, 4), dtype=np.uint8)
+        overlay[seg_slice != 0] = SEG_COLOR
+
+        axes.imshow(overlay, origin=origin, extent=extent,
+                    interpolation='none')
+
+    return _draw(data.shape, origin, add_artists)[0]
+
+
+def _draw_slice_image(data, seg_slice, origin, window_limits=WINDOW_LIMITS):
+
+    slice_image = None
+
+    def add_artists(axes):
+
+        nonlocal slice_image
+
+        slice_image = SliceImage(axes)
+        axes.add_artist(slice_image)
+
+        slice_image.set_data(data, colormaps['gray'],
+                             _get_extent(data.shape, origin), origin)
+        slice_image.set_clim(*window_limits)
+        slice_image.set_seg_slice(seg_slice)
+
+    pixels, axes = _draw(data.shape, origin, add_artists)
+
+    return pixels, axes, slice_image
+
+
+def _random_slice(shape, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    data = rng.integers(-1000, 3000, shape).astype(np.int16)
+    seg_slice = (rng.random(shape) > 0.7).astype(np.uint8)
+
+    return data, seg_slice
+
+
+@pytest.mark.parametrize('shape, origin', [
+    ((40, 30), 'upper'),
+    ((25, 50), 'lower'),
+    ((3, 4), 'upper')])
+def test_matches_axes_images(shape, origin):
+
+    data, seg_slice = _random_slice(shape)
+
+    expected = _draw_reference(data, seg_slice, origin)
+    pixels, _, _ = _draw_slice_image(data, seg_slice, origin)
+
+    # Blending of the overlay may round differently
+    assert np.abs(pixels - expected).max() <= 1
+
+
+def test_window_change_recolors():
+
+    data, seg_slice = _random_slice((40, 30))
+
+    expected = _draw_reference(data, seg_slice, 'upper')
+
+    _, axes, slice_image = \
+        _draw_slice_image(data, seg_slice, 'upper', (0.0, 1.0))
+
+    slice_image.set_clim(*WINDOW_LIMITS)
+    axes.figure.canvas.draw()
+    pixels = np.asarray(axes.figure.canvas.buffer_rgba()).astype(int)
+
+    assert np.abs(pixels - expected).max() <= 1
+
+
+def test_seg_region_update():
+
+    data, seg_slice = _random_slice((40, 30))
+
+    _, axes, slice_image = _draw_slice_image(
+        data, np.zeros_like(seg_slice), 'upper')
+
+    bbox = ((5, 20), (3, 12))
+    (i_first, i_last), (j_first, j_last) = bbox
+    region = np.s_[i_first:i_last+1, j_first:j_last+1]
+
+    updated_seg_slice = np.zeros_like(seg_slice)
+    updated_seg_slice[region] = seg_slice[region]
+
+    slice_image.update_seg_region(updated_seg_slice, bbox)
+    axes.figure.canvas.draw()
+    pixels = np.asarray(axes.figure.canvas.buffer_rgba()).astype(int)
+
+    expected = _draw_reference(data, updated_seg_slice, 'upper')
+
+    assert np.abs(pixels - expected).max() <= 1
+
+    # Rectangle covered by the pixels of the bounding box
+    assert slice_image.get_region_extent(bbox).extents.tolist() == \
+        [j_first - 0.5, i_first - 0.5, j_last + 0.5, i_last + 0.5]
@@ -0,0 +1,111 @@
+"""
+Tests of the storage of sparse segmentations
+"""
+
+import numpy as np
+import pytest
+
+from QuickSeg.model.chunked_seg import ChunkedSeg, write_chunked_seg
+from QuickSeg.model.sparse_seg import SliceChunk, SparseSeg
+
+
+SHAPE = (5, 24, 20)
+
+
+def _random_seg(seed):
+
+    rng = np.random.default_rng(seed)
+
+    seg = np.zeros(SHAPE, dtype=np.uint8)
+    seg[1, 3:10, 4:15] = rng.random((7, 11)) > 0.5
+    seg[3, 20:, :2] = 1
+
+    return seg
+
+
+def _truncate(file_path, n_bytes):
+
+    content = file_path.read_bytes()
+    file_path.write_bytes(content[:n_bytes])
+
+
+@pytest.mark.parametrize('n_bytes', [0, 10, 100, -10])
+def test_truncated_sparse_file(tmp_path, n_bytes):
+
+    seg_file_path = tmp_path / 'seg.npz'
+    SparseSeg.from_dense(_random_seg(0)).save(seg_file_path)
+
+    _truncate(seg_file_path, n_bytes)
+
+    with pytest.raises(ValueError):
+        SparseSeg.load(seg_file_path)
+
+
+@pytest.mark.parametrize('n_bytes', [0, 10, 100, -10])
+def test_truncated_chunked_file(tmp_path, n_bytes):
+
+    seg = _random_seg(1)
+    seg_file_path = tmp_path / 'seg.qseg'
+
+    write_chunked_seg(
+        seg_file_path,
+        seg.shape,
+        lambda slice_index: SliceChunk.from_dense(seg[slice_index]))
+
+    _truncate(seg_file_path, n_bytes)
+
+    with pytest.raises(ValueError, match='^Invalid segmentation file: '
+                                         '(?!Invalid)'):
+        ChunkedSeg.load(seg_file_path)
+
+
+def test_round_trip(tmp_path):
+
+    seg = _random_seg(2)
+
+    sparse_seg = SparseSeg.from_dense(seg)
+
+    # Only non-empty slices are kept
+    assert list(sparse_seg.get_non_empty_slice_indices()) == [1, 3]
+    np.testing.assert_array_equal(sparse_seg.to_dense(), seg)
+
+    seg_file_path = tmp_path / 'seg.npz'
+    sparse_seg.save(seg_file_path)
+
+    loaded_seg = SparseSeg.load(seg_file_path)
+
+    assert tuple(loaded_seg.shape) == SHAPE
+    np.testing.assert_array_equal(loaded_seg.to_dense(), seg)
+
+    # Empty segmentations too
+    SparseSeg(SHAPE).save(seg_file_path)
+
+    assert not SparseSeg.load(seg_file_path).to_dense().any()
+
+
+def test_take_put_match_dense():
+
+    seg = _random_seg(3)
+    sparse_seg = SparseSeg.from_dense(seg)
+
+    # Indices of a sagittal slice
+    z_index, y_index, x_index = np.meshgrid(
+        np.arange(SHAPE[0]), np.arange(SHAPE[1]), 7, indexing='ij')
+
+    np.testing.assert_array_equal(
+        sparse_seg.take(z_index, y_index, x_index), seg[:, :, 7:8])
+
+    values = np.zeros(z_index.shape, dtype=np.uint8)
+    values[::2] = 1
+
+    sparse_seg.put(z_index, y_index, x_index, values)
+    seg[:, :, 7:8] = values
+
+    np.testing.assert_array_equal(sparse_seg.to_dense(), seg)
+
+    # Emptied slices are dropped
+    sparse_seg.put(z_index, y_index, x_index, np.zeros_like(values))
+    sparse_seg.set_axial_slice(1, np.zeros(SHAPE[1:], dtype=np.uint8))
+    sparse_seg.set_axial_slice(3, np.zeros(SHAPE[1:], dtype=np.uint8))
+
+    assert list(sparse_seg.get_non_empty_slice_indices()) == []
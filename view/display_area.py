@@ -2,18 +2,37 @@
 Canvas on which to display the image
 """
 
+from typing import Optional, Tuple
+
+import numpy as np
+
+from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtWidgets import QVBoxLayout
 
 import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib import patches
+from matplotlib.backend_bases import KeyEvent, MouseEvent, ResizeEvent
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.transforms import Bbox, TransformedBbox
 
+from QuickSeg.model.lasso_utils import BoundingBox
+from QuickSeg.model.slice_cache import (
+    get_window_limits,
+    RenderedSlice)
 from QuickSeg.view.panel import Panel
+from QuickSeg.view.slice_image import SliceImage
 
 
 matplotlib.use('Qt5Agg')
 
+# Slice steps requested by each navigation key
+KEY_STEPS = {
+    'up': -1,
+    'down': 1,
+    'pageup': -10,
+    'pagedown': 10}
+
 
 class Canvas(FigureCanvasQTAgg):
 
@@ -33,9 +52,21 @@ class Canvas(FigureCanvasQTAgg):
 
         self._border = None
 
+        # Figure size and axes layout for which the border was computed
+        self._border_key = None
+
+        # Persistent artist for the image and segmentation overlay
+        self._slice_image = None
+
+        # Properties of the displayed axes that require a full
+        # redraw when changed
+        self._layout = None
+
         # Initialize canvas to figure
         super().__init__(self._fig)
 
+        self.mpl_connect('resize_event', self._on_resize)
+
     def get_fig(self):
 
         return self._fig
@@ -44,11 +75,120 @@ class Canvas(FigureCanvasQTAgg):
 
         return self._axes
 
+    def clear_image(self):
+
+        self._axes.clear()
+
+        self._slice_image = None
+        self._layout = None
+
+    def update_image(self,
+                     rendered: RenderedSlice,
+                     seg_slice: Optional[np.array],
+                     window: Tuple[float, float]) -> bool:
+        """
+        Set the rendered slice, its window and the segmentation
+        overlay on the persistent artist
+
+        Returns True if the layout of the axes has changed, in which
+        case a full redraw is required.
+        """
+
+        layout_changed = \
+            self._slice_image is None or rendered.layout != self._layout
+
+        if self._slice_image is None:
+
+            self._slice_image = SliceImage(self._axes)
+            self._axes.add_artist(self._slice_image)
+
+        # Only update data, window and overlay of the persistent
+        # artist
+        self._slice_image.set_data(
+            rendered.data,
+            rendered.cmap,
+            rendered.extent,
+            rendered.origin)
+        self._slice_image.set_clim(*get_window_limits(window))
+        self._slice_image.set_seg_slice(seg_slice)
+
+        if layout_changed:
+
+            self._axes.set_xlim(rendered.xlim)
+            self._axes.set_ylim(rendered.ylim)
+            self._axes.set_aspect(rendered.aspect)
+            self._axes.set_title(rendered.title)
+
+            if rendered.axison:
+                self._axes.set_axis_on()
+            else:
+                self._axes.set_axis_off()
+
+            self._layout = rendered.layout
+
+        return layout_changed
+
+    def blit_image(self):
+        """
+        Redraw only the image and overlay artist
+
+        Requires a previous full draw with the same layout.
+        """
+
+        self._axes.draw_artist(self._slice_image)
+
+        self.blit(self._axes.bbox)
+
+    def blit_overlay_region(self,
+                            seg_slice: np.array,
+                            bbox: BoundingBox):
+        """
+        Update the segmentation overlay within a bounding box of the
+        displayed slice and redraw only the corresponding rectangle
+
+        Requires a previous full draw of a slice of the same shape.
+        """
+
+        self._slice_image.update_seg_region(seg_slice, bbox)
+
+        clip_box = Bbox.intersection(
+            TransformedBbox(
+                self._slice_image.get_region_extent(bbox),
+                self._axes.transData),
+            self._axes.bbox)
+
+        if clip_box is None:
+            return
+
+        # The image is only drawn within the rectangle
+        self._slice_image.set_clip_box(clip_box)
+        self._axes.draw_artist(self._slice_image)
+        self._slice_image.set_clip_box(self._axes.bbox)
+
+        self.blit(clip_box)
+
+    def _on_resize(self, event: ResizeEvent):
+
+        # The border depends on the position of the axes in the figure
+        if self._border is not None:
+            self.add_border()
+
     def add_border(self):
+        """
+        Draw a border around the axes
+
+        The tight bounding box of the axes is only computed again when
+        the figure size or the layout of the axes has changed.
+        """
 
         pad_factor = 0.01
         linewidth = 1
 
+        border_key = (tuple(self._fig.bbox.bounds), self._layout)
+
+        if self._border is not None and border_key == self._border_key:
+            return
+
         bbox = self._axes.get_tightbbox(
             self._fig.canvas.get_renderer())
 
@@ -71,9 +211,15 @@ class Canvas(FigureCanvasQTAgg):
 
         self._fig.add_artist(self._border)
 
+        self._border_key = border_key
+
 
 class DisplayArea(Panel):
 
+    # Emitted with a number of slices to step through (positive to
+    # go forward) when scrolling or pressing a navigation key
+    scroll_requested = pyqtSignal(int)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -84,6 +230,46 @@ class DisplayArea(Panel):
 
         self.setLayout(layout)
 
+        # Fraction of a step left over by high resolution wheels
+        self._scroll_remainder = 0.0
+
+        # Disabled while a tool is tracing on the displayed slice
+        self._slice_navigation_enabled = True
+
+        self._canvas.mpl_connect('scroll_event', self._on_scroll)
+        self._canvas.mpl_connect('key_press_event', self._on_key_press)
+
+    def set_slice_navigation_enabled(self, enabled: bool):
+        """
+        Enable or disable slice stepping with the wheel and navigation
+        keys
+        """
+
+        self._slice_navigation_enabled = enabled
+        self._scroll_remainder = 0.0
+
+    def _on_scroll(self, event: MouseEvent):
+
+        if not self._slice_navigation_enabled:
+            return
+
+        # Scrolling down goes forward
+        self._scroll_remainder -= event.step
+
+        n_steps = int(self._scroll_remainder)
+        self._scroll_remainder -= n_steps
+
+        if n_steps != 0:
+            self.scroll_requested.emit(n_steps)
+
+    def _on_key_press(self, event: KeyEvent):
+
+        if not self._slice_navigation_enabled:
+            return
+
+        if event.key in KEY_STEPS:
+            self.scroll_requested.emit(KEY_STEPS[event.key])
+
     def get_fig(self):
 
         return self._canvas.get_fig()
@@ -96,6 +282,40 @@ class DisplayArea(Panel):
 
         self._canvas.draw()
 
+    def clear_image(self):
+
+        self._canvas.clear_image()
+
+    def show_image(self,
+                   rendered: RenderedSlice,
+                   seg_slice: Optional[np.array],
+                   window: Tuple[float, float]):
+        """
+        Display a rendered slice with the given window (center, width)
+        and segmentation slice as overlay (None for no overlay)
+
+        The image and overlay artists are kept between calls and only
+        those are redrawn unless the layout of the axes has changed.
+        """
+
+        if self._canvas.update_image(rendered, seg_slice, window):
+
+            self._canvas.add_border()
+            self._canvas.draw()
+
+        else:
+            self._canvas.blit_image()
+
+    def show_seg_region(self,
+                        seg_slice: np.array,
+                        bbox: BoundingBox):
+        """
+        Update the overlay of the displayed slice within a bounding box
+        of an edited segmentation slice
+        """
+
+        self._canvas.blit_overlay_region(seg_slice, bbox)
+
     def add_border(self):
 
         self._canvas.add_border()
@@ -2,6 +2,7 @@
 View for the segmentation tools panel
 """
 
+from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import (
     QGridLayout,
     QPushButton,
@@ -27,6 +28,12 @@ class SegmentationToolsPanel(Panel):
         self.brush_button = QPushButton("Brush")
         self.eraser_button = QPushButton("Eraser")
 
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.setShortcut(QKeySequence.Undo)
+
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.setShortcut(QKeySequence.Redo)
+
         seg_tools_layout = QGridLayout()
         seg_tools_layout.addWidget(
             self.add_area_button,
@@ -40,6 +47,12 @@ class SegmentationToolsPanel(Panel):
         seg_tools_layout.addWidget(
             self.eraser_button,
             1, 1)
+        seg_tools_layout.addWidget(
+            self.undo_button,
+            2, 0)
+        seg_tools_layout.addWidget(
+            self.redo_button,
+            2, 1)
 
         layout = QVBoxLayout(self)
         layout.addLayout(seg_tools_layout)
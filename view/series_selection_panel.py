@@ -5,12 +5,14 @@ View for the series selection panel
 from functools import partial
 from typing import Callable, Optional, Sequence, Tuple
 
+from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (
     QGridLayout,
     QHBoxLayout,
     QLabel,
     QListWidget,
     QListWidgetItem,
+    QProgressBar,
     QPushButton,
     QVBoxLayout,
     QWidget)
@@ -34,12 +36,16 @@ class SeriesSelectionPanel(Panel):
             QPushButton("Save dir. content")
         self.load_dir_content_button = \
             QPushButton("Load dir. content")
+        self.rescan_dicom_dir_button = \
+            QPushButton("Rescan DICOM dir.")
 
         series_io_layout = QGridLayout()
         series_io_layout.\
             addWidget(self.open_dicom_dir_button, 0, 0)
         series_io_layout.\
             addWidget(self.save_dir_content_button, 0, 1)
+        series_io_layout.\
+            addWidget(self.rescan_dicom_dir_button, 1, 0)
         series_io_layout.\
             addWidget(self.load_dir_content_button, 1, 1)
 
@@ -48,9 +54,22 @@ class SeriesSelectionPanel(Panel):
 
         self.series_list = QListWidget()
 
+        # Progress of the directory scan, hidden when not scanning
+        self.scan_progress_bar = QProgressBar()
+        self.cancel_scan_button = QPushButton("Cancel")
+
+        scan_progress_layout = QHBoxLayout()
+        scan_progress_layout.addWidget(self.scan_progress_bar)
+        scan_progress_layout.addWidget(self.cancel_scan_button)
+
+        self.scan_progress_panel = QWidget()
+        self.scan_progress_panel.setLayout(scan_progress_layout)
+        self.scan_progress_panel.setVisible(False)
+
         layout = QVBoxLayout(self)
         layout.addWidget(series_io_panel)
         layout.addWidget(self.series_list)
+        layout.addWidget(self.scan_progress_panel)
 
         self.setLayout(layout)
 
@@ -101,9 +120,58 @@ class SeriesSelectionPanel(Panel):
             self.series_list.addItem(item)
             self.series_list.setItemWidget(item, item_widget)
 
+    def start_scan_progress(self, clear_list: bool = True):
+        """
+        Show the scan progress, clearing the series list unless
+        the current series are kept
+        """
+
+        if clear_list:
+            self.series_list.clear()
+            self.color_patch_list.clear()
+
+        self.scan_progress_bar.setRange(0, 0)
+        self.scan_progress_panel.setVisible(True)
+
+    def set_scan_progress(self, n_files_read: int, n_files: int):
+
+        if n_files_read < n_files:
+            self.scan_progress_bar.setRange(0, n_files)
+            self.scan_progress_bar.setValue(n_files_read)
+        else:
+            # Remaining work is not measurable
+            self.scan_progress_bar.setRange(0, 0)
+
+    def add_discovered_series(self, series_name: str):
+        """
+        Add a series that can't be selected until the scan is over
+        """
+
+        item = QListWidgetItem(series_name)
+        item.setFlags(Qt.NoItemFlags)
+
+        self.series_list.addItem(item)
+
+    def stop_scan_progress(self):
+
+        self.scan_progress_panel.setVisible(False)
+
     def set_series_to_loaded(self, series_index: int):
 
         assert 0 <= series_index < len(self.color_patch_list)
 
         self.color_patch_list[series_index].\
             set_color(COLOR_LOADED_SERIES)
+
+    def set_series_loaded_list(self, series_loaded_list: Sequence[bool]):
+        """
+        Update the patches of series that were loaded or released
+        """
+
+        assert len(series_loaded_list) == len(self.color_patch_list)
+
+        for patch, series_loaded in \
+                zip(self.color_patch_list, series_loaded_list):
+            patch.set_color(
+                COLOR_LOADED_SERIES if series_loaded else
+                COLOR_NON_LOADED_SERIES)
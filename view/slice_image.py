@@ -0,0 +1,247 @@
+"""
+Artist drawing a windowed slice with its segmentation overlay
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from matplotlib import artist
+from matplotlib.artist import Artist
+from matplotlib.axes import Axes
+from matplotlib.colors import Colormap
+from matplotlib.transforms import Bbox, TransformedBbox
+
+from QuickSeg.model.lasso_utils import BoundingBox
+
+
+# Color of the segmentation overlay (RGBA)
+SEG_COLOR = (0, 255, 0, 100)
+
+
+class SliceImage(Artist):
+    """
+    Slice whose pixel values are windowed and color mapped, with a
+    segmentation overlay blended on top, drawn with nearest neighbor
+    sampling directly at screen resolution
+
+    Colors are computed at the resolution of the slice and only again
+    when the data, the window or the overlay change. Drawing then
+    samples the screen pixels within the clip box, which is much
+    cheaper than the generic resampling of AxesImage.
+    """
+
+    def __init__(self, axes: Axes):
+
+        super().__init__()
+
+        self.axes = axes
+        self.set_transform(axes.transData)
+        self.set_clip_box(axes.bbox)
+
+        self._data: Optional[np.ndarray] = None
+        self._seg_slice: Optional[np.ndarray] = None
+        self._cmap: Optional[Colormap] = None
+        self._clim = (0.0, 1.0)
+        self._extent = (0.0, 1.0, 1.0, 0.0)
+        self._origin = 'upper'
+
+        # Color map and color map blended with the overlay color, as
+        # one table of packed RGBA values
+        self._lut: Optional[np.ndarray] = None
+
+        # Packed RGBA value of each pixel of the slice
+        self._colors: Optional[np.ndarray] = None
+
+    def set_data(self,
+                 data: np.ndarray,
+                 cmap: Colormap,
+                 extent: Tuple[float, float, float, float],
+                 origin: str):
+
+        if cmap is not self._cmap:
+            self._cmap = cmap
+            self._lut = None
+
+        self._data = data
+        self._extent = tuple(extent)
+        self._origin = origin
+
+        self._colors = None
+        self.stale = True
+
+    def set_clim(self, vmin: float, vmax: float):
+
+        if (vmin, vmax) != self._clim:
+
+            self._clim = vmin, vmax
+
+            self._colors = None
+            self.stale = True
+
+    def set_seg_slice(self, seg_slice: Optional[np.ndarray]):
+        """
+        Segmentation slice shown as overlay, with the same shape as the
+        data (None for no overlay)
+        """
+
+        self._seg_slice = seg_slice
+
+        self._colors = None
+        self.stale = True
+
+    def update_seg_region(self,
+                          seg_slice: np.ndarray,
+                          bbox: BoundingBox):
+        """
+        Update the overlay within a bounding box only
+        """
+
+        self._seg_slice = seg_slice
+
+        if self._colors is not None:
+
+            (i_first, i_last), (j_first, j_last) = bbox
+            region = np.s_[i_first:i_last+1, j_first:j_last+1]
+
+            self._colors[region] = self._get_colors(region)
+
+        self.stale = True
+
+    def get_region_extent(self, bbox: BoundingBox) -> Bbox:
+        """
+        Rectangle covered by the pixels of a bounding box of the slice,
+        in data coordinates
+        """
+
+        (i_first, i_last), (j_first, j_last) = bbox
+
+        left, right = self._extent[:2]
+        row_first, row_end = self._get_row_limits()
+
+        n_rows, n_cols = self._data.shape
+
+        x_step = (right - left) / n_cols
+        y_step = (row_end - row_first) / n_rows
+
+        return Bbox.from_extents(
+            left + j_first * x_step,
+            row_first + i_first * y_step,
+            left + (j_last + 1) * x_step,
+            row_first + (i_last + 1) * y_step)
+
+    def _get_row_limits(self) -> Tuple[float, float]:
+        """
+        Coordinates of the edges of the first and last rows
+        """
+
+        _, _, bottom, top = self._extent
+
+        return (top, bottom) if self._origin == 'upper' else (bottom, top)
+
+    def _get_lut(self) -> np.ndarray:
+
+        if self._lut is None:
+
+            lut = self._cmap(np.arange(self._cmap.N), bytes=True)
+
+            # Overlay blended as when drawn over the image
+            color = np.array(SEG_COLOR[:3], dtype=np.float64)
+            alpha = SEG_COLOR[3] / 255
+
+            blended_lut = lut.copy()
+            blended_lut[:, :3] = np.rint(
+                (1 - alpha) * lut[:, :3] + alpha * color)
+
+            self._lut = np.ascontiguousarray(
+                np.concatenate([lut, blended_lut])).\
+                view(np.uint32).ravel()
+
+        return self._lut
+
+    def _get_colors(self, region=np.s_[:, :]) -> np.ndarray:
+        """
+        Packed RGBA values of a region of the slice
+        """
+
+        lut = self._get_lut()
+        n_colors = self._cmap.N
+
+        vmin, vmax = self._clim
+        data = self._data[region]
+
+        # Same mapping to color map entries as Normalize and Colormap
+        if vmax > vmin:
+            scaled = (data - vmin) * (n_colors / (vmax - vmin))
+            ind = np.clip(scaled, 0, n_colors - 1).astype(np.intp)
+        else:
+            ind = np.zeros(data.shape, dtype=np.intp)
+
+        if self._seg_slice is not None:
+            ind += n_colors * (self._seg_slice[region] != 0)
+
+        return lut[ind]
+
+    @artist.allow_rasterization
+    def draw(self, renderer):
+
+        if not self.get_visible() or self._data is None:
+            self.stale = False
+            return
+
+        if self._colors is None:
+            self._colors = self._get_colors()
+
+        left, right = self._extent[:2]
+        row_first, row_end = self._get_row_limits()
+
+        transform = self.get_transform()
+
+        # Screen pixels covered by the slice within the clip box
+        screen_box = Bbox.intersection(
+            TransformedBbox(
+                Bbox.from_extents(left, row_first, right, row_end),
+                transform),
+            self.get_clip_box())
+
+        if screen_box is None:
+            self.stale = False
+            return
+
+        x_first, y_first = np.rint(screen_box.min).astype(int)
+        x_end, y_end = np.rint(screen_box.max).astype(int)
+
+        if x_end <= x_first or y_end <= y_first:
+            self.stale = False
+            return
+
+        # Data coordinates of the centers of the screen pixels, from
+        # top to bottom
+        screen_x = np.arange(x_first, x_end) + 0.5
+        screen_y = np.arange(y_first, y_end) + 0.5
+
+        inverse = transform.inverted()
+
+        x = inverse.transform(
+            np.c_[screen_x, np.full_like(screen_x, screen_y[0])])[:, 0]
+        y = inverse.transform(
+            np.c_[np.full_like(screen_y, screen_x[0]), screen_y])[:, 1]
+
+        n_rows, n_cols = self._data.shape
+
+        cols = np.clip(
+            np.floor((x - left) / (right - left) * n_cols),
+            0, n_cols - 1).astype(np.intp)
+        rows = np.clip(
+            np.floor((y - row_first) / (row_end - row_first) * n_rows),
+            0, n_rows - 1).astype(np.intp)
+
+        image = self._colors[rows[:, np.newaxis], cols].\
+            view(np.uint8).reshape(len(rows), len(cols), 4)
+
+        gc = renderer.new_gc()
+        self._set_gc_clip(gc)
+        renderer.draw_image(gc, x_first, y_first, image)
+        gc.restore()
+
+        self.stale = False